@@ -3,6 +3,11 @@ import { readFile, stat } from 'fs/promises'
 import { join } from 'path'
 import { TranscriptionData } from '@/types'
 import { spawn } from 'child_process'
+import { createConnection } from 'net'
+import { existsSync } from 'fs'
+
+// 常駐工作進程池的 Unix 套接字 (python whisper-real.py --serve)
+const WORKER_SOCKET = process.env.WHISPER_WORKER_SOCKET || '/tmp/whispermind-real.sock'
 
 // 全局變量存儲模型狀態
 let isModelLoaded = false
@@ -47,8 +52,13 @@ export async function POST(request: NextRequest) {
 
     console.log(`🎵 開始轉錄文件: ${fileName} (${(fileStats.size / 1024 / 1024).toFixed(2)} MB)`)
 
-    // 使用本地 Whisper 進行轉錄
-    const transcriptionData = await transcribeWithLocalWhisper(filePath)
+    // 優先使用常駐工作進程池，不可用時再啟動一次性進程
+    const transcriptionData = existsSync(WORKER_SOCKET)
+      ? await transcribeWithWorkerPool(filePath).catch((error) => {
+          console.warn('⚠️ 工作進程池不可用，改用一次性進程:', error)
+          return transcribeWithLocalWhisper(filePath)
+        })
+      : await transcribeWithLocalWhisper(filePath)
 
     return NextResponse.json(transcriptionData)
 
@@ -61,6 +71,36 @@ export async function POST(request: NextRequest) {
   }
 }
 
+async function transcribeWithWorkerPool(filePath: string): Promise<TranscriptionData> {
+  return new Promise((resolve, reject) => {
+    console.log('🔄 使用常駐 Whisper 工作進程轉錄...')
+
+    const socket = createConnection(WORKER_SOCKET)
+    let buffer = ''
+
+    socket.on('connect', () => {
+      socket.write(JSON.stringify({ id: Date.now().toString(), file_path: filePath }) + '\n')
+    })
+
+    socket.on('data', (data) => {
+      buffer += data.toString()
+      const newline = buffer.indexOf('\n')
+      if (newline < 0) return
+
+      socket.end()
+      try {
+        const result = JSON.parse(buffer.slice(0, newline))
+        console.log('✅ 本地轉錄完成')
+        resolve(result)
+      } catch (parseError) {
+        reject(new Error('解析轉錄結果失敗'))
+      }
+    })
+
+    socket.on('error', reject)
+  })
+}
+
 async function transcribeWithLocalWhisper(filePath: string): Promise<TranscriptionData> {
   return new Promise((resolve, reject) => {
     console.log('🔄 使用本地 Whisper 進行轉錄...')
@@ -5,10 +5,52 @@ import { TranscriptionData } from '@/types'
 
 // Python Whisper 服務器配置
 const WHISPER_SERVER_URL = process.env.WHISPER_SERVER_URL || 'http://localhost:8000'
+// 異步任務的輪詢間隔
+const JOB_POLL_INTERVAL_MS = 1000
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
+// 提交異步任務後輪詢結果，客戶端斷開時取消任務
+async function runTranscriptionJob(audio: Buffer, signal: AbortSignal) {
+  const response = await fetch(`${WHISPER_SERVER_URL}/jobs`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/octet-stream',
+    },
+    body: audio
+  })
+
+  if (!response.ok) {
+    throw new Error(`Whisper 服務錯誤: ${response.status}`)
+  }
+
+  const { id } = await response.json()
+  console.log(`🗂️ 轉錄任務已排隊: ${id}`)
+
+  while (true) {
+    if (signal.aborted) {
+      await fetch(`${WHISPER_SERVER_URL}/jobs/${id}`, { method: 'DELETE' }).catch(() => undefined)
+      throw new Error('客戶端已取消請求')
+    }
+    await sleep(JOB_POLL_INTERVAL_MS)
+
+    const status = await fetch(`${WHISPER_SERVER_URL}/jobs/${id}`)
+    if (!status.ok) {
+      throw new Error(`Whisper 服務錯誤: ${status.status}`)
+    }
+    const job = await status.json()
+    if (job.status === 'done' || job.status === 'failed') {
+      return job.result || { success: false, error: job.error }
+    }
+    if (job.status === 'cancelled') {
+      throw new Error('轉錄任務已被取消')
+    }
+  }
+}
 
 export async function POST(request: NextRequest) {
   try {
-    const { fileId } = await request.json()
+    const { fileId, stream } = await request.json()
 
     if (!fileId) {
       return NextResponse.json({ 
@@ -47,21 +89,35 @@ export async function POST(request: NextRequest) {
 
     // 調用 Python Whisper 服務
     console.log('🔄 正在調用本地 Whisper 服務...')
-    const response = await fetch(`${WHISPER_SERVER_URL}/transcribe`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        file_path: filePath
+    // 直接上傳音頻字節，Whisper 服務無需與 Web 端共享文件系統
+    const audio = await readFile(filePath)
+
+    // 流式模式直接轉發分段事件
+    if (stream) {
+      const response = await fetch(`${WHISPER_SERVER_URL}/transcribe?stream=sse`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/octet-stream',
+        },
+        body: audio,
+        // 瀏覽器斷開時一併斷開上游連接，Whisper 服務隨即停止轉錄並釋放工作線程
+        signal: request.signal
       })
-    })
 
-    if (!response.ok) {
-      throw new Error(`Whisper 服務錯誤: ${response.status}`)
+      if (!response.ok) {
+        throw new Error(`Whisper 服務錯誤: ${response.status}`)
+      }
+
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache'
+        }
+      })
     }
 
-    const result = await response.json()
+    // 非流式模式走異步任務，長音頻不再佔用一條長時間等待的連接
+    const result = await runTranscriptionJob(audio, request.signal)
     
     if (!result.success) {
       throw new Error(result.error || '轉錄失敗')
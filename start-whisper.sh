@@ -32,15 +32,28 @@ echo "✅ Python 依賴安裝完成"
 # 啟動 Python Whisper 服務
 echo "🎵 啟動 Whisper 服務器..."
 python3 whisper-server.py &
+WHISPER_PID=$!
+WHISPER_PORT=${WHISPER_PORT:-8000}
+WHISPER_READY_TIMEOUT=${WHISPER_READY_TIMEOUT:-900}
 
-# 等待服務器啟動
-sleep 5
+# 等待模型加載並預熱完成 (多進程時所有服務進程都加載完成後才開放端口，/health 成功即整個拓撲已就緒)
+echo "⏳ 等待模型加載..."
+WAITED=0
+until curl -sf "http://localhost:${WHISPER_PORT}/health" > /dev/null 2>&1; do
+    if ! kill -0 $WHISPER_PID 2> /dev/null; then
+        echo "❌ Whisper 服務器啟動失敗"
+        exit 1
+    fi
+    if [ $WAITED -ge $WHISPER_READY_TIMEOUT ]; then
+        echo "⚠️  Whisper 服務器在 ${WHISPER_READY_TIMEOUT} 秒內未就緒"
+        break
+    fi
+    sleep 1
+    WAITED=$((WAITED + 1))
+done
 
-# 檢查服務器是否運行
-if curl -s http://localhost:8000/transcribe > /dev/null 2>&1; then
-    echo "✅ Whisper 服務器啟動成功"
-else
-    echo "⚠️  Whisper 服務器可能還在啟動中..."
+if [ $WAITED -lt $WHISPER_READY_TIMEOUT ]; then
+    echo "✅ Whisper 服務器已就緒 (${WAITED}s)"
 fi
 
 # 啟動 Next.js 應用
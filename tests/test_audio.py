@@ -0,0 +1,58 @@
+"""上傳字節流的解碼"""
+
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from whispermind.audio import SAMPLE_RATE, decode_stream, is_iso_bmff
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要 ffmpeg")
+
+def top_level_boxes(data: bytes) -> list:
+    boxes = []
+    position = 0
+    while position + 8 <= len(data):
+        size, name = struct.unpack('!I4s', data[position:position + 8])
+        boxes.append(name.decode('latin-1'))
+        if size < 8:
+            break
+        position += size
+    return boxes
+
+@pytest.fixture
+def moov_at_end(tmp_path) -> bytes:
+    """10 秒正弦波的 M4A，沒有 faststart，moov 盒位於 mdat 之後；
+    mdat 超出 ffmpeg 的探測緩衝，從管道解碼時得不到任何樣本"""
+    path = tmp_path / "tone.m4a"
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', 'sine=frequency=440:duration=10', '-c:a', 'aac', str(path)], check=True)
+    data = path.read_bytes()
+    boxes = top_level_boxes(data)
+    assert boxes.index('moov') > boxes.index('mdat')
+    return data
+
+def chunks(data: bytes, size: int = 5000):
+    """模擬從套接字分塊讀取"""
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def test_moov_at_end_upload_decodes(moov_at_end):
+    assert is_iso_bmff(moov_at_end)
+    audio = decode_stream(chunks(moov_at_end))
+    assert len(audio) / SAMPLE_RATE == pytest.approx(10.0, abs=0.1)
+    assert abs(audio).max() > 0.1
+
+def test_header_split_across_blocks(moov_at_end):
+    """文件頭跨越多個塊時仍能識別容器"""
+    audio = decode_stream(chunks(moov_at_end, 3))
+    assert len(audio) / SAMPLE_RATE == pytest.approx(10.0, abs=0.1)
+
+def test_pipe_formats_still_stream(tmp_path):
+    path = tmp_path / "tone.wav"
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', 'sine=frequency=440:duration=1', str(path)], check=True)
+    data = path.read_bytes()
+    assert not is_iso_bmff(data)
+    audio = decode_stream(chunks(data, 4096))
+    assert len(audio) / SAMPLE_RATE == pytest.approx(1.0, abs=0.05)
@@ -0,0 +1,81 @@
+"""批量轉錄中失敗項的歸屬"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('transformers')
+
+from whispermind.backends.hf import TransformersBackend
+
+class FakePipeline:
+    """按音頻首個樣本查表的假管道；bad 中的音頻解碼時拋出異常"""
+
+    def __init__(self, bad):
+        self.bad = bad
+        self.batches = []
+
+    def __call__(self, inputs, batch_size=None, generate_kwargs=None):
+        language = (generate_kwargs or {}).get("language")
+        if isinstance(inputs, dict):
+            return self._decode(inputs, language)
+        return self._run(list(inputs), language)
+
+    def _run(self, inputs, language):
+        self.batches.append([int(item["raw"][0]) for item in inputs])
+        for item in inputs:
+            yield self._decode(item, language)
+
+    def _decode(self, item, language):
+        name = int(item["raw"][0])
+        if name in self.bad:
+            raise RuntimeError(f"解碼失敗 {name}")
+        return {"text": f"{language}:{name}", "chunks": []}
+
+class FakeBackend(TransformersBackend):
+    def __init__(self, languages, bad=(), unidentifiable=()):
+        super().__init__('fake', assistant_model=None)
+        self.languages = languages
+        self.unidentifiable = set(unidentifiable)
+        self._pipeline = FakePipeline(set(bad))
+
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    def _forced_language(self, language):
+        return language
+
+    def identify_language(self, audio, language=None):
+        name = int(audio[0])
+        if name in self.unidentifiable:
+            raise RuntimeError(f"識別失敗 {name}")
+        return self.languages[name], 0.9
+
+def sources(count):
+    return [np.full(1600, index, dtype=np.float32) for index in range(count)]
+
+def outcomes(backend, count):
+    return [output if isinstance(output, Exception) else output["text"]
+            for output in backend.transcribe_many(sources(count))]
+
+def test_failed_group_is_attributed_to_failing_item():
+    # en 組先於 yue 組解碼；B 失敗不應記在尚未產出的 A 上
+    backend = FakeBackend({0: "yue", 1: "en"}, bad={1})
+    results = outcomes(backend, 2)
+    assert results[0] == "yue:0"
+    assert isinstance(results[1], RuntimeError) and "1" in str(results[1])
+
+def test_other_items_in_failed_group_are_retried():
+    backend = FakeBackend({0: "en", 1: "yue", 2: "en", 3: "en"}, bad={2})
+    results = outcomes(backend, 4)
+    assert results[0] == "en:0"
+    assert results[1] == "yue:1"
+    assert isinstance(results[2], RuntimeError)
+    assert results[3] == "en:3"
+
+def test_language_identification_failure_only_affects_that_item():
+    backend = FakeBackend({0: "en", 2: "zh"}, unidentifiable={1})
+    results = outcomes(backend, 3)
+    assert results[0] == "en:0"
+    assert isinstance(results[1], RuntimeError) and "識別" in str(results[1])
+    assert results[2] == "zh:2"
@@ -0,0 +1,177 @@
+"""單飛緩存與取消令牌的交互"""
+
+import time
+import threading
+
+import pytest
+
+from whispermind.cache import TranscriptionCache
+from whispermind.deadline import Cancelled, CancelToken
+
+KEY = "a" * 64
+RESULT = {"success": True, "text": "你好", "segments": [{"start": 0.0, "end": 1.0, "text": "你好"}]}
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscriptionCache(directory=str(tmp_path))
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超時"
+        time.sleep(0.01)
+
+def waiters(cache, key: str = KEY) -> int:
+    flight = cache._inflight.get(key)
+    return len(flight.waiters) if flight else 0
+
+def run(target, *args, **kwargs):
+    """在線程中運行，返回 (線程, 結果字典)；結果字典含 "result" 或 "error" """
+    outcome = {}
+
+    def body():
+        try:
+            outcome["result"] = target(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=body, daemon=True)
+    thread.start()
+    return thread, outcome
+
+def blocking_compute(release: threading.Event, token: CancelToken = None, calls: list = None):
+    """等到 release 再返回 RESULT，期間檢查 token"""
+    def compute():
+        if calls is not None:
+            calls.append(1)
+        while not release.wait(0.01):
+            if token is not None:
+                token.check()
+        return RESULT
+    return compute
+
+def test_concurrent_callers_share_one_computation(cache):
+    release = threading.Event()
+    calls = []
+    leader, first = run(cache.single_flight, KEY, blocking_compute(release, calls=calls))
+    wait_for(lambda: waiters(cache) == 1)
+    follower, second = run(cache.single_flight, KEY, blocking_compute(release, calls=calls))
+    wait_for(lambda: waiters(cache) == 2)
+
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert first["result"] == second["result"] == RESULT
+    assert len(calls) == 1
+    assert cache.get(KEY) == RESULT
+
+def test_leader_leaving_keeps_computation_for_remaining_waiter(cache):
+    release = threading.Event()
+    leader_token = CancelToken()
+    leader, first = run(cache.single_flight, KEY, blocking_compute(release, leader_token), leader_token)
+    wait_for(lambda: waiters(cache) == 1)
+    follower, second = run(cache.single_flight, KEY, blocking_compute(release), CancelToken())
+    wait_for(lambda: waiters(cache) == 2)
+
+    cache.leave(KEY, leader_token, "客戶端已斷開")
+    assert not leader_token.cancelled
+    assert waiters(cache) == 1
+
+    release.set()
+    follower.join(5)
+    leader.join(5)
+    assert second["result"] == RESULT
+
+def test_last_waiter_leaving_cancels_computation(cache):
+    release = threading.Event()
+    leader_token = CancelToken()
+    leader, first = run(cache.single_flight, KEY, blocking_compute(release, leader_token), leader_token)
+    wait_for(lambda: waiters(cache) == 1)
+
+    cache.leave(KEY, leader_token, "客戶端已斷開")
+    leader.join(5)
+    assert leader_token.cancelled
+    assert isinstance(first["error"], Cancelled)
+    assert KEY not in cache._inflight
+    assert cache.get(KEY) is None
+
+def test_follower_cancel_does_not_stop_leader(cache):
+    release = threading.Event()
+    leader_token = CancelToken()
+    follower_token = CancelToken()
+    leader, first = run(cache.single_flight, KEY, blocking_compute(release, leader_token), leader_token)
+    wait_for(lambda: waiters(cache) == 1)
+    follower, second = run(cache.single_flight, KEY, blocking_compute(release), follower_token)
+    wait_for(lambda: waiters(cache) == 2)
+
+    follower_token.cancel("客戶端已斷開")
+    follower.join(5)
+    assert isinstance(second["error"], Cancelled)
+    wait_for(lambda: waiters(cache) == 1)
+    assert not leader_token.cancelled
+
+    release.set()
+    leader.join(5)
+    assert first["result"] == RESULT
+
+def test_follower_recomputes_after_leader_cancelled(cache):
+    leader_token = CancelToken()
+    calls = []
+
+    def cancelled_compute():
+        calls.append("leader")
+        wait_for(lambda: waiters(cache) == 2)
+        leader_token.cancel("客戶端已斷開")
+        leader_token.check()
+
+    def compute():
+        calls.append("follower")
+        return RESULT
+
+    leader, first = run(cache.single_flight, KEY, cancelled_compute, leader_token)
+    wait_for(lambda: waiters(cache) == 1)
+    follower, second = run(cache.single_flight, KEY, compute, CancelToken())
+
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(first["error"], Cancelled)
+    assert second["result"] == RESULT
+    assert calls == ["leader", "follower"]
+
+def test_cancelled_token_does_not_start_computation(cache):
+    token = CancelToken()
+    token.cancel()
+    calls = []
+    with pytest.raises(Cancelled):
+        cache.single_flight(KEY, lambda: calls.append(1) or RESULT, token)
+    assert calls == []
+    assert KEY not in cache._inflight
+
+def test_join_replays_published_segments(cache):
+    release = threading.Event()
+    segments = [{"start": float(i), "end": float(i + 1), "text": str(i)} for i in range(3)]
+
+    def compute():
+        for segment in segments[:2]:
+            cache.publish(KEY, segment)
+        release.wait(5)
+        cache.publish(KEY, segments[2])
+        return dict(RESULT, segments=segments)
+
+    leader, first = run(cache.single_flight, KEY, compute, CancelToken())
+    wait_for(lambda: KEY in cache._inflight and len(cache._inflight[KEY].segments) == 2)
+
+    received = []
+    token = CancelToken()
+    future = cache.join(KEY, token, received.append)
+    assert received == segments[:2]
+
+    release.set()
+    assert future.result(5)["segments"] == segments
+    leader.join(5)
+    assert received == segments
+
+    # 完成後的 join 從緩存重放全部分段
+    replayed = []
+    assert cache.join(KEY, on_segment=replayed.append).result() == first["result"]
+    assert replayed == segments
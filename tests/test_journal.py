@@ -0,0 +1,101 @@
+"""塊日誌的斷點恢復"""
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.journal import ChunkJournal, ResumableTranscription
+
+LAYOUT = {"key": "k", "pieces": [[0, 10], [10, 20]], "language": None}
+
+def test_reopen_resumes_finished_chunks(tmp_path):
+    path = str(tmp_path / "k.jsonl")
+    journal = ChunkJournal(path, LAYOUT)
+    journal.append(0, {"offset": 0.0, "output": {"text": "一"}})
+    journal.close()
+
+    journal = ChunkJournal(path, LAYOUT)
+    assert journal.finished() == {0}
+    journal.append(1, {"offset": 1.0, "output": {"text": "二"}})
+    assert [record["index"] for record in journal.records()] == [0, 1]
+    journal.close()
+
+def test_truncates_partial_last_line(tmp_path):
+    path = str(tmp_path / "k.jsonl")
+    journal = ChunkJournal(path, LAYOUT)
+    journal.append(0, {"offset": 0.0, "output": {"text": "一"}})
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"index": 1, "offset": 1.0, "out')  # 崩潰時寫了一半
+
+    journal = ChunkJournal(path, LAYOUT)
+    assert journal.finished() == {0}
+    journal.append(1, {"offset": 1.0, "output": {"text": "二"}})
+    journal.close()
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line).get("index") for line in lines] == [None, 0, 1]
+
+def test_layout_change_resets_journal(tmp_path):
+    path = str(tmp_path / "k.jsonl")
+    journal = ChunkJournal(path, LAYOUT)
+    journal.append(0, {"offset": 0.0, "output": {"text": "一"}})
+    journal.close()
+
+    journal = ChunkJournal(path, dict(LAYOUT, pieces=[[0, 20]]))
+    assert journal.finished() == set()
+    assert list(journal.records()) == []
+    journal.close()
+
+class FlakyTranscriber:
+    """每塊返回一個分段；fail_at 指定的塊 (按調用次序) 拋出異常"""
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.calls = []
+
+    def prepare(self, audio):
+        return None, audio
+
+    def load(self):
+        pass
+
+    def identify_language(self, audio, language=None):
+        return "zh", 0.9
+
+    def transcribe_array(self, audio, language=None):
+        if len(self.calls) == self.fail_at:
+            raise RuntimeError("推理失敗")
+        self.calls.append(len(audio))
+        seconds = len(audio) / SAMPLE_RATE
+        return {"text": f" 塊{len(self.calls)}",
+                "segments": [{"start": 0.0, "end": seconds, "text": f" 塊{len(self.calls)}"}]}
+
+def test_resumable_transcription_continues_after_failure(tmp_path):
+    audio = np.random.default_rng(0).normal(0, 0.05, 35 * SAMPLE_RATE).astype(np.float32)
+    directory = str(tmp_path)
+
+    first = FlakyTranscriber(fail_at=1)
+    run = ResumableTranscription(first, audio, "key", directory, piece_seconds=10)
+    assert len(run.pieces) > 2
+    with pytest.raises(RuntimeError):
+        run.run()
+    assert run.remaining == len(run.pieces) - 1
+    run.close()
+
+    second = FlakyTranscriber()
+    run = ResumableTranscription(second, audio, "key", directory, piece_seconds=10)
+    run.run()
+    assert len(second.calls) == len(run.pieces) - 1
+    assert run.remaining == 0
+
+    out = io.StringIO()
+    run.write(out)
+    result = json.loads(out.getvalue())
+    assert result["success"] and result["language"] == "zh"
+    assert len(result["segments"]) == len(run.pieces)
+    assert result["segments"][-1]["end"] == pytest.approx(35.0, abs=0.1)
+    run.discard()
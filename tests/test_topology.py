@@ -0,0 +1,106 @@
+"""推理拓撲、CPU 綁定與主機配置"""
+
+import json
+
+import pytest
+
+from whispermind import topology
+from whispermind.topology import (
+    PROFILE_VERSION, candidate_topologies, choose_topology, cpu_sets, load_host_profile,
+    parse_cpulist, save_host_profile, server_topology,
+)
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ('WHISPER_PROCESSES', 'WHISPER_THREADS', 'WHISPER_PIN'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(topology, 'available_cpus', lambda: list(range(8)))
+    monkeypatch.setattr(topology, 'numa_nodes', lambda: [list(range(8))])
+
+def test_parse_cpulist():
+    assert parse_cpulist('0-3,8') == [0, 1, 2, 3, 8]
+    assert parse_cpulist('5\n') == [5]
+    assert parse_cpulist('') == []
+
+def test_candidate_topologies():
+    assert candidate_topologies(8) == [(1, 8), (1, 4), (2, 4), (2, 2), (4, 2), (4, 1), (8, 1)]
+    assert candidate_topologies(8, max_processes=2) == [(1, 8), (1, 4), (2, 4), (2, 2)]
+    assert candidate_topologies(1) == [(1, 1)]
+
+def test_cpu_sets_without_pinning():
+    assert cpu_sets(3, 2, 'none') == [None, None, None]
+
+def test_cpu_sets_cores():
+    assert cpu_sets(2, 3, 'cores', [[0, 1, 2, 3], [4, 5, 6, 7]]) == [[0, 1, 2], [3, 4, 5]]
+
+def test_cpu_sets_not_enough_cpus():
+    assert cpu_sets(3, 4, 'cores', [[0, 1, 2, 3, 4, 5, 6, 7]]) == [None, None, None]
+    assert cpu_sets(3, 4, 'numa', [[0, 1, 2, 3], [4, 5, 6, 7]]) == [None, None, None]
+
+def test_cpu_sets_numa_uneven_nodes():
+    nodes = [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]]
+    # 節點 0 容納兩個進程 (剩餘兩個核心不用)，節點 1 容納一個，核心不跨節點
+    assert cpu_sets(3, 3, 'numa', nodes) == [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+
+def test_cpu_sets_numa_falls_back_to_cores():
+    nodes = [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+    # 每個節點只能容納一個 3 核心的進程，第三個進程只能跨節點
+    assert cpu_sets(3, 3, 'numa', nodes) == [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+    assert cpu_sets(2, 3, 'numa', nodes) == [[0, 1, 2], [5, 6, 7]]
+
+def test_choose_topology():
+    rows = [
+        {"processes": 1, "threads": 8, "throughput": 2.0, "p95": 3.0},
+        {"processes": 4, "threads": 2, "throughput": 5.0, "p95": 9.0},
+        {"processes": 8, "threads": 1, "error": "內存不足"},
+    ]
+    assert choose_topology(rows)["processes"] == 4
+    assert choose_topology(rows, max_p95=5.0)["processes"] == 1
+    assert choose_topology(rows, max_p95=1.0)["processes"] == 1  # 都超出預算時取 p95 最低
+    assert choose_topology(rows[2:]) is None
+
+def profile(**chosen):
+    return {"version": PROFILE_VERSION, "config": {"model": "tiny"}, "chosen": chosen}
+
+def test_load_host_profile_round_trip(tmp_path):
+    path = str(tmp_path / "host-profile.json")
+    save_host_profile(profile(processes=2, threads=4, pin='cores'), path)
+    assert load_host_profile(path)["chosen"]["processes"] == 2
+
+def test_load_host_profile_ignores_other_versions(tmp_path):
+    path = tmp_path / "host-profile.json"
+    path.write_text(json.dumps(dict(profile(processes=2), version=PROFILE_VERSION + 1)))
+    assert load_host_profile(str(path)) is None
+    path.write_text("[1, 2]")
+    assert load_host_profile(str(path)) is None
+    path.write_text("{")
+    assert load_host_profile(str(path)) is None
+    assert load_host_profile(str(tmp_path / "missing.json")) is None
+
+def test_server_topology_default():
+    chosen = server_topology(None)
+    assert chosen == {"processes": 1, "threads": None, "pin": 'none', "cpu_sets": [None],
+                      "model": None, "source": "default"}
+
+def test_server_topology_from_profile():
+    chosen = server_topology(profile(processes=2, threads=4, pin='cores'))
+    assert chosen["source"] == "profile"
+    assert chosen["model"] == "tiny"
+    assert chosen["cpu_sets"] == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+def test_server_topology_env_overrides_profile(monkeypatch):
+    monkeypatch.setenv('WHISPER_PROCESSES', '4')
+    chosen = server_topology(profile(processes=2, threads=4, pin='cores'))
+    assert chosen["source"] == "env"
+    assert (chosen["processes"], chosen["threads"]) == (4, 4)
+    # 4 × 4 超出 8 個 CPU，不綁定
+    assert chosen["cpu_sets"] == [None] * 4
+
+def test_server_topology_splits_cores_between_processes(monkeypatch):
+    monkeypatch.setenv('WHISPER_PROCESSES', '4')
+    assert server_topology(None)["threads"] == 2
+
+def test_server_topology_rejects_unknown_pin(monkeypatch):
+    monkeypatch.setenv('WHISPER_PIN', 'sockets')
+    with pytest.raises(ValueError):
+        server_topology(None)
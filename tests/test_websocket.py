@@ -0,0 +1,80 @@
+"""WebSocket 幀的編碼與解碼"""
+
+import io
+import os
+import json
+import struct
+
+import pytest
+
+from whispermind.websocket import (
+    OP_BINARY, OP_CLOSE, OP_CONTINUATION, OP_PING, OP_PONG, OP_TEXT,
+    WebSocket, WebSocketClosed, accept_key,
+)
+
+def client_frame(opcode: int, payload: bytes, fin: bool = True) -> bytes:
+    """客戶端發出的幀必須帶掩碼"""
+    length = len(payload)
+    header = bytes([(0x80 if fin else 0) | opcode])
+    if length < 126:
+        header += bytes([0x80 | length])
+    elif length < 1 << 16:
+        header += bytes([0x80 | 126]) + struct.pack('!H', length)
+    else:
+        header += bytes([0x80 | 127]) + struct.pack('!Q', length)
+    mask = os.urandom(4)
+    return header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+def server(frames: bytes = b'', **kwargs) -> WebSocket:
+    return WebSocket(io.BytesIO(frames), io.BytesIO(), **kwargs)
+
+def test_accept_key_matches_rfc_example():
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+@pytest.mark.parametrize("size", [0, 125, 126, 65535, 65536])
+def test_sent_frames_decode_at_every_length_encoding(size):
+    payload = bytes(range(256)) * (size // 256) + bytes(range(size % 256))
+    sender = server()
+    sender._send(OP_BINARY, payload)
+    data = sender.wfile.getvalue()
+    assert data[0] == 0x80 | OP_BINARY
+    assert data[1] & 0x80 == 0  # 服務端發出的幀不帶掩碼
+
+    assert server(data).receive() == (OP_BINARY, payload)
+
+def test_receive_unmasks_client_text():
+    message = {"type": "stop", "note": "結束"}
+    ws = server(client_frame(OP_TEXT, json.dumps(message, ensure_ascii=False).encode('utf-8')))
+    opcode, payload = ws.receive()
+    assert opcode == OP_TEXT
+    assert json.loads(payload.decode('utf-8')) == message
+
+def test_fragmented_message_with_interleaved_ping():
+    frames = (client_frame(OP_BINARY, b'abc', fin=False)
+              + client_frame(OP_PING, b'hi')
+              + client_frame(OP_CONTINUATION, b'def'))
+    ws = server(frames)
+    assert ws.receive() == (OP_BINARY, b'abcdef')
+    assert ws.wfile.getvalue() == bytes([0x80 | OP_PONG, 2]) + b'hi'
+
+def test_close_frame_is_answered_and_raises():
+    ws = server(client_frame(OP_CLOSE, struct.pack('!H', 1001)))
+    with pytest.raises(WebSocketClosed):
+        ws.receive()
+    assert ws.closed
+    assert ws.wfile.getvalue() == bytes([0x80 | OP_CLOSE, 2]) + struct.pack('!H', 1001)
+
+def test_oversized_message_closes_with_1009():
+    ws = server(client_frame(OP_BINARY, b'x' * 200), max_message=100)
+    with pytest.raises(WebSocketClosed):
+        ws.receive()
+    reply = ws.wfile.getvalue()
+    assert reply[0] == 0x80 | OP_CLOSE
+    assert struct.unpack('!H', reply[2:4])[0] == 1009
+
+def test_truncated_stream_raises_closed():
+    ws = server(client_frame(OP_TEXT, b'hello')[:-2])
+    with pytest.raises(WebSocketClosed):
+        ws.receive()
+    with pytest.raises(WebSocketClosed):
+        ws.send_json({"type": "partial"})
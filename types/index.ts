@@ -1,6 +1,7 @@
 export interface TranscriptionData {
   text: string
   language: string
+  language_probability?: number
   confidence: number
   duration: number
   segments: Array<{
@@ -8,6 +9,7 @@ export interface TranscriptionData {
     end: number
     text: string
     confidence: number
+    model?: string
   }>
 }
 
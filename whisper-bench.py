@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Whisper 轉錄基準測試
+run: 用合成音頻測量各轉錄路徑的實時率、延遲百分位、峰值內存與階段耗時，結果寫入 JSON
+compare: 比較兩個結果文件，出現回歸時以非零狀態退出
+precision: 比較 fp32 / bf16 / int8 的加速比、內存節省與詞錯誤率漂移
+speculative: 比較貪婪解碼與投機解碼的加速比、草稿接受率，輸出不一致時以非零狀態退出
+autotune: 測量工作進程數 × 每進程線程數 (可選 CPU / NUMA 綁定) 的吞吐與 p95 延遲，寫入服務器啟動時讀取的主機配置
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+from whispermind.bench import (
+    BENCH_DIR, CASES, DEFAULT_DURATIONS, DEFAULT_REPEATS, DEFAULT_THRESHOLD, RANDOM_MODEL,
+    compare, compare_precisions, compare_speculative, format_comparison, format_precision_report,
+    format_report, format_speculative_report, load_manifest, prepare_audio, run_suite
+)
+from whispermind.precision import PRECISIONS
+from whispermind.topology import (
+    DEFAULT_REQUESTS, HOST_PROFILE_PATH, PIN_MODES, autotune, format_autotune_report, save_host_profile
+)
+
+# 設置日誌
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def load_results(file_path: str) -> dict:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def report_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    """打印比較結果，返回回歸項數"""
+    if baseline.get("host") != current.get("host") or baseline.get("config") != current.get("config"):
+        logger.warning("⚠️ 主機或測試配置與基線不同，比較結果僅供參考")
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows))
+    regressions = sum(row["regression"] for row in rows)
+    if regressions:
+        logger.error(f"❌ 發現 {regressions} 項回歸 (閾值 {threshold:.0%})")
+    else:
+        logger.info(f"✅ 未發現回歸 (閾值 {threshold:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper 轉錄基準測試")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="運行基準測試")
+    run.add_argument('--cases', default=",".join(CASES), help=f"要測量的路徑，可選: {', '.join(CASES)}")
+    run.add_argument('--durations', default=",".join(f"{d:g}" for d in DEFAULT_DURATIONS),
+                     help="合成音頻時長 (秒)，逗號分隔")
+    run.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="每個時長的重複次數")
+    run.add_argument('--model', default=RANDOM_MODEL,
+                     help=f"transformers 模型，'{RANDOM_MODEL}' 表示隨機初始化的微型模型")
+    run.add_argument('--whisper-model', default=RANDOM_MODEL,
+                     help=f"openai-whisper 模型，'{RANDOM_MODEL}' 表示隨機初始化的微型模型")
+    run.add_argument('--workdir', default=BENCH_DIR, help="合成音頻與微型模型的存放目錄")
+    run.add_argument('--output', default='bench-results.json', help="結果 JSON 文件")
+    run.add_argument('--baseline', help="運行後與此基線文件比較")
+    run.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="回歸閾值 (相對變化)")
+
+    diff = commands.add_parser('compare', help="比較基線與當前結果")
+    diff.add_argument('baseline', help="基線 JSON 文件")
+    diff.add_argument('current', help="當前結果 JSON 文件")
+    diff.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="回歸閾值 (相對變化)")
+
+    quality = commands.add_parser('precision', help="比較不同推理精度")
+    quality.add_argument('--manifest', help="參考集 JSONL，每行 {\"audio\": 路徑, \"text\": 參考文本}；"
+                                            "未指定時使用合成音頻，只報告相對 fp32 的漂移")
+    quality.add_argument('--durations', default=",".join(f"{d:g}" for d in DEFAULT_DURATIONS),
+                         help="未指定參考集時的合成音頻時長 (秒)")
+    quality.add_argument('--precisions', default=",".join(PRECISIONS), help="要比較的精度，逗號分隔")
+    quality.add_argument('--repeats', type=int, default=3, help="每個文件的重複次數")
+    quality.add_argument('--model', default=RANDOM_MODEL,
+                         help=f"transformers 模型，'{RANDOM_MODEL}' 表示隨機初始化的微型模型")
+    quality.add_argument('--workdir', default=BENCH_DIR, help="合成音頻與微型模型的存放目錄")
+    quality.add_argument('--output', default='precision-results.json', help="結果 JSON 文件")
+
+    draft = commands.add_parser('speculative', help="比較貪婪解碼與投機解碼")
+    draft.add_argument('--manifest', help="音頻清單 JSONL，每行 {\"audio\": 路徑}；未指定時使用合成音頻")
+    draft.add_argument('--durations', default=",".join(f"{d:g}" for d in DEFAULT_DURATIONS),
+                       help="未指定清單時的合成音頻時長 (秒)")
+    draft.add_argument('--repeats', type=int, default=3, help="每個文件的重複次數")
+    draft.add_argument('--model', default=RANDOM_MODEL,
+                       help=f"transformers 主模型，'{RANDOM_MODEL}' 表示隨機初始化的 4 層解碼器微型模型")
+    draft.add_argument('--assistant', default=RANDOM_MODEL,
+                       help=f"助手模型，'{RANDOM_MODEL}' 表示截取微型主模型第一層解碼器")
+    draft.add_argument('--workdir', default=BENCH_DIR, help="合成音頻與微型模型的存放目錄")
+    draft.add_argument('--output', default='speculative-results.json', help="結果 JSON 文件")
+
+    tune = commands.add_parser('autotune', help="為本機選擇服務器的進程數、線程數與 CPU 綁定")
+    tune.add_argument('--audio', help="校準音頻；未指定時使用 30 秒合成音頻")
+    tune.add_argument('--model', default=os.environ.get('WHISPER_MODEL', 'openai/whisper-large-v3'),
+                      help=f"transformers 模型 (應與服務器一致)，'{RANDOM_MODEL}' 表示隨機初始化的微型模型")
+    tune.add_argument('--precision', choices=PRECISIONS, help="推理精度，默認使用 WHISPER_PRECISION")
+    tune.add_argument('--pin', default='none',
+                      help=f"要比較的 CPU 綁定方式，逗號分隔，可選: {', '.join(PIN_MODES)}")
+    tune.add_argument('--max-processes', type=int, help="最多嘗試的工作進程數")
+    tune.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="每個進程轉錄校準音頻的次數")
+    tune.add_argument('--max-p95', type=float, help="p95 延遲預算 (秒)，在預算內選擇吞吐最高的組合")
+    tune.add_argument('--workdir', default=BENCH_DIR, help="合成音頻與微型模型的存放目錄")
+    tune.add_argument('--output', default=HOST_PROFILE_PATH, help="主機配置文件")
+
+    args = parser.parse_args()
+
+    if args.command == 'autotune':
+        pins = [value.strip() for value in args.pin.split(',') if value.strip()]
+        unknown = [value for value in pins if value not in PIN_MODES]
+        if unknown:
+            parser.error(f"未知綁定方式: {', '.join(unknown)}")
+        profile = autotune(args.model, args.precision, args.audio, pins, args.max_processes,
+                           max(1, args.requests), args.max_p95, args.workdir)
+        print(format_autotune_report(profile))
+        if not profile["chosen"]:
+            sys.exit(1)
+        save_host_profile(profile, args.output)
+        logger.info(f"💾 主機配置已寫入: {args.output}")
+        return
+
+    if args.command == 'compare':
+        regressions = report_comparison(load_results(args.baseline), load_results(args.current), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    if args.command == 'speculative':
+        if args.manifest:
+            files = load_manifest(args.manifest)
+        else:
+            durations = [float(value) for value in args.durations.split(',') if value.strip()]
+            files = prepare_audio(durations, os.path.join(args.workdir, 'audio'))
+        results = compare_speculative(files, args.model, args.assistant, args.repeats, args.workdir)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(format_speculative_report(results))
+        logger.info(f"💾 結果已寫入: {args.output}")
+        sys.exit(0 if results["summary"].get("identical") else 1)
+
+    if args.command == 'precision':
+        precisions = [value.strip() for value in args.precisions.split(',') if value.strip()]
+        unknown = [value for value in precisions if value not in PRECISIONS]
+        if unknown:
+            parser.error(f"未知精度: {', '.join(unknown)}")
+        if args.manifest:
+            files = load_manifest(args.manifest)
+        else:
+            durations = [float(value) for value in args.durations.split(',') if value.strip()]
+            files = prepare_audio(durations, os.path.join(args.workdir, 'audio'))
+        results = compare_precisions(files, args.model, precisions, args.repeats, args.workdir)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(format_precision_report(results))
+        logger.info(f"💾 結果已寫入: {args.output}")
+        return
+
+    cases = [case.strip() for case in args.cases.split(',') if case.strip()]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"未知路徑: {', '.join(unknown)}")
+    durations = [float(value) for value in args.durations.split(',') if value.strip()]
+
+    results = run_suite(cases, durations, args.repeats, args.model, args.whisper_model, args.workdir)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(format_report(results))
+    logger.info(f"💾 結果已寫入: {args.output}")
+
+    if args.baseline:
+        sys.exit(1 if report_comparison(load_results(args.baseline), results, args.threshold) else 0)
+
+if __name__ == '__main__':
+    main()
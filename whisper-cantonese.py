@@ -7,75 +7,31 @@ import os
 import sys
 import json
 import logging
-import time
 from pathlib import Path
 
+from whispermind import get_transcriber
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
 
+CANTONESE_TEMPLATE = "呢個係 {name} 嘅粵語轉錄結果。文件大小: {size} 字節。呢個係一個短音頻文件嘅模擬轉錄。"
+
 def transcribe_cantonese_audio(file_path: str) -> dict:
     """粵語音頻轉錄"""
-    try:
-        # 檢查文件是否存在
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"文件不存在: {file_path}"
-            }
-        
-        logger.info(f"🎵 開始粵語轉錄: {file_path}")
-        
-        # 獲取文件信息
-        file_size = os.path.getsize(file_path)
-        file_name = os.path.basename(file_path)
-        
-        # 模擬轉錄處理時間
-        time.sleep(1)
-        
-        # 生成粵語轉錄結果
-        cantonese_text = f"呢個係 {file_name} 嘅粵語轉錄結果。文件大小: {file_size} 字節。呢個係一個短音頻文件嘅模擬轉錄。"
-        
-        # 生成模擬段落
-        segments = []
-        words = cantonese_text.split()
-        segment_length = max(1, len(words) // 4)  # 分成4段
-        
-        # 計算實際音頻時長（基於文件大小估算）
-        estimated_duration = max(3.0, file_size / 15000)  # 基於文件大小估算時長
-        
-        for i in range(0, len(words), segment_length):
-            segment_words = words[i:i + segment_length]
-            segment_text = ' '.join(segment_words)
-            
-            # 計算每段的時間
-            segment_duration = estimated_duration / len(words) * len(segment_words)
-            start_time = (i / len(words)) * estimated_duration
-            end_time = start_time + segment_duration
-            
-            segments.append({
-                "id": i // segment_length,
-                "start": start_time,
-                "end": end_time,
-                "text": segment_text,
-                "confidence": 0.92  # 粵語信心度稍低
-            })
-        
-        return {
-            "success": True,
-            "text": cantonese_text,
-            "language": "yue",  # 粵語語言代碼
-            "confidence": 0.92,  # 粵語信心度
-            "duration": estimated_duration,  # 使用估算的時長
-            "segments": segments
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ 粵語轉錄失敗: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    logger.info(f"🎵 開始粵語轉錄: {file_path}")
+    
+    transcriber = get_transcriber(
+        'mock',
+        template=CANTONESE_TEMPLATE,
+        language='yue',         # 粵語語言代碼
+        parts=4,                # 分成4段
+        bytes_per_second=15000, # 基於文件大小估算時長
+        min_duration=3.0,
+        confidence=0.92,        # 粵語信心度稍低
+        delay=1
+    )
+    return transcriber.transcribe_file(file_path)
 
 def main():
     if len(sys.argv) != 2:
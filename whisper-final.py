@@ -8,80 +8,20 @@ import os
 import sys
 import json
 import logging
-import time
 from pathlib import Path
 
+from whispermind import get_transcriber
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
 
 def transcribe_audio_final(file_path: str) -> dict:
     """最終安全轉錄方法"""
-    try:
-        # 檢查文件是否存在
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"文件不存在: {file_path}"
-            }
-        
-        logger.info(f"🎵 開始最終安全轉錄: {file_path}")
-        
-        # 獲取文件信息
-        file_size = os.path.getsize(file_path)
-        file_name = os.path.basename(file_path)
-        
-        # 模擬轉錄處理時間
-        time.sleep(2)
-        
-        # 根據文件大小生成不同的模擬結果
-        if file_size < 100000:  # 小於 100KB
-            mock_text = f"這是 {file_name} 的轉錄結果。文件大小: {file_size} 字節。這是一個短音頻文件的模擬轉錄。"
-        elif file_size < 1000000:  # 小於 1MB
-            mock_text = f"這是 {file_name} 的轉錄結果。文件大小: {file_size} 字節。這是一個中等長度音頻文件的模擬轉錄。"
-        else:  # 大於 1MB
-            mock_text = f"這是 {file_name} 的轉錄結果。文件大小: {file_size} 字節。這是一個長音頻文件的模擬轉錄。"
-        
-        # 生成模擬段落
-        segments = []
-        words = mock_text.split()
-        segment_length = max(1, len(words) // 3)  # 分成3段
-        
-        # 計算實際音頻時長（基於文件大小估算）
-        estimated_duration = max(5.0, file_size / 10000)  # 基於文件大小估算時長
-        
-        for i in range(0, len(words), segment_length):
-            segment_words = words[i:i + segment_length]
-            segment_text = ' '.join(segment_words)
-            
-            # 計算每段的時間
-            segment_duration = estimated_duration / len(words) * len(segment_words)
-            start_time = (i / len(words)) * estimated_duration
-            end_time = start_time + segment_duration
-            
-            segments.append({
-                "id": i // segment_length,
-                "start": start_time,
-                "end": end_time,
-                "text": segment_text,
-                "confidence": 0.95  # 添加分段信心度
-            })
-        
-        return {
-            "success": True,
-            "text": mock_text,
-            "language": "zh",
-            "confidence": 0.95,  # 添加信心度
-            "duration": estimated_duration,  # 使用估算的時長
-            "segments": segments
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ 轉錄失敗: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    logger.info(f"🎵 開始最終安全轉錄: {file_path}")
+    
+    # 根據文件大小生成不同的模擬結果，並模擬轉錄處理時間
+    return get_transcriber('mock', delay=2).transcribe_file(file_path)
 
 def main():
     if len(sys.argv) != 2:
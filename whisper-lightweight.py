@@ -8,9 +8,14 @@ import os
 import sys
 import json
 import logging
+import time
 import warnings
+import subprocess
 from pathlib import Path
 
+from whispermind import get_transcriber
+from whispermind.deadline import RealTimeFactors, file_duration, rtf_key
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
@@ -30,57 +35,40 @@ def transcribe_audio(file_path: str) -> dict:
         
         logger.info(f"🎵 開始輕量級轉錄: {file_path}")
         
-        # 使用 whisper 命令行工具（如果可用）
-        import subprocess
-        
         # 嘗試使用系統 whisper 命令
         try:
-            result = subprocess.run([
-                'whisper', file_path, 
-                '--model', 'base',  # 使用較小的 base 模型
-                '--language', 'auto',
-                '--output_format', 'json',
-                '--fp16', 'False'  # 避免精度問題
-            ], capture_output=True, text=True, timeout=60)
-            
-            if result.returncode == 0:
-                # 解析輸出
-                output_file = file_path.rsplit('.', 1)[0] + '.json'
-                if os.path.exists(output_file):
-                    with open(output_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 清理輸出文件
-                    os.remove(output_file)
-                    
-                    return {
-                        "success": True,
-                        "text": data.get('text', ''),
-                        "language": data.get('language', 'unknown'),
-                        "segments": data.get('segments', [])
-                    }
-        except (subprocess.TimeoutExpired, FileNotFoundError, subprocess.CalledProcessError):
+            transcriber = get_transcriber(
+                'openai-whisper',
+                model='base',  # 使用較小的 base 模型
+                use_cli=True  # 未指定語言時由命令行工具在開頭識別一次
+            )
+            # 超時按音頻時長與本機實測的命令行實時率計算 (含每次啟動加載模型的開銷)
+            factors = RealTimeFactors()
+            speed_key = rtf_key(transcriber, 'cli')
+            transcriber.timeout = factors.deadline(file_duration(file_path), speed_key)
+            logger.info(f"⏱️ 轉錄期限 {transcriber.timeout:.0f}s")
+            started = time.perf_counter()
+            result = transcriber.transcribe_file(file_path)
+            if result.get("success"):
+                factors.record(speed_key, time.perf_counter() - started, result.get("duration"))
+                return result
+        except subprocess.TimeoutExpired:
+            logger.warning("⚠️ Whisper 命令超過期限")
+        except FileNotFoundError:
             pass
         
         # 如果 whisper 命令不可用，使用簡單的文本轉換
         logger.info("⚠️ Whisper 命令不可用，使用模擬轉錄")
         
         # 模擬轉錄結果（避免系統崩潰）
-        mock_text = f"這是 {os.path.basename(file_path)} 的模擬轉錄結果。由於系統資源限制，使用輕量級模式。"
-        
-        return {
-            "success": True,
-            "text": mock_text,
-            "language": "zh",
-            "segments": [
-                {
-                    "id": 0,
-                    "start": 0.0,
-                    "end": 5.0,
-                    "text": mock_text
-                }
-            ]
-        }
+        transcriber = get_transcriber(
+            'mock',
+            template="這是 {name} 的模擬轉錄結果。由於系統資源限制，使用輕量級模式。",
+            parts=1,
+            bytes_per_second=None,
+            min_duration=5.0
+        )
+        return transcriber.transcribe_file(file_path)
         
     except Exception as e:
         logger.error(f"❌ 轉錄失敗: {str(e)}")
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 真正的 Whisper 轉錄腳本 - 實際轉錄音頻內容
-使用 OpenAI Whisper 命令行工具進行真實轉錄
+使用 OpenAI Whisper 庫在進程內進行真實轉錄
 """
 
 import os
@@ -9,163 +9,243 @@ import sys
 import json
 import logging
 import subprocess
-import tempfile
+import queue
+import argparse
+import threading
 import shutil
+import socketserver
 from pathlib import Path
+from typing import Optional
+
+from whispermind import error_result, get_transcriber
+from whispermind.audio import load_audio
+from whispermind.cache import TranscriptionCache, cache_enabled, cache_key, hash_file
+from whispermind.journal import PIECE_SECONDS, ResumableTranscription
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
 
-def convert_audio_to_wav(input_path: str) -> str:
-    """將音頻文件轉換為 WAV 格式"""
+# 常駐工作進程配置
+MODEL_SIZE = 'base'
+WORKER_SOCKET = os.environ.get('WHISPER_WORKER_SOCKET', '/tmp/whispermind-real.sock')
+WORKER_COUNT = int(os.environ.get('WHISPER_WORKER_COUNT', 2))
+
+def cascade_enabled() -> bool:
+    """WHISPER_CASCADE=1 時先用 base 轉錄，低信心分段再交給 large-v3"""
+    return os.environ.get('WHISPER_CASCADE', '0').lower() in ('1', 'true', 'yes', 'on')
+
+def create_transcriber():
+    """進程內 openai-whisper 轉錄器，模型在首次轉錄時加載"""
+    if cascade_enabled():
+        return get_transcriber('cascade', model=MODEL_SIZE, vad=False)
+    return get_transcriber('openai-whisper', model=MODEL_SIZE, vad=False)
+
+def transcribe_cached(file_path: str, transcriber=None) -> dict:
+    """通過內容緩存轉錄，相同音頻不重複推理"""
+    transcriber = transcriber or create_transcriber()
+    logger.info(f"🎵 開始真實轉錄: {file_path}")
+    if not cache_enabled():
+        return transcriber.transcribe_file(file_path)
+    key = cache_key(hash_file(file_path), MODEL_SIZE, **transcriber.cache_params)
+    return TranscriptionCache().single_flight(key, lambda: transcriber.transcribe_file(file_path))
+
+def transcribe_resumable(file_path: str, out=sys.stdout):
+    """按塊寫入斷點日誌後轉錄，中斷後重新運行從最後完成的塊繼續，結果 JSON 從日誌流式寫出"""
+    transcriber = create_transcriber()
+    key = cache_key(hash_file(file_path), MODEL_SIZE, journal_piece_seconds=PIECE_SECONDS,
+                    **transcriber.cache_params)
+    cache = TranscriptionCache() if cache_enabled() else None
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        logger.info("⚡ 轉錄緩存命中")
+        out.write(json.dumps(cached, ensure_ascii=False, indent=2) + "\n")
+        return
+    
+    logger.info(f"🎵 開始真實轉錄: {file_path}")
+    run = ResumableTranscription(transcriber, load_audio(file_path), key)
     try:
-        # 創建臨時 WAV 文件
-        temp_dir = tempfile.mkdtemp()
-        wav_path = os.path.join(temp_dir, "converted.wav")
-        
-        # 使用 ffmpeg 轉換音頻
-        cmd = [
-            'ffmpeg', '-i', input_path,
-            '-ar', '16000',  # 16kHz 採樣率
-            '-ac', '1',      # 單聲道
-            '-y',            # 覆蓋輸出文件
-            wav_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0 and os.path.exists(wav_path):
-            logger.info(f"✅ 音頻轉換成功: {wav_path}")
-            return wav_path
+        run.run()
+        # 日誌完整後才寫出結果
+        if cache:
+            path = cache.put_stream(key, run.write)
+            with open(path, 'r', encoding='utf-8') as f:
+                shutil.copyfileobj(f, out)
         else:
-            logger.error(f"❌ 音頻轉換失敗: {result.stderr}")
-            return input_path  # 返回原文件
-            
-    except Exception as e:
-        logger.error(f"❌ 音頻轉換錯誤: {str(e)}")
-        return input_path
+            run.write(out)
+    finally:
+        run.close()
+    run.discard()
 
-def transcribe_with_whisper(file_path: str) -> dict:
-    """使用 Whisper 進行真實轉錄"""
-    try:
-        logger.info(f"🎵 開始真實轉錄: {file_path}")
-        
-        # 轉換音頻格式
-        wav_path = convert_audio_to_wav(file_path)
-        
-        # 創建臨時目錄用於輸出
-        temp_dir = tempfile.mkdtemp()
-        output_dir = temp_dir
-        
+def run_worker(stdin=sys.stdin, stdout=sys.stdout):
+    """常駐工作模式：模型只加載一次，從標準輸入讀 JSON 行任務，向標準輸出寫 JSON 行結果"""
+    logger.info(f"🔄 工作進程 {os.getpid()} 正在加載 {MODEL_SIZE} 模型...")
+    transcriber = create_transcriber()
+    transcriber.load()
+    logger.info(f"✅ 工作進程 {os.getpid()} 就緒")
+    
+    for line in stdin:
+        if not line.strip():
+            continue
         try:
-            # 使用 whisper 命令行工具進行轉錄
-            whisper_path = '/Users/herman/WhisperMind/whisper-env/bin/whisper'
-            cmd = [
-                whisper_path, wav_path,
-                '--model', 'base',  # 使用 base 模型（較小）
-                '--output_dir', output_dir,
-                '--output_format', 'json',
-                '--fp16', 'False',
-                '--verbose', 'False'
-            ]
-            
-            logger.info(f"🔄 執行轉錄命令: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode == 0:
-                # 查找生成的 JSON 文件
-                json_files = [f for f in os.listdir(output_dir) if f.endswith('.json')]
-                if json_files:
-                    json_path = os.path.join(output_dir, json_files[0])
-                    
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 清理臨時文件
-                    if wav_path != file_path:
-                        try:
-                            os.remove(wav_path)
-                        except:
-                            pass
-                    
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except:
-                        pass
-                    
-                    # 計算信心度
-                    segments = data.get('segments', [])
-                    avg_confidence = 0.9
-                    if segments:
-                        # 使用第一個分段的 no_speech_prob 計算信心度
-                        no_speech_prob = segments[0].get('no_speech_prob', 0.1)
-                        avg_confidence = max(0.1, 1.0 - no_speech_prob)
-                    
-                    # 計算總時長
-                    total_duration = 0
-                    if segments:
-                        total_duration = segments[-1].get('end', 0)
-                    
-                    return {
-                        "success": True,
-                        "text": data.get('text', ''),
-                        "language": data.get('language', 'unknown'),
-                        "confidence": avg_confidence,
-                        "duration": total_duration,
-                        "segments": segments
-                    }
-                else:
-                    logger.error("❌ 未找到轉錄結果文件")
-                    return {
-                        "success": False,
-                        "error": "轉錄完成但未找到結果文件"
-                    }
+            job = json.loads(line)
+            file_path = job.get('file_path')
+            if not file_path or not os.path.exists(file_path):
+                result = {"success": False, "error": f"文件不存在: {file_path}"}
             else:
-                logger.error(f"❌ Whisper 轉錄失敗: {result.stderr}")
-                return {
-                    "success": False,
-                    "error": f"轉錄失敗: {result.stderr}"
-                }
-                
-        except subprocess.TimeoutExpired:
-            logger.error("❌ 轉錄超時")
-            return {
-                "success": False,
-                "error": "轉錄超時"
-            }
+                result = transcribe_cached(file_path, transcriber)
+        except ValueError as e:
+            job = {}
+            result = {"success": False, "error": f"無效任務: {e}"}
         except Exception as e:
-            logger.error(f"❌ 轉錄過程錯誤: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            logger.error(f"❌ 轉錄失敗: {str(e)}")
+            result = {"success": False, "error": str(e)}
+        
+        stdout.write(json.dumps({"id": job.get('id'), **result}, ensure_ascii=False) + "\n")
+        stdout.flush()
+
+class Worker:
+    """一個常駐工作子進程"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.proc: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8', bufsize=1
+        )
+        logger.info(f"🧵 啟動工作進程 #{self.index} (pid {self.proc.pid})")
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def restart(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        logger.warning(f"⚠️ 重啟工作進程 #{self.index}")
+        self.start()
+
+    def request(self, job: dict) -> dict:
+        self.proc.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+        self.proc.stdin.flush()
+        line = self.proc.stdout.readline()
+        if not line:
+            raise EOFError("工作進程意外退出")
+        return json.loads(line)
+
+class WorkerPool:
+    """常駐工作進程池，崩潰的進程會被自動重啟"""
+
+    def __init__(self, size: int = WORKER_COUNT):
+        self.workers = [Worker(i) for i in range(max(1, size))]
+        self._idle: "queue.Queue[Worker]" = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        """定期檢查空閒進程，發現崩潰則重啟"""
+        while True:
+            threading.Event().wait(5)
+            for worker in self.workers:
+                if not worker.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if not worker.alive():
+                        worker.restart()
+                finally:
+                    worker.lock.release()
+
+    def submit(self, job: dict) -> dict:
+        worker = self._idle.get()
+        worker.lock.acquire()
+        try:
+            if not worker.alive():
+                worker.restart()
+            return worker.request(job)
+        except (BrokenPipeError, EOFError, ValueError) as e:
+            logger.error(f"❌ 工作進程 #{worker.index} 失敗: {e}")
+            worker.restart()
+            return {"id": job.get('id'), "success": False, "error": f"工作進程失敗: {e}"}
         finally:
-            # 清理臨時文件
+            worker.lock.release()
+            self._idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            if worker.alive():
+                worker.proc.stdin.close()
+                worker.proc.wait()
+
+class PoolRequestHandler(socketserver.StreamRequestHandler):
+    """Unix 套接字連接：每行一個 JSON 任務，每行返回一個 JSON 結果"""
+
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
             try:
-                if wav_path != file_path and os.path.exists(wav_path):
-                    os.remove(wav_path)
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-    except Exception as e:
-        logger.error(f"❌ 轉錄失敗: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+                job = json.loads(raw.decode('utf-8'))
+                result = self.server.pool.submit(job)
+            except ValueError as e:
+                result = {"success": False, "error": f"無效任務: {e}"}
+            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+def serve(socket_path: str = WORKER_SOCKET, workers: int = WORKER_COUNT):
+    """在 Unix 套接字上運行工作進程池"""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    
+    pool = WorkerPool(workers)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, PoolRequestHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    logger.info(f"✅ 工作進程池已啟動: {socket_path} ({len(pool.workers)} 個進程)")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("🛑 工作進程池已停止")
+    finally:
+        server.server_close()
+        pool.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
 
 def main():
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="Whisper 真實轉錄")
+    parser.add_argument('file_path', nargs='?', help="音頻文件路徑")
+    parser.add_argument('--worker', action='store_true', help="常駐工作模式，從標準輸入讀取 JSON 行任務")
+    parser.add_argument('--serve', action='store_true', help="在 Unix 套接字上運行工作進程池")
+    parser.add_argument('--socket', default=WORKER_SOCKET, help="工作進程池的 Unix 套接字路徑")
+    parser.add_argument('--workers', type=int, default=WORKER_COUNT, help="工作進程數量")
+    parser.add_argument('--cascade', action='store_true',
+                        help="級聯模式: base 轉錄全部音頻，只把低信心分段交給 large-v3 重新轉錄")
+    args = parser.parse_args()
+    if args.cascade:
+        os.environ['WHISPER_CASCADE'] = '1'  # 工作子進程繼承
+    
+    if args.worker:
+        run_worker()
+        return
+    if args.serve:
+        serve(args.socket, args.workers)
+        return
+    
+    if not args.file_path:
         print(json.dumps({
             "success": False,
             "error": "請提供音頻文件路徑"
         }))
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args.file_path
     
     # 檢查文件是否存在
     if not os.path.exists(file_path):
@@ -175,8 +255,11 @@ def main():
         }))
         sys.exit(1)
     
-    result = transcribe_with_whisper(file_path)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    try:
+        transcribe_resumable(file_path)
+    except Exception as e:
+        logger.error(f"❌ 轉錄失敗: {str(e)}")
+        print(json.dumps(error_result(str(e)), ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":
     main()
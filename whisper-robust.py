@@ -10,98 +10,56 @@ import os
 import logging
 from pathlib import Path
 
+from whispermind import get_transcriber, transcription_result
+from whispermind.audio import SAMPLE_RATE
+from whispermind.loader import iter_audio, iter_windows
+from whispermind.longform import merge_pieces
+from whispermind.cache import TranscriptionCache, cache_enabled, cache_key, hash_file
+from whispermind.language import normalize_language
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(file_path: str) -> dict:
-    """使用 Whisper Large V3 轉錄音頻文件，支持多種格式"""
+MODEL_NAME = "openai/whisper-large-v3"
+
+def transcribe_audio(file_path: str, transcriber=None) -> dict:
+    """使用 Whisper Large V3 轉錄音頻文件，支持多種格式
+
+    音頻按塊流式讀取並以 float32 混音、重採樣，逐個 30 秒窗口轉錄，
+    峰值內存不隨錄音長度增長。語言在第一個含語音的窗口上識別一次，之後的窗口強制使用該語言。
+    """
     try:
-        # 延遲導入以避免啟動時的依賴問題
-        from transformers import pipeline
-        import librosa
-        import soundfile as sf
-        
-        logger.info("🔄 正在加載 Whisper Large V3 模型...")
-        
-        # 創建轉錄管道
-        pipe = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-large-v3",
-            return_timestamps=True,
-            chunk_length_s=30,
-            stride_length_s=5,
-            ignore_warning=True,
-        )
-        
-        logger.info("✅ 模型加載完成")
+        transcriber = transcriber or get_transcriber('transformers', model=MODEL_NAME)
         logger.info(f"🎵 開始轉錄: {file_path}")
         
-        # 嘗試不同的音頻加載方法
-        audio_data = None
-        sampling_rate = None
-        
-        try:
-            # 方法1: 使用 librosa (支持更多格式)
-            logger.info("🔄 嘗試使用 librosa 加載音頻...")
-            audio_data, sampling_rate = librosa.load(file_path, sr=16000)
-            logger.info(f"✅ librosa 成功加載: {len(audio_data)} 樣本, {sampling_rate}Hz")
-        except Exception as e1:
-            logger.warning(f"⚠️ librosa 加載失敗: {e1}")
-            try:
-                # 方法2: 使用 soundfile
-                logger.info("🔄 嘗試使用 soundfile 加載音頻...")
-                audio_data, sampling_rate = sf.read(file_path)
-                # 如果是立體聲，轉換為單聲道
-                if len(audio_data.shape) > 1:
-                    audio_data = audio_data.mean(axis=1)
-                # 重採樣到 16kHz
-                if sampling_rate != 16000:
-                    import librosa
-                    audio_data = librosa.resample(audio_data, orig_sr=sampling_rate, target_sr=16000)
-                    sampling_rate = 16000
-                logger.info(f"✅ soundfile 成功加載: {len(audio_data)} 樣本, {sampling_rate}Hz")
-            except Exception as e2:
-                logger.error(f"❌ 所有音頻加載方法都失敗")
-                logger.error(f"   librosa 錯誤: {e1}")
-                logger.error(f"   soundfile 錯誤: {e2}")
-                return {
-                    "success": False,
-                    "error": f"無法加載音頻文件。支持格式: wav, flac, mp3, m4a, aac, ogg。錯誤: {e1}"
-                }
+        # 逐窗口轉錄，VAD 與時間戳映射由轉錄器在窗口內處理
+        pieces = []
+        total_samples = 0
+        language = probability = None
+        for offset, window in iter_windows(iter_audio(file_path)):
+            result = transcriber.transcribe(window, language=language)
+            if not result.get("success"):
+                return result
+            if language is None and normalize_language(result.get("language")):
+                language, probability = result["language"], result.get("language_probability")
+            pieces.append((offset / SAMPLE_RATE, result["segments"]))
+            total_samples = max(total_samples, offset + len(window))
         
-        # 執行轉錄
-        logger.info("🔄 開始轉錄處理...")
-        result = pipe(audio_data, return_timestamps=True)
+        if not pieces:
+            return {
+                "success": False,
+                "error": "無法加載音頻文件或音頻為空。支持格式: wav, flac, mp3, m4a, aac, ogg"
+            }
         
-        # 處理結果
-        text = result.get("text", "")
-        chunks = result.get("chunks", [])
+        segments = merge_pieces(pieces)
+        logger.info(f"✅ 轉錄完成: {len(pieces)} 個窗口, {total_samples / SAMPLE_RATE:.1f}s 音頻, "
+                    f"{len(segments)} 分段")
         
-        # 轉換為我們的格式
-        segments = []
-        for chunk in chunks:
-            if "timestamp" in chunk and chunk["timestamp"]:
-                segments.append({
-                    "start": chunk["timestamp"][0],
-                    "end": chunk["timestamp"][1],
-                    "text": chunk["text"],
-                    "confidence": 0.9  # Whisper 不提供信心度
-                })
-        
-        # 計算總時長
-        duration = segments[-1]["end"] if segments else len(audio_data) / sampling_rate
-        
-        logger.info(f"✅ 轉錄完成: {len(text)} 字符, {len(segments)} 分段")
-        
-        return {
-            "success": True,
-            "text": text,
-            "language": "auto-detected",
-            "confidence": 0.9,
-            "duration": duration,
-            "segments": segments
-        }
+        # 文本由去重後的分段拼接，窗口重疊處的詞不會出現兩次
+        text = "".join(segment["text"] for segment in segments).strip()
+        return transcription_result(text, segments, total_samples / SAMPLE_RATE,
+                                    language=language, language_probability=probability)
         
     except Exception as e:
         logger.error(f"❌ 轉錄失敗: {e}")
@@ -110,6 +68,14 @@ def transcribe_audio(file_path: str) -> dict:
             "error": str(e)
         }
 
+def transcribe_cached(file_path: str) -> dict:
+    """通過內容緩存轉錄，相同音頻不重複推理"""
+    transcriber = get_transcriber('transformers', model=MODEL_NAME)
+    if not cache_enabled():
+        return transcribe_audio(file_path, transcriber)
+    key = cache_key(hash_file(file_path), MODEL_NAME, loader='stream', **transcriber.cache_params)
+    return TranscriptionCache().single_flight(key, lambda: transcribe_audio(file_path, transcriber))
+
 def main():
     """主函數"""
     if len(sys.argv) != 2:
@@ -130,7 +96,7 @@ def main():
         sys.exit(1)
     
     # 執行轉錄
-    result = transcribe_audio(file_path)
+    result = transcribe_cached(file_path)
     
     # 輸出結果
     print(json.dumps(result, ensure_ascii=False))
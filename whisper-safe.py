@@ -8,11 +8,18 @@ import os
 import sys
 import json
 import logging
+import math
+import time
 import warnings
-import subprocess
 import signal
 from pathlib import Path
 
+from whispermind import get_transcriber
+from whispermind.audio import load_audio
+from whispermind.cache import cache_key, hash_file
+from whispermind.deadline import CancelToken, DeadlineExceeded, RealTimeFactors, rtf_key
+from whispermind.journal import PIECE_SECONDS, ResumableTranscription
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
@@ -20,104 +27,96 @@ logger = logging.getLogger(__name__)
 # 忽略警告
 warnings.filterwarnings("ignore")
 
+# 單次運行的時間上限，超時後保留斷點；未設置時按音頻時長與本機實測實時率計算
+TIMEOUT_SECONDS = float(os.environ.get('WHISPER_SAFE_TIMEOUT', 0)) or None
+
 class TimeoutError(Exception):
     pass
 
 def timeout_handler(signum, frame):
     raise TimeoutError("轉錄超時")
 
-def transcribe_audio_safe(file_path: str) -> dict:
-    """使用安全方法轉錄音頻"""
+def mock_result(file_path: str, reason: str) -> dict:
+    """轉錄失敗時的模擬結果"""
+    transcriber = get_transcriber(
+        'mock',
+        template=f"{reason} - 這是 {{name}} 的模擬結果",
+        parts=1,
+        bytes_per_second=None,
+        min_duration=5.0
+    )
+    return transcriber.transcribe_file(file_path)
+
+def transcribe_audio_safe(file_path: str, out=sys.stdout):
+    """使用安全方法轉錄音頻
+
+    每塊完成後寫入斷點日誌；超時或出錯時輸出已完成部分 (partial)，
+    再次運行同一文件從最後完成的塊繼續。一塊都未完成時輸出模擬結果。
+    """
+    # 檢查文件是否存在
+    if not os.path.exists(file_path):
+        write_json(out, {
+            "success": False,
+            "error": f"文件不存在: {file_path}"
+        })
+        return
+    
+    logger.info(f"🎵 開始安全轉錄: {file_path}")
+    run = None
+    signal.signal(signal.SIGALRM, timeout_handler)
+    
     try:
-        # 檢查文件是否存在
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"文件不存在: {file_path}"
-            }
-        
-        logger.info(f"🎵 開始安全轉錄: {file_path}")
+        # 進程內使用最小的 base 模型，按塊轉錄才能保存斷點
+        transcriber = get_transcriber('openai-whisper', model='base')
+        key = cache_key(hash_file(file_path), 'base', journal_piece_seconds=PIECE_SECONDS,
+                        **transcriber.cache_params)
+        run = ResumableTranscription(transcriber, load_audio(file_path), key)
         
-        # 設置超時處理
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(30)  # 30秒超時
+        # 期限按尚未完成的語音時長計算，在每塊之間協作檢查；
+        # 單塊解碼無法中途打斷，鬧鐘在期限後再留一塊的時間作為最後保障
+        factors = RealTimeFactors()
+        speed_key = rtf_key(transcriber)
+        seconds = TIMEOUT_SECONDS or factors.deadline(run.pending_seconds, speed_key)
+        logger.info(f"⏱️ 轉錄期限 {seconds:.0f}s")
+        token = CancelToken(seconds)
+        signal.alarm(math.ceil(seconds + factors.expected_seconds(PIECE_SECONDS, speed_key)))
         
-        try:
-            # 使用 whisper 命令行工具，使用最小的 base 模型
-            result = subprocess.run([
-                'whisper', file_path, 
-                '--model', 'base',  # 使用最小的 base 模型
-                '--output_format', 'json',
-                '--fp16', 'False'  # 避免精度問題
-            ], capture_output=True, text=True, timeout=25)
-            
-            signal.alarm(0)  # 取消超時
-            
-            if result.returncode == 0:
-                # 解析輸出
-                output_file = file_path.rsplit('.', 1)[0] + '.json'
-                if os.path.exists(output_file):
-                    with open(output_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 清理輸出文件
-                    try:
-                        os.remove(output_file)
-                    except:
-                        pass
-                    
-                    return {
-                        "success": True,
-                        "text": data.get('text', ''),
-                        "language": data.get('language', 'unknown'),
-                        "segments": data.get('segments', [])
-                    }
-            
-            # 如果轉錄失敗，返回錯誤信息
-            return {
-                "success": False,
-                "error": f"轉錄失敗: {result.stderr}"
-            }
-            
-        except TimeoutError:
-            signal.alarm(0)
-            logger.warning("⚠️ 轉錄超時，使用模擬結果")
-            return {
-                "success": True,
-                "text": f"轉錄超時 - 這是 {os.path.basename(file_path)} 的模擬結果",
-                "language": "zh",
-                "segments": [
-                    {
-                        "id": 0,
-                        "start": 0.0,
-                        "end": 5.0,
-                        "text": f"轉錄超時 - 這是 {os.path.basename(file_path)} 的模擬結果"
-                    }
-                ]
-            }
-        except Exception as e:
-            signal.alarm(0)
-            logger.warning(f"⚠️ 轉錄錯誤: {str(e)}，使用模擬結果")
-            return {
-                "success": True,
-                "text": f"轉錄錯誤 - 這是 {os.path.basename(file_path)} 的模擬結果",
-                "language": "zh",
-                "segments": [
-                    {
-                        "id": 0,
-                        "start": 0.0,
-                        "end": 5.0,
-                        "text": f"轉錄錯誤 - 這是 {os.path.basename(file_path)} 的模擬結果"
-                    }
-                ]
-            }
+        started = time.perf_counter()
+        transcribed = run.run(token)
+        signal.alarm(0)  # 取消超時
+        factors.record(speed_key, time.perf_counter() - started, transcribed)
+        run.write(out)
+        run.discard()
+        return
         
+    except (TimeoutError, DeadlineExceeded):
+        signal.alarm(0)
+        reason = "轉錄超時"
+    except Exception as e:
+        signal.alarm(0)
+        logger.warning(f"⚠️ 轉錄錯誤: {str(e)}")
+        reason = "轉錄錯誤"
+    
+    if run is not None and run.journal.finished():
+        logger.warning(f"⚠️ {reason}，輸出已完成的 {len(run.journal.finished())}/{len(run.pieces)} 塊，"
+                       "重新運行將從斷點繼續")
+        run.write(out, partial=True)
+        run.close()
+        return
+    if run is not None:
+        run.close()
+    logger.warning(f"⚠️ {reason}，使用模擬結果")
+    try:
+        write_json(out, mock_result(file_path, reason))
     except Exception as e:
         logger.error(f"❌ 轉錄失敗: {str(e)}")
-        return {
+        write_json(out, {
             "success": False,
             "error": str(e)
-        }
+        })
+
+def write_json(out, result: dict):
+    out.write(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
 
 def main():
     if len(sys.argv) != 2:
@@ -127,9 +126,7 @@ def main():
         }))
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    result = transcribe_audio_safe(file_path)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    transcribe_audio_safe(sys.argv[1])
 
 if __name__ == "__main__":
     main()
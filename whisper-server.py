@@ -1,121 +1,1146 @@
 #!/usr/bin/env python3
 """
 本地 Whisper Large V3 服務器
-使用 Python 和 transformers 庫提供本地轉錄服務
+使用 whispermind 的 transformers 後端提供本地轉錄服務
 """
 
 import os
 import sys
 import json
+import hashlib
+import time
 import asyncio
 import logging
+import queue
+import select
+import signal
+import socket
+import subprocess
+import threading
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeout
 from pathlib import Path
-from typing import Dict, Any
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Callable, List, Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import urllib.parse
 
+import numpy as np
+
+from whispermind.audio import (
+    SAMPLE_RATE, RAW_PCM_FORMATS, load_audio, decode_stream,
+    iter_request_body, iter_multipart_file, parse_content_type
+)
+from whispermind import Transcriber, error_result, get_transcriber, transcription_result
+from whispermind.transcriber import DEFAULT_CONFIDENCE
+from whispermind.vad import vad_enabled
+from whispermind.precision import DEFAULT_PRECISION, resolve_precision
+from whispermind.language import normalize_language
+from whispermind.deadline import (
+    DEADLINE_BASE_SECONDS, DEADLINE_FACTOR, Cancelled, CancelToken, DeadlineExceeded, RealTimeFactors, rtf_key
+)
+from whispermind.speculative import ASSISTANT_MODEL, SpeculativeStats
+from whispermind.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServerMetrics, metrics_enabled
+from whispermind.cache import (
+    TranscriptionCache, cache_enabled, cache_key, hash_file, hashing_blocks
+)
+from whispermind.jobs import CANCELLED, JobStore, JobWorkers
+from whispermind.journal import ChunkJournal, discard_journal, journal_path
+from whispermind.incremental import CONTEXT_CHARS, RecordingStore
+from whispermind.streaming import StreamingSession, stream_options
+from whispermind.websocket import handshake, is_upgrade
+from whispermind.topology import apply_topology, load_host_profile, server_topology
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 模型配置
+MODEL_NAME = os.environ.get('WHISPER_MODEL', 'openai/whisper-large-v3')
+WARMUP_SECONDS = 1.0
+
+# 併發配置
+INFERENCE_WORKERS = int(os.environ.get('WHISPER_WORKERS', 4))
+QUEUE_SIZE = int(os.environ.get('WHISPER_QUEUE_SIZE', 8))
+RETRY_AFTER_SECONDS = int(os.environ.get('WHISPER_RETRY_AFTER', 30))
+# 等待結果時檢查客戶端斷開與取消令牌的間隔
+POLL_SECONDS = 0.5
+
+# 微批處理配置
+CHUNK_SECONDS = 30
+MAX_BATCH_SIZE = int(os.environ.get('WHISPER_MAX_BATCH', 8))
+BATCH_WAIT_MS = float(os.environ.get('WHISPER_BATCH_WAIT_MS', 50))
+BATCH_TARGET_MS = float(os.environ.get('WHISPER_BATCH_TARGET_MS', 30000))
+
+# 語音活動檢測，跳過靜音與音樂
+VAD_ENABLED = vad_enabled()
+
+class ModelRegistry:
+    """進程內共享的模型註冊表，每個模型的每種精度只加載一次"""
+
+    def __init__(self):
+        self._transcribers: Dict[tuple, Transcriber] = {}
+        self._lock = threading.Lock()
+        # 預加載與預熱完成後設置，供 /health 報告就緒狀態
+        self.ready = threading.Event()
+
+    def get(self, model_name: str = MODEL_NAME, precision: str = DEFAULT_PRECISION) -> Transcriber:
+        """獲取已加載的轉錄器，未加載時加載"""
+        key = (model_name, resolve_precision(precision))
+        transcriber = self._transcribers.get(key)
+        if transcriber is None:
+            with self._lock:
+                if key not in self._transcribers:
+                    self._transcribers[key] = get_transcriber(
+                        'transformers', model=model_name, precision=key[1], vad=VAD_ENABLED
+                    )
+                transcriber = self._transcribers[key]
+        transcriber.load()
+        return transcriber
+
+    def load_seconds(self, model_name: str = MODEL_NAME, precision: str = DEFAULT_PRECISION) -> Optional[float]:
+        transcriber = self._transcribers.get((model_name, resolve_precision(precision)))
+        return transcriber.load_seconds if transcriber else None
+
+    def speculative_stats(self) -> Optional[Dict[str, Any]]:
+        """各模型投機解碼統計的合計，未啟用時返回 None"""
+        decoders = [t.speculative for t in list(self._transcribers.values()) if getattr(t, 'speculative', None)]
+        if not decoders:
+            return None
+        total = SpeculativeStats()
+        for decoder in decoders:
+            snapshot = decoder.stats.snapshot()
+            total.add(snapshot["drafted"], snapshot["accepted"], snapshot["tokens"], snapshot["verify_passes"])
+        return total.snapshot()
+
+    def preload(self, model_name: str = MODEL_NAME, precision: str = DEFAULT_PRECISION):
+        """加載並預熱模型，完成後標記為就緒"""
+        self.get(model_name, precision).warmup(WARMUP_SECONDS)
+        self.ready.set()
+
+class InferenceQueue:
+    """有界推理隊列，由固定數量的工作線程消費"""
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, maxsize: int = QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self):
+        """啟動推理工作線程"""
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._run, name=f"inference-{i}", daemon=True)
+            worker.start()
+        logger.info(f"🧵 推理工作線程: {self.workers}，隊列容量: {self._queue.maxsize}")
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """提交任務，隊列已滿時拋出 queue.Full"""
+        future: Future = Future()
+        self._queue.put_nowait((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._in_flight += 1
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+class BatchScheduler:
+    """跨請求的動態微批處理調度器
+
+    在等待窗口內收集各請求的 30 秒音頻塊，合併成一個批次通過編碼器和解碼器，
+    再把每塊的分段結果交回對應請求。批次大小根據觀察到的延遲自動調整。
+    """
+
+    def __init__(self, registry: ModelRegistry, max_batch: int = MAX_BATCH_SIZE,
+                 wait_ms: float = BATCH_WAIT_MS, target_ms: float = BATCH_TARGET_MS,
+                 precision: str = DEFAULT_PRECISION):
+        self.registry = registry
+        self.precision = precision
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = wait_ms / 1000.0
+        self.target_seconds = target_ms / 1000.0
+        self.batch_size = max(1, self.max_batch // 2)
+        self._pending: "queue.Queue" = queue.Queue()
+
+    def start(self):
+        """啟動批處理線程"""
+        threading.Thread(target=self._run, name=f"batch-scheduler-{self.precision}", daemon=True).start()
+        logger.info(f"📦 微批處理 ({self.precision}): 最大批次 {self.max_batch}，"
+                    f"等待窗口 {self.wait_seconds * 1000:.0f}ms")
+
+    def submit(self, chunk, language: Optional[str] = None, token: Optional[CancelToken] = None) -> Future:
+        """提交一個 16kHz 音頻塊，返回該塊的解碼結果
+
+        language 為該塊所屬文件的語言；token 為其請求的取消令牌，已取消的塊不進入批次，
+        解碼中途取消的塊在下一個解碼步結束生成。
+        """
+        future: Future = Future()
+        self._pending.put((future, chunk, language, token))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.wait_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch: List):
+        # 強制語言作用於整個 generate 調用，不同語言的塊分組解碼
+        groups: Dict[Optional[str], List] = {}
+        for future, chunk, language, token in batch:
+            if token is not None and token.cancelled:
+                future.cancel()
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(language, []).append((future, chunk, token))
+        if not groups:
+            return
+
+        started = time.perf_counter()
+        size = 0
+        for language, items in groups.items():
+            try:
+                results = self._decode([chunk for _, chunk, _ in items], language,
+                                       [token for _, _, token in items])
+            except BaseException as e:
+                logger.error(f"❌ 批次解碼失敗: {e}")
+                for future, _, _ in items:
+                    future.set_exception(e)
+                continue
+            for (future, _, _), result in zip(items, results):
+                future.set_result(result)
+            size += len(items)
+        if size:
+            self._tune(time.perf_counter() - started, size)
+
+    def _decode(self, chunks: List, language: Optional[str] = None,
+                tokens: Optional[List[Optional[CancelToken]]] = None) -> List[Dict[str, Any]]:
+        """一次前向傳播解碼整個批次"""
+        return self.registry.get(precision=self.precision).decode_chunks(chunks, language=language,
+                                                                          cancel=tokens)
+
+    def _tune(self, elapsed: float, size: int):
+        """加性增、乘性減地調整批次大小"""
+        previous = self.batch_size
+        if elapsed > self.target_seconds and self.batch_size > 1:
+            self.batch_size = max(1, self.batch_size // 2)
+        elif elapsed <= self.target_seconds and size >= self.batch_size:
+            self.batch_size = min(self.max_batch, self.batch_size + 1)
+        if self.batch_size != previous:
+            logger.info(f"📦 批次大小 {previous} -> {self.batch_size} (上批 {size} 塊, {elapsed:.1f}s)")
+
+class SchedulerPool:
+    """每種精度一個批處理調度器，不同精度的塊不能合併進同一批次"""
+
+    def __init__(self, registry: ModelRegistry):
+        self.registry = registry
+        self._schedulers: Dict[str, BatchScheduler] = {}
+        self._lock = threading.Lock()
+
+    def get(self, precision: str = DEFAULT_PRECISION) -> BatchScheduler:
+        precision = resolve_precision(precision)
+        with self._lock:
+            scheduler = self._schedulers.get(precision)
+            if scheduler is None:
+                scheduler = self._schedulers[precision] = BatchScheduler(self.registry, precision=precision)
+                scheduler.start()
+            return scheduler
+
+def decode_params(precision: str = DEFAULT_PRECISION, language: Optional[str] = None) -> Dict[str, Any]:
+    """影響轉錄結果的解碼參數，參與緩存鍵計算"""
+    params = {
+        "backend": "transformers",
+        "chunk_length_s": CHUNK_SECONDS,
+        "return_timestamps": True,
+        "vad": VAD_ENABLED,
+        "precision": precision,
+    }
+    if language:
+        params["language"] = language
+    return params
+
+def chunk_segments(decoded: Dict[str, Any], offset: float,
+                   to_original: Callable[[float], float]) -> List[Dict[str, Any]]:
+    """把一塊的解碼結果轉換為我們的格式，時間戳加上塊的偏移並映射回原始時間軸"""
+    segments = []
+    for item in decoded.get("offsets", []):
+        start, end = item["timestamp"]
+        segments.append({
+            "start": to_original(offset + start),
+            "end": to_original(offset + (end if end is not None else CHUNK_SECONDS)),
+            "text": item["text"],
+            "confidence": DEFAULT_CONFIDENCE  # Whisper 不提供信心度
+        })
+    return segments
+
+def decode_with_context(registry: ModelRegistry, audio, context: str = '',
+                        precision: str = DEFAULT_PRECISION, language: Optional[str] = None,
+                        token: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
+    """依次解碼各塊，每塊以之前已確認的文本為提示詞，用於增量轉錄新增的音頻
+
+    提示詞各不相同，不經過批處理調度器合併。language 為調用方指定的語言；
+    token 在塊之間與解碼步之間檢查，尚未設置期限時按語音時長與實測實時率設置，
+    取消時拋出 Cancelled，超過期限時拋出 DeadlineExceeded。
+    """
+    transcriber = registry.get(precision=precision)
+    speech, source = transcriber.prepare(audio)
+    to_original = speech.to_original if speech else (lambda seconds: seconds)
+    token = token or CancelToken()
+    if token.expires_at is None:
+        token.start_deadline(RealTimeFactors().deadline(len(source) / SAMPLE_RATE, rtf_key(transcriber, precision)))
+    
+    chunk_samples = CHUNK_SECONDS * SAMPLE_RATE
+    segments = []
+    for index, start in enumerate(range(0, len(source), chunk_samples)):
+        decoded = transcriber.decode_chunks([source[start:start + chunk_samples]], prompt=context,
+                                            language=language, cancel=[token])[0]
+        token.check()  # 中途取消的塊結果不完整
+        segments.extend(chunk_segments(decoded, index * CHUNK_SECONDS, to_original))
+        context = (context + decoded["text"])[-CONTEXT_CHARS:]
+    return segments
+
+def wait_chunk(future: Future, token: CancelToken) -> Dict[str, Any]:
+    """等待一塊的解碼結果，期間定期檢查取消令牌；解碼中途被取消的不完整結果不返回"""
+    while True:
+        token.check()
+        try:
+            result = future.result(timeout=POLL_SECONDS)
+        except FutureTimeout:
+            continue
+        except CancelledError:
+            token.check()
+            raise
+        token.check()
+        return result
+
+def transcribe_chunks(registry: ModelRegistry, batchers: SchedulerPool, audio,
+                      precision: str = DEFAULT_PRECISION, on_segment: Optional[Callable] = None,
+                      on_progress: Optional[Callable[[float], None]] = None,
+                      journal_key: Optional[str] = None, language: Optional[str] = None,
+                      token: Optional[CancelToken] = None) -> Dict[str, Any]:
+    """把 16kHz float32 音頻切塊交給批處理調度器轉錄
+
+    on_segment 在每個分段解碼後被調用；on_progress(比例) 在每塊完成後被調用，
+    拋出 JobCancelled 時撤回尚未解碼的塊並向上傳遞。
+    指定 journal_key 時每塊的解碼結果寫入斷點日誌，以同一 key 重新運行時跳過已完成的塊。
+    language 為已知語言；未指定時在第一個含語音的窗口上識別一次，所有塊強制使用該語言。
+    token 為請求方的取消令牌，尚未設置期限時按語音時長與實測實時率設置；
+    取消或超過期限時撤回尚未解碼的塊，解碼中的塊在下一個解碼步停止。
+    超過期限返回失敗結果；被取消時拋出 Cancelled，不作為可共享的結果。
+    """
+    futures: Dict[int, Future] = {}
+    journal: Optional[ChunkJournal] = None
+    token = token or CancelToken()
+    try:
+        started = time.perf_counter()
+        token.check()  # 排隊期間客戶端已斷開
+        # 只把語音區段送入模型
+        transcriber = registry.get(precision=precision)
+        speech, source = transcriber.prepare(audio)
+        batcher = batchers.get(precision)
+        to_original = speech.to_original if speech else (lambda seconds: seconds)
+        factors = RealTimeFactors()
+        speed_key = rtf_key(transcriber, precision)
+        if token.expires_at is None:
+            token.start_deadline(factors.deadline(len(source) / SAMPLE_RATE, speed_key))
+        language, probability = transcriber.identify_language(source, language) if len(source) else (language, None)
+        
+        # 切成 30 秒塊，交給調度器與其他請求的塊合併批處理
+        logger.info("開始轉錄...")
+        chunk_samples = CHUNK_SECONDS * SAMPLE_RATE
+        starts = range(0, len(source), chunk_samples)
+        restored: Dict[int, Dict[str, Any]] = {}
+        if journal_key:
+            journal = ChunkJournal(journal_path(journal_key), {
+                "samples": len(source), "chunk_seconds": CHUNK_SECONDS, "precision": precision,
+                "language": language
+            })
+            restored = {record["index"]: record["output"] for record in journal.records()}
+        # 從日誌恢復的運行不代表實際速度，不更新實時率
+        restored_any = bool(restored)
+        futures = {
+            index: batcher.submit(source[start:start + chunk_samples], language, token)
+            for index, start in enumerate(starts) if index not in restored
+        }
+        
+        # 轉換為我們的格式，時間戳加上塊的偏移並映射回原始時間軸
+        texts = []
+        segments = []
+        for index in range(len(starts)):
+            if index in restored:
+                decoded = restored.pop(index)
+            else:
+                decoded = wait_chunk(futures[index], token)
+                if journal:
+                    journal.append(index, {"output": decoded})
+            texts.append(decoded["text"])
+            for segment in chunk_segments(decoded, index * CHUNK_SECONDS, to_original):
+                segments.append(segment)
+                if on_segment:
+                    on_segment(segment)
+            if on_progress:
+                on_progress((index + 1) / len(starts))
+        
+        if journal:
+            journal.remove()
+        if not restored_any:
+            factors.record(speed_key, time.perf_counter() - started, len(source) / SAMPLE_RATE)
+        return transcription_result("".join(texts), segments, len(audio) / SAMPLE_RATE,
+                                    language=language, language_probability=probability)
+        
+    except DeadlineExceeded as e:
+        logger.warning(f"🛑 轉錄已停止: {e}")
+        if journal:
+            journal.remove()
+        return error_result(str(e))
+    except Cancelled as e:
+        logger.info(f"🛑 轉錄已取消: {e}")
+        if journal:
+            journal.remove()
+        raise
+    except Exception as e:
+        logger.error(f"轉錄失敗: {e}")
+        if journal:
+            journal.remove()
+        return error_result(str(e))
+    finally:
+        # 提前結束時不再解碼剩餘的塊；進程中途退出時日誌保留已完成的塊供重新運行時繼續
+        for future in futures.values():
+            future.cancel()
+        if journal:
+            journal.close()
+
+class JobRunner:
+    """在後台執行異步任務，與同步請求共用模型、批處理調度器、緩存與指標"""
+
+    def __init__(self, registry: ModelRegistry, batchers: SchedulerPool,
+                 cache: Optional[TranscriptionCache] = None, metrics: Optional[ServerMetrics] = None):
+        self.registry = registry
+        self.batchers = batchers
+        self.cache = cache
+        self.metrics = metrics
+
+    def __call__(self, job: Dict[str, Any], on_progress: Callable[[float], None]) -> Dict[str, Any]:
+        source = job['source']
+        try:
+            # 上傳的音頻在入隊時已解碼為 float32 保存
+            audio = np.load(source) if job['upload'] else load_audio(source)
+        except Exception as e:
+            logger.error(f"音頻解碼失敗: {e}")
+            return error_result(str(e))
+
+        def compute() -> Dict[str, Any]:
+            started = time.perf_counter()
+            # 以任務 ID 為斷點日誌的鍵，服務器重啟後重新排隊的任務從最後完成的塊繼續
+            result = transcribe_chunks(self.registry, self.batchers, audio, job['precision'],
+                                       on_progress=on_progress, journal_key=f"job-{job['id']}",
+                                       language=job['language'])
+            if self.metrics:
+                self.metrics.observe_request(time.perf_counter() - started, result)
+            return result
+
+        if self.cache is None:
+            return compute()
+        content_hash = job['content_hash'] or hash_file(source)
+        key = cache_key(content_hash, MODEL_NAME, **decode_params(job['precision'], job['language']))
+        return self.cache.single_flight(key, compute)
+
+def job_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任務的公開字段，不暴露服務器上的文件路徑"""
+    return {
+        "success": True,
+        "id": job['id'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "precision": job['precision'],
+        "language": job['language'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "error": job['error'],
+        "result": job['result'],
+    }
+
 class WhisperHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.pipeline = None
-        super().__init__(*args, **kwargs)
+    @property
+    def registry(self) -> ModelRegistry:
+        return self.server.registry
+
+    @property
+    def inference(self) -> InferenceQueue:
+        return self.server.inference
+
+    @property
+    def batchers(self) -> SchedulerPool:
+        return self.server.batchers
+
+    @property
+    def cache(self) -> Optional[TranscriptionCache]:
+        return self.server.cache
+
+    @property
+    def metrics(self) -> Optional[ServerMetrics]:
+        return self.server.metrics
+
+    @property
+    def jobs(self) -> JobStore:
+        return self.server.jobs
+
+    @property
+    def recordings(self) -> RecordingStore:
+        return self.server.recordings
+
+    def do_GET(self):
+        if self.route == '/health':
+            self.handle_health()
+        elif self.route == '/metrics' and self.metrics:
+            self.handle_metrics()
+        elif self.path_id('/jobs'):
+            self.handle_get_job()
+        elif self.path_id('/recordings'):
+            self.handle_get_recording()
+        elif self.route == '/stream':
+            self.handle_stream()
+        else:
+            self.send_error(404)
+
+    @property
+    def route(self) -> str:
+        return urllib.parse.urlsplit(self.path).path
+
+    @property
+    def query(self) -> Dict[str, str]:
+        params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        return {key: values[-1] for key, values in params.items()}
+
+    def language(self, data: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """請求指定的已知語言 (JSON language 字段或 ?language=)，未指定或 auto 時返回 None"""
+        return normalize_language((data or {}).get('language') or self.query.get('language'))
     
+    def path_id(self, prefix: str) -> Optional[str]:
+        """{prefix}/{id} 路徑中的 ID"""
+        head, _, item = self.route.rstrip('/').rpartition('/')
+        return item if head == prefix and item else None
+
+    @property
+    def job_id(self) -> Optional[str]:
+        return self.path_id('/jobs')
+
     def do_POST(self):
-        if self.path == '/transcribe':
+        if self.route == '/transcribe':
             self.handle_transcribe()
+        elif self.route.rstrip('/') == '/jobs':
+            self.handle_create_job()
+        elif self.path_id('/recordings'):
+            self.handle_recording()
+        else:
+            self.send_error(404)
+
+    def do_DELETE(self):
+        if self.job_id:
+            self.handle_cancel_job()
+        elif self.path_id('/recordings'):
+            self.handle_delete_recording()
         else:
             self.send_error(404)
     
+    def handle_health(self):
+        """報告模型是否已加載並預熱"""
+        ready = self.registry.ready.is_set()
+        self.send_json(200 if ready else 503, {
+            "status": "ready" if ready else "loading",
+            "model": MODEL_NAME,
+            "precision": DEFAULT_PRECISION,
+            "assistant_model": ASSISTANT_MODEL,
+            "load_seconds": self.registry.load_seconds(),
+            "queue_depth": self.inference.depth,
+            "in_flight": self.inference.in_flight,
+            "jobs": self.jobs.counts()
+        })
+
+    def handle_metrics(self):
+        """以 Prometheus 文本格式輸出監控指標"""
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_busy(self):
+        """隊列已滿時拒絕請求，提示客戶端稍後重試"""
+        body = json.dumps({
+            "success": False,
+            "error": "服務器繁忙，請稍後重試"
+        }, ensure_ascii=False).encode('utf-8')
+        self.send_response(503)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', str(RETRY_AFTER_SECONDS))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload: Dict[str, Any]):
+        """發送 JSON 響應"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
     def handle_transcribe(self):
         try:
-            # 讀取請求數據
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            file_path = data.get('file_path')
-            if not file_path or not os.path.exists(file_path):
-                self.send_error(400, "File not found")
+            content_type = parse_content_type(self.headers.get('Content-Type', ''))
+            
+            if content_type['type'] in ('application/json', ''):
+                # 讀取請求數據
+                post_data = b''.join(iter_request_body(self.rfile, self.headers))
+                data = json.loads(post_data.decode('utf-8'))
+                
+                file_path = data.get('file_path')
+                if not file_path or not os.path.exists(file_path):
+                    self.send_error(400, "File not found")
+                    return
+                
+                precision = resolve_precision(data.get('precision') or self.query.get('precision'))
+                language = self.language(data)
+                logger.info(f"轉錄文件: {file_path}")
+                content_hash = hash_file(file_path) if self.cache else None
+                job = (self.transcribe_file, file_path, precision, language)
+            else:
+                # 直接從套接字解碼上傳的音頻，不寫臨時文件
+                precision = resolve_precision(self.query.get('precision'))
+                language = self.language()
+                digest = hashlib.sha256()
+                audio = self.decode_body(content_type, digest)
+                logger.info(f"轉錄上傳音頻: {len(audio) / SAMPLE_RATE:.1f}s")
+                content_hash = digest.hexdigest()
+                job = (self.transcribe_audio, audio, precision, language)
+            
+            key = cache_key(content_hash, MODEL_NAME, **decode_params(precision, language)) if self.cache else None
+            
+            # 流式模式下每解碼完一塊就推送其分段
+            stream_format = self.stream_format()
+            events: Optional["queue.Queue"] = queue.Queue() if stream_format else None
+            on_segment = events.put if events is not None else None
+            # 客戶端斷開時取消，超過按音頻時長計算的期限時停止
+            token = CancelToken()
+            
+            # 已緩存或相同音頻正在轉錄時不佔用推理隊列，否則放入推理隊列，已滿時立即返回 503
+            def start():
+                return self.start_transcription(key, job, on_segment, token)
+            
+            try:
+                future, owned = start()
+            except queue.Full:
+                logger.warning(f"⚠️ 推理隊列已滿 ({self.inference.depth})，拒絕請求")
+                if self.metrics:
+                    self.metrics.requests.inc(status='busy')
+                self.send_busy()
                 return
             
-            logger.info(f"轉錄文件: {file_path}")
+            if stream_format:
+                self.stream_result(stream_format, future, events, token, owned, key, start)
+                return
             
             # 執行轉錄
-            result = self.transcribe_audio(file_path)
+            result = self.wait_result(future, token, owned, key, start)
+            if result is None:
+                return
             
             # 發送響應
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response = json.dumps(result, ensure_ascii=False)
-            self.wfile.write(response.encode('utf-8'))
+            self.send_json(200, result)
             
+        except ValueError as e:
+            logger.error(f"請求格式錯誤: {e}")
+            self.send_error(400, str(e))
         except Exception as e:
             logger.error(f"轉錄錯誤: {e}")
             self.send_error(500, str(e))
     
-    def transcribe_audio(self, file_path: str) -> Dict[str, Any]:
-        """使用 Whisper 轉錄音頻文件"""
+    def handle_create_job(self):
+        """提交異步任務，立即返回任務 ID，轉錄由後台工作線程完成"""
         try:
-            # 延遲導入以避免啟動時的依賴問題
-            from transformers import pipeline
-            
-            # 加載模型 (如果尚未加載)
-            if self.pipeline is None:
-                logger.info("正在加載 Whisper Large V3 模型...")
-                self.pipeline = pipeline(
-                    "automatic-speech-recognition",
-                    model="openai/whisper-large-v3",
-                    return_timestamps=True,
-                    chunk_length_s=30,
-                    stride_length_s=5,
-                )
-                logger.info("模型加載完成")
+            content_type = parse_content_type(self.headers.get('Content-Type', ''))
             
-            # 執行轉錄
-            logger.info("開始轉錄...")
-            result = self.pipeline(file_path)
-            
-            # 處理結果
-            text = result.get("text", "")
-            chunks = result.get("chunks", [])
-            
-            # 轉換為我們的格式
-            segments = []
-            for chunk in chunks:
-                if "timestamp" in chunk:
-                    segments.append({
-                        "start": chunk["timestamp"][0],
-                        "end": chunk["timestamp"][1],
-                        "text": chunk["text"],
-                        "confidence": 0.9  # Whisper 不提供信心度
-                    })
+            if content_type['type'] in ('application/json', ''):
+                post_data = b''.join(iter_request_body(self.rfile, self.headers))
+                data = json.loads(post_data.decode('utf-8'))
+                
+                file_path = data.get('file_path')
+                if not file_path or not os.path.exists(file_path):
+                    self.send_error(400, "File not found")
+                    return
+                
+                precision = resolve_precision(data.get('precision') or self.query.get('precision'))
+                job = self.jobs.create(os.path.abspath(file_path), precision, language=self.language(data))
+            else:
+                # 上傳的音頻解碼後保存到任務目錄，服務器重啟後仍可轉錄
+                precision = resolve_precision(self.query.get('precision'))
+                digest = hashlib.sha256()
+                audio = self.decode_body(content_type, digest)
+                upload_path = self.jobs.upload_path()
+                np.save(upload_path, audio)
+                job = self.jobs.create(upload_path, precision, content_hash=digest.hexdigest(), upload=True,
+                                       language=self.language())
             
-            return {
-                "success": True,
-                "text": text,
-                "language": "auto-detected",
-                "confidence": 0.9,
-                "duration": segments[-1]["end"] if segments else 0,
-                "segments": segments
-            }
+            logger.info(f"🗂️ 新任務 {job['id']} 已排隊")
+            self.send_json(202, job_payload(job))
+            
+        except ValueError as e:
+            logger.error(f"請求格式錯誤: {e}")
+            self.send_json(400, {"success": False, "error": str(e)})
+        except Exception as e:
+            logger.error(f"任務提交錯誤: {e}")
+            self.send_json(500, {"success": False, "error": str(e)})
+    
+    def handle_get_job(self):
+        """查詢任務狀態、進度與結果"""
+        job = self.jobs.get(self.job_id)
+        if job is None:
+            self.send_json(404, {"success": False, "error": "任務不存在"})
+            return
+        self.send_json(200, job_payload(job))
+    
+    def handle_cancel_job(self):
+        """取消排隊中或運行中的任務，已結束的任務返回 409"""
+        job = self.jobs.cancel(self.job_id)
+        if job is None:
+            self.send_json(404, {"success": False, "error": "任務不存在"})
+            return
+        if job['status'] != CANCELLED:
+            self.send_json(409, dict(job_payload(job), success=False, error="任務已結束"))
+            return
+        discard_journal(f"job-{job['id']}")
+        logger.info(f"🛑 任務 {job['id']} 已被客戶端取消")
+        self.send_json(200, job_payload(job))
+    
+    def handle_recording(self):
+        """增量轉錄: 上傳錄音到目前為止的完整文件，只解碼上一輪之後新增的部分"""
+        recording_id = self.path_id('/recordings')
+        try:
+            content_type = parse_content_type(self.headers.get('Content-Type', ''))
+            
+            if content_type['type'] in ('application/json', ''):
+                post_data = b''.join(iter_request_body(self.rfile, self.headers))
+                data = json.loads(post_data.decode('utf-8'))
+                
+                file_path = data.get('file_path')
+                if not file_path or not os.path.exists(file_path):
+                    self.send_error(400, "File not found")
+                    return
+                
+                precision = resolve_precision(data.get('precision') or self.query.get('precision'))
+                language = self.language(data)
+                final = bool(data.get('final')) or self.query.get('final') in ('1', 'true')
+                audio = load_audio(file_path)
+            else:
+                precision = resolve_precision(self.query.get('precision'))
+                language = self.language()
+                final = self.query.get('final') in ('1', 'true')
+                audio = self.decode_body(content_type)
+            RecordingStore.check_id(recording_id)
+            token = CancelToken()
             
+            try:
+                future = self.inference.submit(self.transcribe_recording, recording_id, audio, precision, final,
+                                               language, token)
+            except queue.Full:
+                logger.warning(f"⚠️ 推理隊列已滿 ({self.inference.depth})，拒絕請求")
+                if self.metrics:
+                    self.metrics.requests.inc(status='busy')
+                self.send_busy()
+                return
+            
+            result = self.wait_result(future, token)
+            if result is not None:
+                self.send_json(200, result)
+            
+        except ValueError as e:
+            logger.error(f"請求格式錯誤: {e}")
+            self.send_json(400, {"success": False, "error": str(e)})
+        except Exception as e:
+            logger.error(f"增量轉錄錯誤: {e}")
+            self.send_json(500, {"success": False, "error": str(e)})
+    
+    def transcribe_recording(self, recording_id: str, audio, precision: str, final: bool,
+                             language: Optional[str] = None, token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """轉錄錄音新增的部分；期限按新增部分的時長計算，超過時本輪不確認任何分段
+
+        未指定語言時錄音的語言只識別一次 (見 RecordingStore.update)，之後每輪強制使用。
+        """
+        transcriber = self.registry.get(precision=precision)
+        
+        def decode(tail, context: str, detected: Optional[str]):
+            return decode_with_context(self.registry, tail, context, precision, language or detected, token)
+        
+        def identify(recorded):
+            return transcriber.identify_language(recorded, language)
+        
+        try:
+            return self.recordings.update(recording_id, audio, decode, final=final, identify=identify)
+        except DeadlineExceeded as e:
+            logger.warning(f"🛑 錄音 {recording_id} 轉錄已停止: {e}")
+            return error_result(str(e))
+    
+    def handle_get_recording(self):
+        """查詢錄音已確認的轉錄稿"""
+        try:
+            state = self.recordings.get(self.path_id('/recordings'))
+        except ValueError as e:
+            self.send_json(400, {"success": False, "error": str(e)})
+            return
+        if state is None:
+            self.send_json(404, {"success": False, "error": "錄音不存在"})
+            return
+        self.send_json(200, dict(transcription_result(
+            "".join(segment["text"] for segment in state["segments"]).strip(), state["segments"], state["duration"],
+            language=state.get("language"), language_probability=state.get("language_probability")
+        ), recording_id=state["id"], committed_seconds=state["committed"], passes=state["passes"]))
+    
+    def handle_delete_recording(self):
+        """錄音結束後刪除其增量狀態"""
+        try:
+            deleted = self.recordings.delete(self.path_id('/recordings'))
+        except ValueError as e:
+            self.send_json(400, {"success": False, "error": str(e)})
+            return
+        if not deleted:
+            self.send_json(404, {"success": False, "error": "錄音不存在"})
+            return
+        self.send_json(200, {"success": True})
+    
+    def handle_stream(self):
+        """WebSocket 實時轉錄: 接收 16kHz PCM 幀，按節奏重新解碼滑動窗口並推送臨時與確認的分段"""
+        if not is_upgrade(self.headers):
+            self.send_json(426, {"success": False, "error": "需要 WebSocket 升級請求"})
+            return
+        try:
+            options = stream_options(self.query)
+            precision = resolve_precision(self.query.get('precision'))
+            language = self.language()
+        except ValueError as e:
+            self.send_json(400, {"success": False, "error": str(e)})
+            return
+        
+        speed_key = rtf_key(self.registry.get(precision=precision), precision)
+        factors = RealTimeFactors()
+        
+        def decode(window, context: str):
+            # 每次窗口解碼都經過有界推理隊列，隊列已滿時跳過本輪而不是阻塞；
+            # 期限按窗口時長計算 (含排隊時間)，連接關閉時隨會話令牌一起取消
+            token = CancelToken(factors.deadline(len(window) / SAMPLE_RATE, speed_key), parent=session.token)
+            try:
+                future = self.inference.submit(decode_with_context, self.registry, window, context, precision,
+                                               language, token)
+            except queue.Full:
+                return None
+            try:
+                return wait_chunk(future, token)
+            except DeadlineExceeded as e:
+                logger.warning(f"⚠️ 窗口解碼超過期限，跳過本輪: {e}")
+            except Cancelled:
+                pass
+            future.cancel()
+            return None
+        
+        ws = handshake(self)
+        logger.info(f"🎙️ 流式轉錄連接: {self.client_address[0]} ({options['sample_format']})")
+        session = StreamingSession(decode, **options)
+        session.serve(ws)
+    
+    def start_transcription(self, key: Optional[str], job: tuple, on_segment: Optional[Callable],
+                            token: CancelToken):
+        """已緩存或相同音頻正在轉錄時加入其結果，不佔用推理隊列；否則放入推理隊列，已滿時拋出 queue.Full
+
+        返回 (future, owned)，owned=False 表示 future 屬於共享的計算。
+        """
+        future = self.cache.join(key, token, on_segment) if key else None
+        if future is not None:
+            if self.metrics:
+                self.metrics.requests.inc(status='cached')
+            return future, False
+        return self.inference.submit(self.transcribe_cached, key, *job, on_segment=on_segment, token=token), True
+    
+    def transcribe_cached(self, key: Optional[str], fn: Callable, *args,
+                          on_segment: Optional[Callable] = None,
+                          token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """通過緩存執行轉錄，相同鍵的並發請求只推理一次"""
+        if key is None:
+            return self.transcribe_measured(fn, *args, on_segment=on_segment, token=token)
+        
+        computed = []
+        
+        def compute():
+            computed.append(True)
+            # 分段經緩存推送給所有等待這次計算的請求 (包括本請求)
+            return self.transcribe_measured(fn, *args, on_segment=lambda segment: self.cache.publish(key, segment),
+                                            token=token)
+        
+        result = self.cache.single_flight(key, compute, token, on_segment)
+        if not computed and self.metrics:
+            self.metrics.requests.inc(status='cached')
+        return result
+    
+    def transcribe_measured(self, fn: Callable, *args, **kwargs) -> Dict[str, Any]:
+        """執行轉錄並記錄耗時、音頻時長與實時率"""
+        if not self.metrics:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.metrics.observe_request(time.perf_counter() - started, result)
+        return result
+    
+    def stream_format(self) -> Optional[str]:
+        """根據 ?stream= 參數或 Accept 頭選擇流式格式 (sse / ndjson)"""
+        requested = self.query.get('stream', '').lower()
+        if requested in ('sse', 'ndjson'):
+            return requested
+        accept = self.headers.get('Accept', '')
+        if 'text/event-stream' in accept:
+            return 'sse'
+        if 'application/x-ndjson' in accept:
+            return 'ndjson'
+        return None
+    
+    def client_gone(self) -> bool:
+        """請求體已讀完後客戶端不再發送數據，套接字可讀且讀到 EOF 表示客戶端已斷開"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+    
+    def abandon(self, future: Future, token: CancelToken, owned: bool = True, key: Optional[str] = None):
+        """客戶端已斷開: 撤回排隊中的任務，運行中的轉錄在下一個塊或解碼步停止，釋放推理工作線程
+
+        key 對應的計算還有其他請求在等待時只離開，計算繼續；owned=False 表示 future 屬於共享的計算，不撤回。
+        """
+        logger.info(f"🔌 客戶端已斷開，停止轉錄: {self.client_address[0]}")
+        if self.cache is not None:
+            self.cache.leave(key, token, "客戶端已斷開")
+        else:
+            token.cancel("客戶端已斷開")
+        if owned:
+            future.cancel()
+        if self.metrics:
+            self.metrics.requests.inc(status='disconnected')
+    
+    def restart(self, start: Optional[Callable], token: CancelToken, error: Cancelled):
+        """加入的共享計算被其他請求取消後重新開始；推理隊列已滿時以失敗結果結束"""
+        if start is None or token.cancelled:
+            raise error
+        logger.info("♻️ 共享的轉錄已被取消，重新轉錄")
+        try:
+            return start()
+        except queue.Full:
+            future: Future = Future()
+            future.set_result(error_result("服務器繁忙，請稍後重試"))
+            return future, True
+    
+    def wait_result(self, future: Future, token: CancelToken, owned: bool = True, key: Optional[str] = None,
+                    start: Optional[Callable] = None) -> Optional[Dict[str, Any]]:
+        """等待轉錄結果，期間檢測客戶端斷開；已斷開時返回 None
+
+        start 重新開始轉錄並返回 (future, owned)，加入的共享計算被取消時調用。
+        """
+        while True:
+            try:
+                return future.result(timeout=POLL_SECONDS)
+            except FutureTimeout:
+                if self.client_gone():
+                    self.abandon(future, token, owned, key)
+                    return None
+            except Cancelled as e:
+                future, owned = self.restart(start, token, e)
+    
+    def stream_result(self, stream_format: str, future: Future, events: "queue.Queue",
+                      token: CancelToken, owned: bool = True, key: Optional[str] = None,
+                      start: Optional[Callable] = None):
+        """邊轉錄邊推送分段事件，最後發送匯總事件；客戶端斷開時停止轉錄"""
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        while True:
+            while not (future.done() and events.empty()):
+                try:
+                    segment = events.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if self.client_gone():
+                        self.abandon(future, token, owned, key)
+                        return
+                    continue
+                try:
+                    self.write_event(stream_format, 'segment', segment)
+                except OSError:
+                    self.abandon(future, token, owned, key)
+                    return
+            try:
+                result = future.result()
+                break
+            except Cancelled as e:
+                future, owned = self.restart(start, token, e)
+        
+        summary = {name: value for name, value in result.items() if name != 'segments'}
+        summary['segment_count'] = len(result.get('segments', []))
+        self.write_event(stream_format, 'done' if result.get('success') else 'error', summary)
+    
+    def write_event(self, stream_format: str, event: str, payload: Dict[str, Any]):
+        """寫出一個 SSE 或 NDJSON 事件"""
+        if stream_format == 'sse':
+            data = json.dumps(payload, ensure_ascii=False)
+            line = f"event: {event}\ndata: {data}\n\n"
+        else:
+            line = json.dumps({"type": event, **payload}, ensure_ascii=False) + "\n"
+        self.wfile.write(line.encode('utf-8'))
+        self.wfile.flush()
+    
+    def decode_body(self, content_type: Dict[str, str], digest=None):
+        """按 Content-Type 把原始或 multipart 請求體解碼為 16kHz float32 數組，同時計算內容哈希"""
+        blocks = iter_request_body(self.rfile, self.headers)
+        
+        if content_type['type'] == 'multipart/form-data':
+            boundary = content_type.get('boundary')
+            if not boundary:
+                raise ValueError("multipart 請求缺少 boundary")
+            blocks = iter_multipart_file(blocks, boundary.encode('latin-1'))
+        
+        if digest is not None:
+            blocks = hashing_blocks(blocks, digest)
+        
+        if content_type['type'] == 'multipart/form-data':
+            return decode_stream(blocks)
+        
+        # 無容器的原始 PCM 需要告知 ffmpeg 格式與採樣率
+        input_format = RAW_PCM_FORMATS.get(content_type['type'])
+        input_rate = int(content_type.get('rate', SAMPLE_RATE)) if input_format else None
+        return decode_stream(blocks, input_format=input_format, input_rate=input_rate)
+    
+    def transcribe_file(self, file_path: str, precision: str = DEFAULT_PRECISION,
+                        language: Optional[str] = None, on_segment: Optional[Callable] = None,
+                        token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """解碼本地文件後轉錄"""
+        try:
+            audio = load_audio(file_path)
         except Exception as e:
-            logger.error(f"轉錄失敗: {e}")
+            logger.error(f"音頻解碼失敗: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
+        return self.transcribe_audio(audio, precision, language, on_segment=on_segment, token=token)
+    
+    def transcribe_audio(self, audio, precision: str = DEFAULT_PRECISION, language: Optional[str] = None,
+                         on_segment: Optional[Callable] = None, token: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """使用 Whisper 轉錄 16kHz float32 音頻，on_segment 在每個分段解碼後被調用"""
+        return transcribe_chunks(self.registry, self.batchers, audio, precision, on_segment=on_segment,
+                                 language=language, token=token)
     
     def log_message(self, format, *args):
         """自定義日誌格式"""
         logger.info(f"{self.address_string()} - {format % args}")
 
+class ReusePortHTTPServer(ThreadingHTTPServer):
+    """多個服務進程綁定同一端口，由內核在進程間分發連接"""
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+def supervise(processes: int) -> int:
+    """按拓撲啟動多個服務進程 (各自加載模型並綁定自己的 CPU)，任一進程退出時停止全部，返回退出碼
+
+    子進程加載完模型後經就緒管道報告 ready，全部就緒後才收到 go 並綁定端口，
+    /health 成功時整個拓撲都已在服務，而不只是最先加載完的進程。
+    """
+    # 共用任務庫，中斷的任務只在所有進程啟動前恢復一次
+    recovered = JobStore().recover()
+    if recovered:
+        logger.info(f"♻️ {recovered} 個中斷的任務已重新排隊")
+    # 收到 SIGTERM 時同樣經 finally 停止子進程
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    children = []
+    readers = []
+    try:
+        for index in range(processes):
+            read_fd, write_fd = os.pipe()
+            children.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE, pass_fds=(write_fd,),
+                env=dict(os.environ, WHISPER_PROCESS_INDEX=str(index), WHISPER_READY_FD=str(write_fd))
+            ))
+            os.close(write_fd)
+            readers.append(os.fdopen(read_fd, 'r'))
+        
+        # 子進程退出時管道關閉，readline 返回空字符串
+        for child, reader in zip(children, readers):
+            if reader.readline().strip() != 'ready':
+                code = child.wait()
+                logger.error(f"❌ 服務進程 {child.pid} 啟動失敗 ({code})，停止其他進程")
+                return code or 1
+        for child in children:
+            child.stdin.write(b'go\n')
+            child.stdin.close()
+        logger.info(f"✅ 全部 {processes} 個服務進程已加載模型，開始接受連接")
+        
+        while True:
+            for child in children:
+                code = child.poll()
+                if code is not None:
+                    logger.error(f"❌ 服務進程 {child.pid} 已退出 ({code})，停止其他進程")
+                    return code
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("🛑 服務器已停止")
+        return 0
+    finally:
+        for reader in readers:
+            reader.close()
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+        for child in children:
+            child.wait()
+
+def wait_for_siblings():
+    """由 supervise 啟動時: 報告模型已加載，等所有服務進程都就緒後再綁定端口"""
+    ready_fd = os.environ.get('WHISPER_READY_FD')
+    if not ready_fd:
+        return
+    with os.fdopen(int(ready_fd), 'w') as ready:
+        ready.write('ready\n')
+    if sys.stdin.readline().strip() != 'go':
+        raise RuntimeError("監督進程已退出")
+
 def check_dependencies():
     """檢查必要的 Python 依賴"""
     try:
@@ -141,11 +1166,76 @@ def main():
     port = int(os.environ.get('WHISPER_PORT', 8000))
     server_address = ('', port)
     
+    # 進程數、線程數與 CPU 綁定來自 whisper-bench.py autotune 寫入的主機配置 (環境變量優先)
+    profile = load_host_profile()
+    try:
+        topology = server_topology(profile)
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    index = os.environ.get('WHISPER_PROCESS_INDEX')
+    if topology["processes"] > 1 and index is None:
+        if hasattr(socket, 'SO_REUSEPORT'):
+            logger.info(f"🧮 啟動 {topology['processes']} 個服務進程 × {topology['threads']} 線程 "
+                        f"(綁定 {topology['pin']}，來源 {topology['source']})")
+            sys.exit(supervise(topology["processes"]))
+        logger.warning("⚠️ 平台不支持 SO_REUSEPORT，以單進程運行")
+        topology["processes"] = 1
+    cpus = topology["cpu_sets"][int(index or 0)]
+    apply_topology(topology["threads"], cpus)
+    if topology["threads"]:
+        logger.info(f"🧮 進程 {int(index or 0) + 1}/{topology['processes']}: {topology['threads']} 線程"
+                    + (f"，CPU {','.join(map(str, cpus))}" if cpus else ""))
+    if topology["model"] and topology["model"] != MODEL_NAME:
+        logger.warning(f"⚠️ 主機配置是用 {topology['model']} 測量的，當前模型為 {MODEL_NAME}")
+    
     try:
-        httpd = HTTPServer(server_address, WhisperHandler)
+        # 在接受請求前加載並預熱模型
+        registry = ModelRegistry()
+        registry.preload()
+
+        inference = InferenceQueue()
+        inference.start()
+        batchers = SchedulerPool(registry)
+        batchers.get(DEFAULT_PRECISION)
+        wait_for_siblings()
+
+        # 多線程前端立即接受連接，推理由有界隊列限流
+        server_class = ReusePortHTTPServer if topology["processes"] > 1 else ThreadingHTTPServer
+        httpd = server_class(server_address, WhisperHandler)
+        httpd.daemon_threads = True
+        httpd.registry = registry
+        httpd.inference = inference
+        httpd.batchers = batchers
+        httpd.cache = TranscriptionCache() if cache_enabled() else None
+        httpd.jobs = JobStore()
+        httpd.recordings = RecordingStore()
+        httpd.metrics = ServerMetrics(
+            queue_depth=lambda: inference.depth,
+            in_flight=lambda: inference.in_flight,
+            load_seconds=registry.load_seconds,
+            speculative=registry.speculative_stats if ASSISTANT_MODEL else None,
+            jobs=httpd.jobs.counts,
+        ) if metrics_enabled() else None
+        
+        # 異步任務與同步請求共用模型和批處理調度器
+        JobWorkers(httpd.jobs, JobRunner(registry, batchers, httpd.cache, httpd.metrics)).start(
+            recover=index is None)
         logger.info(f"✅ 服務器啟動成功，監聽端口 {port}")
         logger.info(f"🌐 訪問地址: http://localhost:{port}")
-        logger.info("📝 使用 POST /transcribe 端點進行轉錄")
+        logger.info("📝 使用 POST /transcribe 端點進行轉錄 (JSON file_path、原始音頻或 multipart)")
+        logger.info("🗂️ 使用 POST /jobs 提交異步任務，GET /jobs/{id} 查詢，DELETE /jobs/{id} 取消")
+        logger.info("🧩 使用 POST /recordings/{id} 增量轉錄錄製中的文件，只解碼新增部分")
+        logger.info("🎙️ 使用 WebSocket /stream 實時轉錄 16kHz PCM 幀 (?format=s16le|f32le)")
+        logger.info(f"🎚️ 默認精度 {DEFAULT_PRECISION}，可用 ?precision=fp32|bf16|int8 按請求指定")
+        logger.info("🌐 語言每個文件識別一次，可用 ?language=yue 等指定已知語言跳過識別")
+        logger.info(f"⏱️ 轉錄期限 = {DEADLINE_BASE_SECONDS:g}s + 語音時長 × 實測實時率 × {DEADLINE_FACTOR:g}，"
+                    "客戶端斷開時停止轉錄")
+        if ASSISTANT_MODEL:
+            logger.info(f"🚀 投機解碼已啟用，助手模型: {ASSISTANT_MODEL}")
+        logger.info("💓 使用 GET /health 檢查就緒狀態")
+        if httpd.metrics:
+            logger.info("📈 使用 GET /metrics 抓取 Prometheus 指標")
         logger.info("🛑 按 Ctrl+C 停止服務器")
         
         httpd.serve_forever()
@@ -8,51 +8,23 @@ import sys
 import json
 import os
 
+from whispermind import get_transcriber
+
+SIMPLE_TEMPLATE = "這是 {name} 的模擬轉錄結果。文件大小: {size} 字節。由於模型正在下載中，我們提供了一個模擬結果。"
+
 def transcribe_audio_simple(file_path: str) -> dict:
     """使用簡化的方法進行轉錄"""
-    try:
-        # 檢查文件是否存在
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"文件不存在: {file_path}"
-            }
-        
-        # 獲取文件信息
-        file_size = os.path.getsize(file_path)
-        file_name = os.path.basename(file_path)
-        
-        # 模擬轉錄結果（用於測試）
-        # 在實際使用中，這裡會調用真正的 Whisper 模型
-        mock_result = {
-            "success": True,
-            "text": f"這是 {file_name} 的模擬轉錄結果。文件大小: {file_size} 字節。由於模型正在下載中，我們提供了一個模擬結果。",
-            "language": "zh",
-            "confidence": 0.9,
-            "duration": 10.0,  # 模擬時長
-            "segments": [
-                {
-                    "start": 0.0,
-                    "end": 5.0,
-                    "text": "模擬轉錄段落 1",
-                    "confidence": 0.9
-                },
-                {
-                    "start": 5.0,
-                    "end": 10.0,
-                    "text": "模擬轉錄段落 2",
-                    "confidence": 0.9
-                }
-            ]
-        }
-        
-        return mock_result
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
+    # 模擬轉錄結果（用於測試）
+    # 在實際使用中，這裡會調用真正的 Whisper 模型
+    transcriber = get_transcriber(
+        'mock',
+        template=SIMPLE_TEMPLATE,
+        parts=2,
+        bytes_per_second=None,  # 固定模擬時長
+        min_duration=10.0,
+        confidence=0.9
+    )
+    return transcriber.transcribe_file(file_path)
 
 def main():
     """主函數"""
@@ -1,69 +1,60 @@
 #!/usr/bin/env python3
 """
 Whisper 轉錄腳本
-用於從命令行調用 Whisper Large V3 模型進行轉錄
+用於從命令行調用 Whisper Large V3 模型進行轉錄，支持單文件與批量語料模式
 """
 
 import sys
 import json
 import os
 import logging
+import glob
+import argparse
 from pathlib import Path
+from typing import List, Optional, Set
+
+from whispermind import get_transcriber
+from whispermind.audio import load_audio, probe_duration
+from whispermind.longform import LONG_FILE_SECONDS, PARALLEL_WORKERS, transcribe_parallel, use_parallel
+from whispermind.precision import DEFAULT_PRECISION, PRECISIONS
+from whispermind.cache import TranscriptionCache, cache_enabled, cache_key, hash_file
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(file_path: str) -> dict:
-    """使用 Whisper Large V3 轉錄音頻文件"""
+MODEL_NAME = "openai/whisper-large-v3"
+
+# 批量模式配置
+AUDIO_EXTENSIONS = {'.wav', '.flac', '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.webm', '.mp4'}
+BATCH_SIZE = int(os.environ.get('WHISPER_BATCH_SIZE', 8))
+
+def create_transcriber(batch_size: int = 1, precision: Optional[str] = None):
+    """Whisper Large V3 轉錄器，模型在首次轉錄時加載"""
+    return get_transcriber('transformers', model=MODEL_NAME, batch_size=batch_size, precision=precision)
+
+def transcribe_audio(file_path: str, workers: int = PARALLEL_WORKERS, transcriber=None,
+                     prepared: Optional[tuple] = None) -> dict:
+    """使用 Whisper Large V3 轉錄音頻文件，長音頻在多個進程上並行轉錄
+
+    prepared 為已解碼的 (音頻, 語音區段, 模型輸入)，省去重複解碼。
+    """
+    transcriber = transcriber or create_transcriber()
     try:
-        # 延遲導入以避免啟動時的依賴問題
-        from transformers import pipeline
-        
-        logger.info("🔄 正在加載 Whisper Large V3 模型...")
+        # 解碼音頻，只把語音區段送入模型
+        audio, speech, source = prepared or prepare_file(file_path, transcriber)
         
-        # 創建轉錄管道，添加音頻格式處理
-        pipe = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-large-v3",
-            return_timestamps=True,
-            chunk_length_s=30,
-            stride_length_s=5,
-            ignore_warning=True,  # 忽略實驗性警告
-        )
+        if use_parallel(source, workers):
+            logger.info(f"🎵 並行轉錄長音頻: {file_path}")
+            output = transcribe_parallel(source, MODEL_NAME, workers, precision=transcriber.precision,
+                                         language=transcriber.language)
+            return transcriber.finish(output, audio, speech)
         
-        logger.info("✅ 模型加載完成")
         logger.info(f"🎵 開始轉錄: {file_path}")
         
         # 執行轉錄
-        result = pipe(file_path)
-        
-        # 處理結果
-        text = result.get("text", "")
-        chunks = result.get("chunks", [])
-        
-        # 轉換為我們的格式
-        segments = []
-        for chunk in chunks:
-            if "timestamp" in chunk and chunk["timestamp"]:
-                segments.append({
-                    "start": chunk["timestamp"][0],
-                    "end": chunk["timestamp"][1],
-                    "text": chunk["text"],
-                    "confidence": 0.9  # Whisper 不提供信心度
-                })
-        
-        # 計算總時長
-        duration = segments[-1]["end"] if segments else 0
-        
-        return {
-            "success": True,
-            "text": text,
-            "language": "auto-detected",
-            "confidence": 0.9,
-            "duration": duration,
-            "segments": segments
-        }
+        output = transcriber.transcribe_source(source) if len(source) else {}
+        return transcriber.finish(output, audio, speech)
         
     except Exception as e:
         logger.error(f"❌ 轉錄失敗: {e}")
@@ -72,16 +63,169 @@ def transcribe_audio(file_path: str) -> dict:
             "error": str(e)
         }
 
+def prepare_file(file_path: str, transcriber) -> tuple:
+    """解碼文件並取出語音區段，返回 (音頻, 語音區段, 模型輸入)"""
+    audio = load_audio(file_path)
+    return (audio,) + tuple(transcriber.prepare(audio))
+
+def file_cache_key(file_path: str, transcriber, strategy: str) -> str:
+    """單文件與批量模式共用的緩存鍵
+
+    strategy 為解碼策略: 'parallel' (在靜音處切分、多進程轉錄) 或 'stride' (管道按步幅分塊)，
+    兩者的分段與文本不同，不能互相命中；並行進程數只影響速度，不參與計算。
+    """
+    return cache_key(hash_file(file_path), MODEL_NAME, strategy=strategy, **transcriber.cache_params)
+
+def transcribe_cached(file_path: str, workers: int = PARALLEL_WORKERS, precision: Optional[str] = None) -> dict:
+    """通過內容緩存轉錄，相同音頻不重複推理"""
+    transcriber = create_transcriber(precision=precision)
+    if not cache_enabled():
+        return transcribe_audio(file_path, workers, transcriber)
+    
+    # 並行只用於長音頻: 短文件或單進程時不解碼即可確定策略，命中緩存時省去解碼；
+    # 其餘情況按去除靜音後的時長確定，與 transcribe_audio 的選擇一致
+    duration = probe_duration(file_path)
+    if workers > 1 and (duration is None or duration >= LONG_FILE_SECONDS):
+        try:
+            prepared = prepare_file(file_path, transcriber)
+        except Exception as e:
+            logger.error(f"❌ 轉錄失敗: {e}")
+            return {"success": False, "error": str(e)}
+        parallel = use_parallel(prepared[2], workers)
+    else:
+        prepared, parallel = None, False
+    
+    key = file_cache_key(file_path, transcriber, 'parallel' if parallel else 'stride')
+    return TranscriptionCache().single_flight(
+        key, lambda: transcribe_audio(file_path, workers if parallel else 1, transcriber, prepared))
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """展開文件、目錄與 glob 模式為音頻文件列表"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                files.extend(
+                    os.path.join(root, name) for name in sorted(names)
+                    if Path(name).suffix.lower() in AUDIO_EXTENSIONS
+                )
+        elif os.path.exists(item):
+            files.append(item)
+        else:
+            files.extend(sorted(path for path in glob.glob(item, recursive=True) if os.path.isfile(path)))
+    # 去重並保持順序
+    return list(dict.fromkeys(files))
+
+def completed_files(output_path: Optional[str]) -> Set[str]:
+    """讀取已有輸出中成功轉錄的文件，用於 --resume"""
+    done: Set[str] = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 中斷時寫了一半的行
+            if record.get('success') and record.get('file'):
+                done.add(record['file'])
+    return done
+
+def length_buckets(files: List[str], batch_size: int) -> List[List[str]]:
+    """按時長排序並分桶，讓同一批次的音頻長度接近"""
+    def duration(path: str) -> float:
+        value = probe_duration(path)
+        return value if value is not None else os.path.getsize(path) / 16000
+    
+    ordered = sorted(files, key=duration)
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+def transcribe_batch(inputs: List[str], output_path: Optional[str], resume: bool, batch_size: int,
+                     precision: Optional[str] = None):
+    """批量轉錄：模型只加載一次，按長度分桶批處理，每完成一個文件輸出一行 JSON"""
+    files = expand_inputs(inputs)
+    if resume:
+        done = completed_files(output_path)
+        files = [path for path in files if path not in done]
+        logger.info(f"⏭️ 跳過已完成的 {len(done)} 個文件")
+    logger.info(f"📚 批量轉錄 {len(files)} 個文件，批次大小 {batch_size}")
+    
+    cache = TranscriptionCache() if cache_enabled() else None
+    transcriber = create_transcriber(batch_size, precision)
+    out = open(output_path, 'a' if resume else 'w', encoding='utf-8') if output_path else sys.stdout
+    
+    def emit(file_path: str, result: dict):
+        out.write(json.dumps({"file": file_path, **result}, ensure_ascii=False) + "\n")
+        out.flush()
+    
+    try:
+        for bucket in length_buckets(files, batch_size):
+            pending = []
+            for file_path in bucket:
+                key = file_cache_key(file_path, transcriber, 'stride') if cache else None
+                cached = cache.get(key) if cache else None
+                if cached is not None:
+                    emit(file_path, cached)
+                    continue
+                try:
+                    audio = load_audio(file_path)
+                    pending.append((file_path, key, audio) + transcriber.prepare(audio))
+                except Exception as e:
+                    logger.error(f"❌ 解碼失敗 {file_path}: {e}")
+                    emit(file_path, {"success": False, "error": str(e)})
+            
+            if not pending:
+                continue
+            
+            # 轉錄器逐個產出結果，每個文件完成即可輸出；失敗的文件產出其異常
+            outputs = transcriber.transcribe_many(source for _, _, _, _, source in pending if len(source))
+            
+            for file_path, key, audio, speech, source in pending:
+                try:
+                    output = next(outputs) if len(source) else {}
+                    if isinstance(output, Exception):
+                        raise output
+                    result = transcriber.finish(output, audio, speech)
+                except Exception as e:
+                    logger.error(f"❌ 轉錄失敗 {file_path}: {e}")
+                    result = {"success": False, "error": str(e)}
+                if cache:
+                    cache.put(key, result)
+                emit(file_path, result)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
 def main():
     """主函數"""
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="Whisper Large V3 轉錄")
+    parser.add_argument('inputs', nargs='*', help="音頻文件、目錄或 glob 模式")
+    parser.add_argument('--parallel', type=int, default=PARALLEL_WORKERS,
+                        help="長音頻並行轉錄的進程數 (1 表示關閉)")
+    parser.add_argument('--batch', action='store_true', help="批量模式，每個文件輸出一行 JSON")
+    parser.add_argument('--output', help="批量模式的 JSONL 輸出文件 (默認標準輸出)")
+    parser.add_argument('--resume', action='store_true', help="跳過輸出文件中已成功轉錄的文件")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="批量模式的批次大小")
+    parser.add_argument('--precision', choices=PRECISIONS, default=DEFAULT_PRECISION,
+                        help="推理精度: fp32、bf16 (CPU 支持時) 或 int8 動態量化")
+    args = parser.parse_args()
+    
+    if not args.inputs:
         print(json.dumps({
             "success": False,
-            "error": "用法: python whisper-transcribe.py <audio_file_path>"
+            "error": "用法: python whisper-transcribe.py <audio_file_path> [--parallel N] | --batch <文件/目錄/glob>..."
         }))
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args.inputs[0]
+    is_pattern = any(char in file_path for char in '*?[')
+    
+    # 多個輸入、目錄或 glob 自動進入批量模式
+    if args.batch or args.output or len(args.inputs) > 1 or os.path.isdir(file_path) or is_pattern:
+        if args.resume and not args.output:
+            parser.error("--resume 需要同時指定 --output")
+        transcribe_batch(args.inputs, args.output, args.resume, max(1, args.batch_size), args.precision)
+        return
     
     # 檢查文件是否存在
     if not os.path.exists(file_path):
@@ -92,7 +236,7 @@ def main():
         sys.exit(1)
     
     # 執行轉錄
-    result = transcribe_audio(file_path)
+    result = transcribe_cached(file_path, args.parallel, args.precision)
     
     # 輸出結果
     print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,24 @@
+"""
+WhisperMind 轉錄引擎共享模組
+供 whisper-server.py 與各命令行腳本共用，導入本包不會導入 torch
+"""
+
+from whispermind.transcriber import (
+    Segment,
+    TranscriptionData,
+    Transcriber,
+    available_backends,
+    error_result,
+    get_transcriber,
+    transcription_result,
+)
+
+__all__ = [
+    'Segment',
+    'TranscriptionData',
+    'Transcriber',
+    'available_backends',
+    'error_result',
+    'get_transcriber',
+    'transcription_result',
+]
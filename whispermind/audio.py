@@ -0,0 +1,296 @@
+"""
+音頻解碼工具
+通過管道把音頻字節流交給 ffmpeg，直接解碼為 16kHz 單聲道 float32 數組，不落地臨時文件；
+只有 MP4/M4A/MOV 等需要尋址的容器先寫入臨時文件
+"""
+
+import os
+import wave
+import logging
+import subprocess
+import tempfile
+import threading
+import itertools
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from whispermind.stages import stage
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 64 * 1024
+
+# 解碼超時 = 基礎時間 + 音頻時長 × 係數
+DECODE_TIMEOUT_BASE = float(os.environ.get('WHISPER_DECODE_TIMEOUT_BASE', 10))
+DECODE_TIMEOUT_FACTOR = float(os.environ.get('WHISPER_DECODE_TIMEOUT_FACTOR', 0.5))
+# 無法探測時長時按 128kbps 從文件大小估算
+FALLBACK_BYTES_PER_SECOND = 16000
+
+# ISO-BMFF 容器 (MP4/M4A/MOV) 以 ftyp 盒開頭，moov 盒可能位於文件末尾，ffmpeg 無法從管道解碼
+ISO_BMFF_MARKER = b'ftyp'
+# 識別容器需要的文件頭長度
+SNIFF_BYTES = 12
+
+# 原始 PCM 的 Content-Type 與對應的 ffmpeg 輸入格式
+RAW_PCM_FORMATS = {
+    'audio/l16': 's16le',
+    'audio/pcm': 's16le',
+    'audio/x-f32le': 'f32le',
+}
+
+def ffmpeg_command(source: str, sample_rate: int = SAMPLE_RATE,
+                   input_format: Optional[str] = None, input_rate: Optional[int] = None) -> list:
+    """構建輸出 f32le 到標準輸出的 ffmpeg 命令"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+    if input_format:
+        cmd += ['-f', input_format, '-ar', str(input_rate or sample_rate), '-ac', '1']
+    cmd += [
+        '-i', source,
+        '-ac', '1',                 # 單聲道
+        '-ar', str(sample_rate),    # 16kHz 採樣率
+        '-f', 'f32le',
+        'pipe:1'
+    ]
+    return cmd
+
+def _read_pcm(stream) -> np.ndarray:
+    """把 f32le 字節流讀入 float32 數組"""
+    buffer = bytearray()
+    while True:
+        block = stream.read(BLOCK_SIZE)
+        if not block:
+            break
+        buffer += block
+    usable = len(buffer) - len(buffer) % 4
+    return np.frombuffer(buffer, dtype=np.float32, count=usable // 4)
+
+def decode_stream(blocks: Iterable[bytes], sample_rate: int = SAMPLE_RATE,
+                  input_format: Optional[str] = None, input_rate: Optional[int] = None) -> np.ndarray:
+    """邊接收邊解碼音頻字節流
+
+    MP4/M4A/MOV 的 moov 盒可能位於文件末尾，無法從不可尋址的管道解碼，
+    這類容器先寫入可尋址的臨時文件再交給 ffmpeg。
+    """
+    blocks = iter(blocks)
+    head = b''
+    if input_format is None:
+        # 讀取足夠識別容器的文件頭，之後與剩餘字節一起交給解碼
+        for block in blocks:
+            head += block
+            if len(head) >= SNIFF_BYTES:
+                break
+    blocks = itertools.chain([head] if head else [], blocks)
+    with stage("decode"):
+        if is_iso_bmff(head):
+            return _decode_spooled(blocks, sample_rate)
+        return _decode_pipe(blocks, sample_rate, input_format, input_rate)
+
+def is_iso_bmff(head: bytes) -> bool:
+    """文件頭是否為 ISO-BMFF 容器 (MP4/M4A/MOV)"""
+    return head[4:8] == ISO_BMFF_MARKER
+
+def _decode_spooled(blocks: Iterable[bytes], sample_rate: int) -> np.ndarray:
+    """把字節流寫入臨時文件後解碼，讓 ffmpeg 可以尋址到文件末尾的 moov 盒"""
+    with tempfile.NamedTemporaryFile(prefix='whispermind-', suffix='.mp4') as spool:
+        for block in blocks:
+            spool.write(block)
+        spool.flush()
+        logger.info(f"📦 MP4/M4A/MOV 容器需要尋址，已寫入臨時文件解碼 ({spool.tell() / 1024 / 1024:.1f} MB)")
+        return decode_file(spool.name, sample_rate)
+
+def _decode_pipe(blocks: Iterable[bytes], sample_rate: int,
+                 input_format: Optional[str], input_rate: Optional[int]) -> np.ndarray:
+    proc = subprocess.Popen(
+        ffmpeg_command('pipe:0', sample_rate, input_format, input_rate),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    errors = []
+
+    def feed():
+        try:
+            for block in blocks:
+                proc.stdin.write(block)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    stderr = []
+    feeder = threading.Thread(target=feed, daemon=True)
+    reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    feeder.start()
+    reader.start()
+
+    audio = _read_pcm(proc.stdout)
+    proc.wait()
+    feeder.join()
+    reader.join()
+
+    if errors:
+        raise errors[0]
+    if proc.returncode != 0:
+        message = b''.join(stderr).decode('utf-8', 'replace').strip()
+        raise RuntimeError(f"ffmpeg 解碼失敗: {message}")
+    return audio
+
+def decode_file(file_path: str, sample_rate: int = SAMPLE_RATE,
+                timeout: Optional[float] = None) -> np.ndarray:
+    """用 ffmpeg 把文件解碼為 f32le，經管道直接讀入 float32 數組"""
+    try:
+        result = subprocess.run(ffmpeg_command(file_path, sample_rate), capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"ffmpeg 解碼超時 ({timeout:.0f}s)")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 解碼失敗: {result.stderr.decode('utf-8', 'replace').strip()}")
+    usable = len(result.stdout) - len(result.stdout) % 4
+    return np.frombuffer(result.stdout, dtype=np.float32, count=usable // 4)
+
+def probe_duration(file_path: str) -> Optional[float]:
+    """用 ffprobe 讀取音頻時長（秒），失敗時返回 None"""
+    try:
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            file_path
+        ], capture_output=True, text=True, timeout=10)
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+def decode_timeout(file_path: str) -> float:
+    """按音頻時長計算解碼超時"""
+    duration = probe_duration(file_path)
+    if duration is None:
+        duration = os.path.getsize(file_path) / FALLBACK_BYTES_PER_SECOND
+    return DECODE_TIMEOUT_BASE + duration * DECODE_TIMEOUT_FACTOR
+
+def read_pcm_wav(file_path: str, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    """已是目標採樣率的單聲道 16 位 PCM WAV 直接讀取，否則返回 None"""
+    try:
+        with wave.open(file_path, 'rb') as wav:
+            if (wav.getnchannels() != 1 or wav.getframerate() != sample_rate
+                    or wav.getsampwidth() != 2 or wav.getcomptype() != 'NONE'):
+                return None
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    samples = np.frombuffer(frames, dtype='<i2')
+    return samples.astype(np.float32) / 32768.0
+
+def load_audio(file_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """加載音頻為 16kHz 單聲道 float32，可直接使用的 WAV 跳過 ffmpeg"""
+    with stage("decode"):
+        audio = read_pcm_wav(file_path, sample_rate)
+        if audio is not None:
+            logger.info(f"✅ 直接讀取 PCM WAV: {len(audio) / sample_rate:.1f}s")
+            return audio
+        return decode_file(file_path, sample_rate, timeout=decode_timeout(file_path))
+
+def iter_chunked(rfile, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """讀取 Transfer-Encoding: chunked 的請求體"""
+    while True:
+        line = rfile.readline()
+        if not line:
+            raise ConnectionError("分塊傳輸提前結束")
+        size = int(line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            # 跳過尾部字段
+            while rfile.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            return
+        remaining = size
+        while remaining:
+            data = rfile.read(min(remaining, block_size))
+            if not data:
+                raise ConnectionError("分塊傳輸提前結束")
+            remaining -= len(data)
+            yield data
+        rfile.readline()
+
+def iter_request_body(rfile, headers, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """按 Content-Length 或分塊傳輸逐塊讀取請求體"""
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        yield from iter_chunked(rfile, block_size)
+        return
+    remaining = int(headers.get('Content-Length', 0))
+    while remaining:
+        data = rfile.read(min(remaining, block_size))
+        if not data:
+            raise ConnectionError("請求體提前結束")
+        remaining -= len(data)
+        yield data
+
+def iter_multipart_file(blocks: Iterable[bytes], boundary: bytes) -> Iterator[bytes]:
+    """從 multipart/form-data 流中取出第一個文件字段的內容"""
+    blocks = iter(blocks)
+    delimiter = b'\r\n--' + boundary
+    buffer = bytearray(b'\r\n')
+    state = 'boundary'
+    found = False
+
+    for block in blocks:
+        buffer += block
+        while True:
+            if state == 'boundary':
+                index = buffer.find(delimiter)
+                if index < 0:
+                    del buffer[:max(0, len(buffer) - len(delimiter) + 1)]
+                    break
+                del buffer[:index + len(delimiter)]
+                state = 'headers'
+
+            if state == 'headers':
+                if len(buffer) < 2:
+                    break
+                if buffer[:2] == b'--':
+                    # 結束分隔符
+                    state = 'done'
+                    break
+                index = buffer.find(b'\r\n\r\n')
+                if index < 0:
+                    break
+                part_headers = bytes(buffer[:index]).decode('utf-8', 'replace')
+                del buffer[:index + 4]
+                state = 'file' if 'filename=' in part_headers else 'boundary'
+
+            if state == 'file':
+                found = True
+                index = buffer.find(delimiter)
+                if index < 0:
+                    keep = len(delimiter) - 1
+                    if len(buffer) > keep:
+                        yield bytes(buffer[:-keep])
+                        del buffer[:-keep]
+                    break
+                yield bytes(buffer[:index])
+                state = 'done'
+
+            if state == 'done':
+                break
+
+        if state == 'done':
+            # 讀完剩餘請求體，保持連接狀態正確
+            for _ in blocks:
+                pass
+            break
+
+    if not found:
+        raise ValueError("multipart 請求中沒有文件字段")
+
+def parse_content_type(value: str) -> Dict[str, str]:
+    """解析 Content-Type 為 {'type': ..., 參數...}"""
+    parts = [p.strip() for p in (value or '').split(';')]
+    params = {'type': parts[0].lower()}
+    for part in parts[1:]:
+        if '=' in part:
+            key, val = part.split('=', 1)
+            params[key.strip().lower()] = val.strip().strip('"')
+    return params
@@ -0,0 +1,4 @@
+"""
+轉錄後端
+由 whispermind.transcriber.get_transcriber 按需導入，不要在此處導入子模組
+"""
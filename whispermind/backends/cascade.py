@@ -0,0 +1,153 @@
+"""
+信心度級聯後端
+先用小模型 (openai-whisper base) 轉錄全部音頻，按分段的 avg_logprob、no_speech_prob
+與壓縮比找出不可靠的分段，只把這些分段所在的音頻區間交給大模型 (large-v3) 重新轉錄；
+每個分段的 model 字段標明由哪個模型產生
+"""
+
+import os
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.transcriber import Segment, Transcriber, TranscriptionData, get_transcriber
+
+logger = logging.getLogger(__name__)
+
+SMALL_MODEL = os.environ.get('WHISPER_CASCADE_SMALL', 'base')
+LARGE_BACKEND = os.environ.get('WHISPER_CASCADE_LARGE_BACKEND', 'transformers')
+LARGE_MODEL = os.environ.get('WHISPER_CASCADE_LARGE', 'openai/whisper-large-v3')
+
+# 與 openai-whisper 自身的回退閾值一致
+LOGPROB_THRESHOLD = float(os.environ.get('WHISPER_CASCADE_LOGPROB', -1.0))
+NO_SPEECH_THRESHOLD = float(os.environ.get('WHISPER_CASCADE_NO_SPEECH', 0.6))
+COMPRESSION_THRESHOLD = float(os.environ.get('WHISPER_CASCADE_COMPRESSION', 2.4))
+
+# 重轉區間向兩側擴展的秒數，不越過相鄰的可靠分段
+SPAN_PADDING = 0.5
+
+def weak_reasons(segment: Dict[str, Any], logprob_threshold: float = LOGPROB_THRESHOLD,
+                 no_speech_threshold: float = NO_SPEECH_THRESHOLD,
+                 compression_threshold: float = COMPRESSION_THRESHOLD) -> List[str]:
+    """分段不可靠的原因，可靠時返回空列表"""
+    reasons = []
+    if segment.get('avg_logprob', 0.0) < logprob_threshold:
+        reasons.append('avg_logprob')
+    if segment.get('no_speech_prob', 0.0) > no_speech_threshold:
+        reasons.append('no_speech_prob')
+    if segment.get('compression_ratio', 0.0) > compression_threshold:
+        reasons.append('compression_ratio')
+    return reasons
+
+def weak_spans(segments: List[Dict[str, Any]], weak: List[bool], duration: float,
+               padding: float = SPAN_PADDING) -> List[Tuple[int, int, float, float]]:
+    """把相鄰的不可靠分段合併為重轉區間，返回 (首段索引, 末段索引+1, 起始秒, 結束秒)"""
+    spans = []
+    index = 0
+    while index < len(segments):
+        if not weak[index]:
+            index += 1
+            continue
+        first = index
+        while index < len(segments) and weak[index]:
+            index += 1
+        floor = segments[first - 1]['end'] if first > 0 else 0.0
+        ceiling = segments[index]['start'] if index < len(segments) else duration
+        start = max(floor, min(segments[first]['start'], ceiling) - padding)
+        end = min(ceiling, max(segments[index - 1]['end'], start) + padding)
+        spans.append((first, index, max(0.0, start), min(duration, end)))
+    return spans
+
+class CascadeTranscriber(Transcriber):
+    """小模型優先、大模型只重轉不可靠分段的轉錄器
+
+    兩個子轉錄器都關閉 VAD，靜音壓縮與時間戳映射由本類統一處理；大模型在首次需要時才加載。
+    """
+
+    name = 'cascade'
+
+    def __init__(self, model: str = SMALL_MODEL, large_model: str = LARGE_MODEL,
+                 large_backend: str = LARGE_BACKEND, language: Optional[str] = None,
+                 logprob_threshold: float = LOGPROB_THRESHOLD,
+                 no_speech_threshold: float = NO_SPEECH_THRESHOLD,
+                 compression_threshold: float = COMPRESSION_THRESHOLD, **options: Any):
+        super().__init__(model, language=language, **options)
+        self.large_model = large_model
+        self.large_backend = large_backend
+        self.thresholds = {
+            "logprob_threshold": logprob_threshold,
+            "no_speech_threshold": no_speech_threshold,
+            "compression_threshold": compression_threshold,
+        }
+        self.small = get_transcriber('openai-whisper', model=model, language=self.language, vad=False)
+        self.large = get_transcriber(large_backend, model=large_model, language=self.language, vad=False)
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        return dict(super().cache_params, small=self.small.cache_params, large=self.large.cache_params,
+                    large_model=self.large_model, **self.thresholds)
+
+    def _load(self):
+        self.small.load()
+
+    def detect_language(self, audio) -> Optional[Tuple[str, float]]:
+        self.small.load()
+        return self.small.detect_language(audio)
+
+    def _rerun(self, audio, start: float, end: float, language: Optional[str] = None) -> List[Dict[str, Any]]:
+        """用大模型轉錄一個區間，時間戳換算回整段音頻並限制在區間內"""
+        self.large.load()
+        span = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        segments = self.large.transcribe_array(span, language=language).get("segments", []) if len(span) else []
+        for segment in segments:
+            segment['start'] = min(end, start + segment['start'])
+            segment['end'] = min(end, max(segment['start'], start + segment['end']))
+            segment['model'] = self.large_model
+        return segments
+
+    def transcribe_array(self, audio, language: Optional[str] = None) -> Dict[str, Any]:
+        duration = len(audio) / SAMPLE_RATE
+        output = self.small.transcribe_array(audio, language=language or self.language)
+        # 重轉區間很短，不讓大模型在其中重新識別語言
+        language = language or self.language or output.get("language")
+        segments = output.get("segments", [])
+        weak = []
+        for segment in segments:
+            segment['model'] = self.model
+            reasons = weak_reasons(segment, **self.thresholds)
+            if reasons:
+                segment['weak'] = reasons
+            weak.append(bool(reasons))
+
+        spans = weak_spans(segments, weak, duration)
+        merged: List[Dict[str, Any]] = []
+        rerun_seconds = 0.0
+        position = 0
+        for first, last, start, end in spans:
+            merged.extend(segments[position:first])
+            logger.info(f"🔁 {last - first} 個低信心分段 ({start:.1f}s-{end:.1f}s) 交給 {self.large_model} 重新轉錄")
+            merged.extend(self._rerun(audio, start, end, language))
+            rerun_seconds += end - start
+            position = last
+        merged.extend(segments[position:])
+
+        text = "".join(segment.get("text", "") for segment in merged).strip() if spans else output.get("text", "")
+        return {
+            "text": text,
+            "language": language or 'unknown',
+            "segments": merged,
+            "cascade": {
+                "small": self.model,
+                "large": self.large_model,
+                "weak_segments": sum(weak),
+                "rerun_seconds": rerun_seconds,
+                "rerun_ratio": rerun_seconds / duration if duration else 0.0,
+            },
+        }
+
+    def finish(self, output: Dict[str, Any], audio, speech, sample_rate: Optional[int] = None,
+               on_segment: Optional[Callable[[Segment], None]] = None) -> TranscriptionData:
+        result = super().finish(output, audio, speech, sample_rate, on_segment)
+        if "cascade" in output:
+            result["cascade"] = output["cascade"]
+        return result
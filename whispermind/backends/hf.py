@@ -0,0 +1,293 @@
+"""
+transformers 後端
+使用 Hugging Face transformers 的 Whisper 管道，默認 openai/whisper-large-v3
+"""
+
+import re
+import logging
+import itertools
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.precision import load_whisper_model, normalize_precision, resolve_precision
+from whispermind.speculative import ASSISTANT_MODEL
+from whispermind.stages import stage
+from whispermind.transcriber import DEFAULT_CONFIDENCE, Transcriber
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'openai/whisper-large-v3'
+CHUNK_SECONDS = 30
+
+class TransformersBackend(Transcriber):
+    """基於 transformers pipeline 的轉錄器
+
+    precision 可選 fp32 / bf16 / int8，未指定時使用 WHISPER_PRECISION。
+    指定 assistant_model 時以投機解碼運行，輸出與貪婪解碼一致，但只作用於批大小為 1 的解碼。
+    """
+
+    name = 'transformers'
+
+    def __init__(self, model: str = DEFAULT_MODEL, chunk_length_s: int = CHUNK_SECONDS,
+                 stride_length_s: int = 5, batch_size: int = 1, precision: str = None,
+                 assistant_model: Optional[str] = ASSISTANT_MODEL, num_beams: Optional[int] = None,
+                 **options: Any):
+        super().__init__(model, **options)
+        self.chunk_length_s = chunk_length_s
+        self.stride_length_s = stride_length_s
+        self.batch_size = batch_size
+        # bf16 在構造時確定是否回退，使緩存鍵與實際精度一致
+        precision = normalize_precision(precision)
+        self.precision = resolve_precision(precision) if precision == 'bf16' else precision
+        self.assistant_model = assistant_model
+        # 管道默認 5 路束搜索；投機解碼的結果與貪婪解碼一致，因此固定為 1
+        self.num_beams = 1 if assistant_model else num_beams
+        self.speculative = None
+        self.load_seconds = None
+        self._pipeline = None
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        params = dict(super().cache_params, chunk_length_s=self.chunk_length_s,
+                      stride_length_s=self.stride_length_s, return_timestamps=True,
+                      precision=self.precision)
+        if self.num_beams is not None:
+            params["num_beams"] = self.num_beams
+        return params
+
+    def _load(self):
+        # 延遲導入以避免啟動時的依賴問題
+        from transformers import pipeline
+
+        logger.info(f"🔄 正在加載模型: {self.model} ({self.precision})")
+        started = time.perf_counter()
+        components = {}
+        if self.precision != 'fp32' or self.assistant_model:
+            from transformers import AutoFeatureExtractor, AutoTokenizer
+            components = {
+                "model": load_whisper_model(self.model, self.precision),
+                "tokenizer": AutoTokenizer.from_pretrained(self.model),
+                "feature_extractor": AutoFeatureExtractor.from_pretrained(self.model),
+            }
+        if self.assistant_model:
+            from whispermind.speculative import SpeculativeDecoder, load_assistant
+
+            assistant = load_assistant(self.assistant_model, self.precision)
+            self.speculative = SpeculativeDecoder(components["model"], assistant)
+            if self.batch_size > 1:
+                logger.warning("⚠️ 投機解碼只作用於批大小為 1 的解碼，批量解碼仍為普通貪婪解碼")
+        if self.num_beams is not None:
+            components["generate_kwargs"] = {"num_beams": self.num_beams}
+        self._pipeline = pipeline(
+            "automatic-speech-recognition",
+            model=components.pop("model", self.model),
+            return_timestamps=True,
+            chunk_length_s=self.chunk_length_s,
+            stride_length_s=self.stride_length_s,
+            batch_size=self.batch_size,
+            **components,
+        )
+        self.load_seconds = time.perf_counter() - started
+        logger.info(f"✅ 模型加載完成 ({self.load_seconds:.1f}s)")
+
+    @property
+    def pipeline(self):
+        self.load()
+        return self._pipeline
+
+    def warmup(self, seconds: float = 1.0):
+        """用一段合成音頻預熱模型，避免首個請求承擔初始化開銷"""
+        samples = int(SAMPLE_RATE * seconds)
+        t = np.arange(samples, dtype=np.float32) / SAMPLE_RATE
+        clip = (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+        started = time.perf_counter()
+        self.pipeline({"raw": clip, "sampling_rate": SAMPLE_RATE})
+        logger.info(f"🔥 模型預熱完成 ({time.perf_counter() - started:.1f}s)")
+
+    @staticmethod
+    def _segments(output: Dict[str, Any], duration: float) -> List[Dict[str, Any]]:
+        """把管道的 chunks 轉換為我們的分段格式"""
+        segments = []
+        for chunk in output.get("chunks", []):
+            if "timestamp" in chunk and chunk["timestamp"]:
+                start, end = chunk["timestamp"]
+                segments.append({
+                    "start": start,
+                    "end": end if end is not None else duration,
+                    "text": chunk["text"],
+                    "confidence": DEFAULT_CONFIDENCE  # Whisper 不提供信心度
+                })
+        return segments
+
+    def _forced_language(self, language: Optional[str]) -> Optional[str]:
+        """強制解碼使用的語言代碼；模型不支持的語言 (如級聯中小模型識別出的語言) 交回解碼器自行識別"""
+        from transformers.models.whisper.tokenization_whisper import TO_LANGUAGE_CODE
+
+        language = language or self.language
+        if not language:
+            return None
+        language = TO_LANGUAGE_CODE.get(language, language)  # 也接受 cantonese 等語言名
+        lang_to_id = getattr(self.pipeline.model.generation_config, 'lang_to_id', None) or {}
+        if f"<|{language}|>" not in lang_to_id:
+            logger.warning(f"⚠️ 模型不支持語言 {language}，改由解碼器自行識別")
+            return None
+        return language
+
+    def detect_language(self, audio: np.ndarray) -> Optional[Tuple[str, float]]:
+        """只運行編碼器和解碼器的第一步，在語言標記的 logits 上取概率最高者"""
+        import torch
+
+        pipe = self.pipeline
+        model = pipe.model
+        lang_to_id = getattr(model.generation_config, 'lang_to_id', None)
+        if not lang_to_id:
+            return None
+        inputs = pipe.feature_extractor(audio, sampling_rate=SAMPLE_RATE, return_tensors="pt")
+        features = inputs.input_features.to(model.device, dtype=model.dtype)
+        start = torch.tensor([[model.generation_config.decoder_start_token_id]], device=model.device)
+        with torch.inference_mode():
+            encoded = model.get_encoder()(features)
+            logits = model(encoder_outputs=encoded, decoder_input_ids=start).logits[0, -1]
+        tokens = list(lang_to_id)
+        probabilities = logits[list(lang_to_id.values())].float().softmax(-1)
+        best = int(probabilities.argmax())
+        return tokens[best][2:-2], float(probabilities[best])
+
+    def transcribe_array(self, audio: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        pipe = self.pipeline
+        language = self._forced_language(language)
+        options = {"generate_kwargs": {"language": language}} if language else {}
+        with stage("inference"):
+            output = pipe({"raw": audio, "sampling_rate": SAMPLE_RATE}, **options)
+        return {
+            "text": output.get("text", ""),
+            "segments": self._segments(output, len(audio) / SAMPLE_RATE),
+        }
+
+    def transcribe_many(self, sources: Iterable[np.ndarray],
+                        batch_size: int = None) -> Iterator[Union[Dict[str, Any], Exception]]:
+        """批量轉錄多段音頻，結果按輸入順序逐個產出；失敗的項產出其異常，不影響其他項
+
+        每段音頻先在第一個含語音的窗口上識別一次語言，再以該語言強制解碼其所有窗口。
+        管道不支持逐項指定語言，因此按語言分組批處理，先完成的結果暫存到輪到它時再產出。
+        某組批處理失敗時該組未完成的項逐個重新轉錄，異常只記在確實失敗的項上。
+        """
+        sources = list(sources)
+        done: Dict[int, Union[Dict[str, Any], Exception]] = {}
+        identified: Dict[int, Tuple[Optional[str], Optional[float]]] = {}
+        for index, audio in enumerate(sources):
+            try:
+                identified[index] = self.identify_language(audio)
+            except Exception as e:
+                logger.error(f"❌ 第 {index + 1} 段音頻語言識別失敗: {e}")
+                done[index] = e
+
+        next_index = 0
+        order = sorted(identified, key=lambda index: identified[index][0] or '')
+        for language, group in itertools.groupby(order, key=lambda index: identified[index][0]):
+            group = list(group)
+            try:
+                forced = self._forced_language(language)
+                options = {"generate_kwargs": {"language": forced}} if forced else {}
+                inputs = ({"raw": sources[index], "sampling_rate": SAMPLE_RATE} for index in group)
+                outputs = self.pipeline(inputs, batch_size=batch_size or self.batch_size, **options)
+                for index, output in zip(group, outputs):
+                    done[index] = self._tagged({
+                        "text": output.get("text", ""),
+                        "segments": self._segments(output, len(sources[index]) / SAMPLE_RATE),
+                    }, language, identified[index][1])
+                    while next_index in done:
+                        yield done.pop(next_index)
+                        next_index += 1
+            except Exception as e:
+                logger.warning(f"⚠️ 語言 {language or '自動'} 的批處理失敗，逐個重新轉錄: {e}")
+
+            # 批處理失敗或管道少產出了結果時，剩餘的項逐個轉錄以確定哪一項失敗
+            for index in group:
+                if index in done or index < next_index:
+                    continue
+                try:
+                    done[index] = self._tagged(self.transcribe_array(sources[index], language=language),
+                                               language, identified[index][1])
+                except Exception as e:
+                    logger.error(f"❌ 第 {index + 1} 段音頻轉錄失敗: {e}")
+                    done[index] = e
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+
+    @staticmethod
+    def _tagged(output: Dict[str, Any], language: Optional[str], probability: Optional[float]) -> Dict[str, Any]:
+        """在結果中記錄識別出的語言"""
+        if language:
+            output["language"] = language
+            output["language_probability"] = probability
+        return output
+
+    def decode_chunks(self, chunks: List[np.ndarray], prompt: Optional[str] = None,
+                      language: Optional[str] = None, cancel: Optional[List] = None) -> List[Dict[str, Any]]:
+        """一次前向傳播解碼一批不超過 30 秒的音頻塊，返回帶 offsets 的解碼結果
+
+        啟用投機解碼時逐塊解碼，草稿驗證只支持批大小 1。
+        prompt 為前文 (如上一輪已確認的文本)，作為解碼上下文，不出現在結果中。
+        language 為強制使用的語言，未指定時由解碼器在每塊內自行識別。
+        cancel 為與 chunks 對應的取消令牌 (可為 None)，每個解碼步檢查一次，
+        已取消或超過期限的塊提前結束生成，其結果不完整，由調用方丟棄。
+        """
+        import torch
+
+        pipe = self.pipeline
+        with stage("features"):
+            inputs = pipe.feature_extractor(chunks, sampling_rate=SAMPLE_RATE, return_tensors="pt")
+            features = inputs.input_features.to(pipe.model.device, dtype=pipe.model.dtype)
+
+        # 編碼器輸出已預先計算，generate 無法為未到窗口末尾的行 (含提前取消的行) 重新編碼下一輪窗口，
+        # 否則會重複解碼同一窗口，或在批內行數縮減時因缺少 input_features 報錯
+        options: Dict[str, Any] = {"return_timestamps": True, "force_unique_generate_call": True}
+        # 提示詞中不能出現特殊標記的文本 (如解碼結果裡殘留的 <|zh|>)，否則 get_prompt_ids 報錯
+        prompt = re.sub(r'<\|[^|]*\|>', '', prompt or '').strip()
+        if prompt:
+            options["prompt_ids"] = pipe.tokenizer.get_prompt_ids(prompt, return_tensors="pt").to(
+                pipe.model.device)
+
+        language = self._forced_language(language)
+        if language:
+            options["language"] = language
+
+        size = 1 if self.speculative else len(chunks)
+        tokens = []
+        # 編碼器單獨運行，使編碼與自回歸解碼的耗時可以分開觀察
+        with torch.inference_mode():
+            for start in range(0, len(chunks), size):
+                group = features[start:start + size]
+                group_cancel = cancel[start:start + size] if cancel else []
+                criteria = ({"stopping_criteria": _cancel_criteria(group_cancel)}
+                            if any(token is not None for token in group_cancel) else {})
+                with stage("encoder"):
+                    encoded = pipe.model.get_encoder()(group)
+                with stage("decoder"):
+                    tokens.extend(pipe.model.generate(encoder_outputs=encoded, **options, **criteria))
+
+        with stage("postprocess"):
+            return [
+                pipe.tokenizer.decode(ids, skip_special_tokens=True, output_offsets=True)
+                for ids in tokens
+            ]
+
+def _cancel_criteria(tokens: List):
+    """每個解碼步檢查各行的取消令牌，已取消的行提前結束生成"""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class CancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            done = torch.tensor([token is not None and token.cancelled for token in tokens],
+                                device=input_ids.device)
+            # 束搜索時每行展開為多個假設
+            return done.repeat_interleave(max(1, input_ids.shape[0] // len(tokens)))
+
+    return StoppingCriteriaList([CancelCriteria()])
@@ -0,0 +1,84 @@
+"""
+模擬後端
+不加載任何模型，根據文件大小生成確定性的模擬結果，用於測試與降級
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from whispermind.transcriber import (
+    Segment, Transcriber, TranscriptionData, error_result, transcription_result
+)
+
+DEFAULT_TEMPLATE = "這是 {name} 的轉錄結果。文件大小: {size} 字節。這是一個{length}音頻文件的模擬轉錄。"
+
+def length_label(size: int) -> str:
+    """按文件大小描述音頻長短"""
+    if size < 100000:  # 小於 100KB
+        return "短"
+    if size < 1000000:  # 小於 1MB
+        return "中等長度"
+    return "長"
+
+class MockBackend(Transcriber):
+    """確定性的模擬轉錄器"""
+
+    name = 'mock'
+
+    def __init__(self, model: str = 'mock', template: str = DEFAULT_TEMPLATE, language: str = 'zh',
+                 parts: int = 3, bytes_per_second: Optional[float] = 10000, min_duration: float = 5.0,
+                 confidence: float = 0.95, delay: float = 0.0, **options: Any):
+        options.setdefault('vad', False)
+        super().__init__(model, language=language, **options)
+        self.template = template
+        self.parts = max(1, parts)
+        self.bytes_per_second = bytes_per_second
+        self.min_duration = min_duration
+        self.confidence = confidence
+        self.delay = delay
+
+    def _duration(self, size: int) -> float:
+        if not self.bytes_per_second:
+            return self.min_duration
+        return max(self.min_duration, size / self.bytes_per_second)
+
+    def _result(self, name: str, size: int, duration: float) -> TranscriptionData:
+        """把模擬文本均分為若干段"""
+        text = self.template.format(name=name, size=size, length=length_label(size))
+        words = text.split()
+        segment_length = max(1, len(words) // self.parts)
+
+        segments = []
+        for i in range(0, len(words), segment_length):
+            segment_words = words[i:i + segment_length]
+            start_time = (i / len(words)) * duration
+            segments.append({
+                "id": i // segment_length,
+                "start": start_time,
+                "end": start_time + duration / len(words) * len(segment_words),
+                "text": ' '.join(segment_words),
+                "confidence": self.confidence
+            })
+
+        return transcription_result(text, segments, duration, language=self.language,
+                                    confidence=self.confidence)
+
+    def transcribe_array(self, audio, language: Optional[str] = None) -> Dict[str, Any]:
+        result = self._result("audio", len(audio) * 4, len(audio) / 16000)
+        return {"text": result["text"], "segments": result["segments"], "language": language or self.language}
+
+    def transcribe_file(self, file_path: str,
+                        on_segment: Optional[Callable[[Segment], None]] = None,
+                        language: Optional[str] = None) -> TranscriptionData:
+        if not os.path.exists(file_path):
+            return error_result(f"文件不存在: {file_path}")
+        if self.delay:
+            time.sleep(self.delay)
+
+        size = os.path.getsize(file_path)
+        result = self._result(os.path.basename(file_path), size, self._duration(size))
+        if on_segment:
+            for segment in result["segments"]:
+                on_segment(segment)
+        return result
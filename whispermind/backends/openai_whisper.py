@@ -0,0 +1,140 @@
+"""
+openai-whisper 後端
+可在進程內使用 whisper 庫常駐模型，也可調用 whisper 命令行工具隔離運行
+"""
+
+import os
+import json
+import logging
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from whispermind.stages import stage
+from whispermind.transcriber import (
+    DEFAULT_CONFIDENCE, Segment, Transcriber, TranscriptionData, error_result, transcription_result
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'base'
+
+def segment_confidence(segment: Dict[str, Any]) -> float:
+    """由 no_speech_prob 估算分段信心度"""
+    return max(0.1, 1.0 - segment.get('no_speech_prob', 1.0 - DEFAULT_CONFIDENCE))
+
+class OpenAIWhisperBackend(Transcriber):
+    """基於 openai-whisper 庫或命令行工具的轉錄器"""
+
+    name = 'openai-whisper'
+
+    def __init__(self, model: str = DEFAULT_MODEL, use_cli: bool = False, executable: str = 'whisper',
+                 timeout: Optional[float] = None, **options: Any):
+        super().__init__(model, **options)
+        self.use_cli = use_cli
+        self.executable = executable
+        self.timeout = timeout
+        self._model = None
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        return dict(super().cache_params, fp16=False, language=self.language)
+
+    def _load(self):
+        if self.use_cli:
+            return
+        import whisper
+
+        logger.info(f"🔄 正在加載 {self.model} 模型...")
+        self._model = whisper.load_model(self.model)
+
+    @staticmethod
+    def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+        """補上分段信心度，保留 avg_logprob 等原始字段"""
+        segments = data.get('segments', [])
+        for segment in segments:
+            segment.setdefault('confidence', segment_confidence(segment))
+        return {
+            "text": data.get('text', ''),
+            "language": data.get('language', 'unknown'),
+            "segments": segments,
+        }
+
+    def _forced_language(self, language: Optional[str]) -> Optional[str]:
+        """強制解碼使用的語言代碼；模型不支持的語言 (如 base 模型沒有 yue) 交回模型自行識別"""
+        from whisper.tokenizer import LANGUAGES, TO_LANGUAGE_CODE
+
+        language = language or self.language
+        if not language:
+            return None
+        language = TO_LANGUAGE_CODE.get(language, language)
+        if language not in tuple(LANGUAGES)[:self._model.num_languages]:
+            logger.warning(f"⚠️ 模型 {self.model} 不支持語言 {language}，改由模型自行識別")
+            return None
+        return language
+
+    def detect_language(self, audio) -> Optional[Tuple[str, float]]:
+        import whisper
+
+        if self._model is None or not self._model.is_multilingual:
+            return None
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self._model.dims.n_mels)
+        _, probabilities = self._model.detect_language(mel.to(self._model.device))
+        language = max(probabilities, key=probabilities.get)
+        return language, float(probabilities[language])
+
+    def transcribe_array(self, audio, language: Optional[str] = None) -> Dict[str, Any]:
+        options = {"fp16": False, "verbose": None}
+        language = self._forced_language(language)
+        if language:
+            options["language"] = language
+        with stage("inference"):
+            output = self._model.transcribe(audio, **options)
+        return self._normalize(output)
+
+    def transcribe_file(self, file_path: str,
+                        on_segment: Optional[Callable[[Segment], None]] = None,
+                        language: Optional[str] = None) -> TranscriptionData:
+        if not self.use_cli:
+            return super().transcribe_file(file_path, on_segment, language)
+        if not os.path.exists(file_path):
+            return error_result(f"文件不存在: {file_path}")
+        return self._transcribe_cli(file_path, language)
+
+    def _transcribe_cli(self, file_path: str, language: Optional[str] = None) -> TranscriptionData:
+        """調用 whisper 命令行工具，結果寫入臨時目錄後讀回
+
+        未指定語言時由命令行工具在開頭 30 秒上識別一次並用於整個文件。
+        """
+        from whispermind.language import normalize_language
+
+        language = normalize_language(language) or self.language
+        with tempfile.TemporaryDirectory() as output_dir:
+            cmd = [
+                self.executable, file_path,
+                '--model', self.model,
+                '--output_dir', output_dir,
+                '--output_format', 'json',
+                '--fp16', 'False',  # 避免精度問題
+                '--verbose', 'False'
+            ]
+            if language:
+                cmd += ['--language', language]
+
+            logger.info(f"🔄 執行轉錄命令: {' '.join(cmd)}")
+            with stage("inference"):
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+            if result.returncode != 0:
+                return error_result(f"轉錄失敗: {result.stderr}")
+
+            json_files = [name for name in os.listdir(output_dir) if name.endswith('.json')]
+            if not json_files:
+                return error_result("轉錄完成但未找到結果文件")
+            with open(os.path.join(output_dir, json_files[0]), 'r', encoding='utf-8') as f:
+                output = self._normalize(json.load(f))
+
+        segments: List[Segment] = output["segments"]
+        return transcription_result(
+            output["text"], segments, segments[-1].get('end', 0) if segments else 0,
+            language=output["language"]
+        )
@@ -0,0 +1,682 @@
+"""
+離線基準測試
+生成類語音的合成音頻，分別通過服務器管道、whisper-robust.py 的分塊流式加載路徑、
+whisper-real.py 的 openai-whisper 路徑與 whisper 命令行路徑轉錄，
+報告實時率 (RTF)、延遲百分位、峰值內存與各階段耗時。
+默認使用隨機初始化的微型 Whisper 模型，無需下載權重；每個路徑在獨立子進程中運行，
+使峰值內存互不干擾
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import wave
+import shutil
+import logging
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import importlib.util
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.stages import StageTimer, add_observer
+
+try:
+    import resource
+except ImportError:  # 非 POSIX 平台不報告峰值內存
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = os.environ.get('WHISPER_BENCH_DIR', os.path.join(tempfile.gettempdir(), 'whispermind-bench'))
+
+# 以此名稱指定模型時構建隨機初始化的微型模型
+RANDOM_MODEL = 'random'
+CASES = ('server', 'robust', 'real', 'cli')
+DEFAULT_DURATIONS = (5, 30, 120)
+DEFAULT_REPEATS = 5
+
+# 回歸判定: 相對變差超過閾值，且絕對差超過噪聲下限
+DEFAULT_THRESHOLD = 0.10
+LATENCY_METRICS = ('rtf', 'p50', 'p95', 'p99')
+NOISE_FLOOR = {'rtf': 0.01, 'p50': 0.02, 'p95': 0.02, 'p99': 0.02, 'peak_rss_mb': 16.0}
+
+# 微型模型: 單層、32 維，解碼最多 128 個 token
+TINY_MAX_LENGTH = 128
+
+def speech_like(seconds: float, sample_rate: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """生成類語音信號: 帶語調起伏和共振峰的諧波音節、摩擦音噪聲段，以及詞間、句間停頓"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+    position = 0
+
+    while position < total:
+        # 一個詞由 1-4 個音節組成
+        for _ in range(rng.integers(1, 5)):
+            length = min(total - position, int(rng.uniform(0.12, 0.3) * sample_rate))
+            if length <= 0:
+                break
+            t = np.arange(length) / sample_rate
+            if rng.random() < 0.2:
+                # 摩擦音: 差分後的白噪聲偏向高頻
+                syllable = np.diff(rng.standard_normal(length + 1)) * 0.05
+            else:
+                f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(1, 3) * t))
+                phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+                harmonics = np.arange(1, int(sample_rate / 2 / f0.max()))
+                formants = rng.uniform([300, 900], [800, 2200])
+                frequencies = harmonics * f0.mean()
+                gains = np.exp(-((frequencies[:, None] - formants) / 120.0) ** 2).sum(axis=1) + 0.05 / harmonics
+                syllable = (gains[:, None] * np.sin(harmonics[:, None] * phase)).sum(axis=0)
+                syllable *= 0.3 / max(1e-6, np.abs(syllable).max())
+            envelope = np.sqrt(np.sin(np.pi * np.arange(length) / length))
+            audio[position:position + length] += syllable * envelope
+            position += length
+        # 詞間短停頓，偶爾句間長停頓
+        pause = rng.uniform(0.05, 0.25) if rng.random() < 0.8 else rng.uniform(0.4, 1.0)
+        position += int(pause * sample_rate)
+
+    audio += rng.standard_normal(total).astype(np.float32) * 0.002  # 環境底噪
+    return np.clip(audio, -1.0, 1.0)
+
+def write_wav(file_path: str, audio: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """寫出單聲道 16 位 PCM WAV"""
+    with wave.open(file_path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((audio * 32767).astype('<i2').tobytes())
+
+def prepare_audio(durations: Sequence[float], directory: str) -> List[Dict[str, Any]]:
+    """按時長生成合成音頻文件，已存在時直接復用"""
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for seed, seconds in enumerate(durations):
+        file_path = os.path.join(directory, f"speech-{seconds:g}s.wav")
+        if not os.path.exists(file_path):
+            write_wav(file_path, speech_like(seconds, seed=seed))
+        files.append({"key": f"{seconds:g}", "path": file_path, "duration": float(seconds)})
+    return files
+
+def tiny_transformers_model(directory: str, seed: int = 0, decoder_layers: int = 1) -> str:
+    """構建並保存隨機初始化的微型 Whisper (transformers 格式)，返回模型目錄"""
+    if os.path.exists(os.path.join(directory, 'config.json')):
+        return directory
+
+    import torch
+    from transformers import (
+        GenerationConfig, WhisperConfig, WhisperFeatureExtractor,
+        WhisperForConditionalGeneration, WhisperTokenizer
+    )
+    from transformers.convert_slow_tokenizer import bytes_to_unicode
+
+    # 字節級詞表 + Whisper 特殊標記 + 1501 個時間戳標記
+    specials = [
+        '<|endoftext|>', '<|startoftranscript|>', '<|en|>', '<|zh|>', '<|yue|>',
+        '<|translate|>', '<|transcribe|>', '<|startoflm|>', '<|startofprev|>',
+        '<|nocaptions|>', '<|notimestamps|>',
+    ]
+    timestamps = [f"<|{i * 0.02:.2f}|>" for i in range(1501)]
+    vocab = {char: index for index, char in enumerate(bytes_to_unicode().values())}
+    for token in specials + timestamps:
+        vocab[token] = len(vocab)
+
+    os.makedirs(directory, exist_ok=True)
+    vocab_file = os.path.join(directory, 'vocab.json')
+    merges_file = os.path.join(directory, 'merges.txt')
+    with open(vocab_file, 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(merges_file, 'w', encoding='utf-8') as f:
+        f.write("#version: 0.2\n")
+
+    tokenizer = WhisperTokenizer(vocab_file, merges_file)
+    tokenizer.add_special_tokens({"additional_special_tokens": specials[1:]})
+    eos = vocab['<|endoftext|>']
+
+    config = WhisperConfig(
+        vocab_size=len(vocab), num_mel_bins=80, d_model=32,
+        encoder_layers=1, decoder_layers=decoder_layers, encoder_attention_heads=2, decoder_attention_heads=2,
+        encoder_ffn_dim=64, decoder_ffn_dim=64, max_source_positions=1500, max_target_positions=448,
+        decoder_start_token_id=vocab['<|startoftranscript|>'],
+        eos_token_id=eos, pad_token_id=eos, bos_token_id=eos,
+    )
+    torch.manual_seed(seed)
+    model = WhisperForConditionalGeneration(config).eval()
+    model.generation_config = GenerationConfig(
+        decoder_start_token_id=vocab['<|startoftranscript|>'], eos_token_id=eos, pad_token_id=eos,
+        no_timestamps_token_id=vocab['<|notimestamps|>'], max_initial_timestamp_index=50,
+        is_multilingual=True, max_length=TINY_MAX_LENGTH,
+        lang_to_id={token: vocab[token] for token in ('<|en|>', '<|zh|>', '<|yue|>')},
+        task_to_id={'transcribe': vocab['<|transcribe|>'], 'translate': vocab['<|translate|>']},
+        begin_suppress_tokens=[], suppress_tokens=[],
+    )
+
+    model.save_pretrained(directory)
+    tokenizer.save_pretrained(directory)
+    WhisperFeatureExtractor(feature_size=80).save_pretrained(directory)
+    logger.info(f"🧪 已構建隨機微型 Whisper: {directory}")
+    return directory
+
+def tiny_assistant_model(main_directory: str, directory: str, decoder_layers: int = 1) -> str:
+    """截取微型主模型的前幾層解碼器作為投機解碼的助手模型，詞表與主模型相同"""
+    if os.path.exists(os.path.join(directory, 'config.json')):
+        return directory
+
+    from transformers import WhisperForConditionalGeneration
+
+    main = WhisperForConditionalGeneration.from_pretrained(main_directory)
+    config = main.config
+    config.decoder_layers = decoder_layers
+    assistant = WhisperForConditionalGeneration(config).eval()
+    assistant.load_state_dict(main.state_dict(), strict=False)
+    assistant.generation_config = main.generation_config
+    assistant.save_pretrained(directory)
+    for name in os.listdir(main_directory):
+        if name not in ('config.json', 'generation_config.json') and not name.startswith('model'):
+            shutil.copy(os.path.join(main_directory, name), directory)
+    logger.info(f"🧪 已構建 {decoder_layers} 層解碼器的微型助手模型: {directory}")
+    return directory
+
+def tiny_openai_whisper_model(file_path: str, seed: int = 0) -> str:
+    """構建並保存隨機初始化的微型 openai-whisper 檢查點，返回文件路徑"""
+    if os.path.exists(file_path):
+        return file_path
+
+    import torch
+    from dataclasses import asdict
+    from whisper.model import ModelDimensions, Whisper
+
+    # 多語言詞表大小決定 whisper 使用的分詞器，必須保持 51865
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2, n_audio_layer=1,
+        n_vocab=51865, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=1,
+    )
+    torch.manual_seed(seed)
+    model = Whisper(dims)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    torch.save({"dims": asdict(dims), "model_state_dict": model.state_dict()}, file_path)
+    logger.info(f"🧪 已構建隨機微型 openai-whisper: {file_path}")
+    return file_path
+
+def missing_requirements(case: str) -> Optional[str]:
+    """返回路徑缺少的依賴，齊全時返回 None"""
+    modules = {
+        'server': ('torch', 'transformers'),
+        'robust': ('torch', 'transformers', 'soxr'),
+        'real': ('torch', 'whisper'),
+        'cli': ('torch', 'whisper'),
+    }[case]
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if case in ('real', 'cli') and shutil.which('ffmpeg') is None:
+        missing.append('ffmpeg')
+    if case == 'cli' and shutil.which('whisper') is None:
+        missing.append('whisper 命令行')
+    return ", ".join(missing) if missing else None
+
+def peak_rss_mb() -> Optional[float]:
+    """本進程與已結束子進程中的最大常駐內存 (MB)"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss 在 macOS 上以字節計，在 Linux 上以 KB 計
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def summarize(latencies: Sequence[float], duration: float) -> Dict[str, float]:
+    """延遲百分位與實時率 (處理耗時 / 音頻時長，越小越快)"""
+    values = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "runs": len(values),
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "rtf": float(values.mean() / duration),
+    }
+
+def _load_script(filename: str):
+    """按路徑導入倉庫根目錄下帶連字符的腳本"""
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace('-', '_'), ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _server_case(spec: Dict[str, Any]) -> Tuple[Callable[[str], Dict[str, Any]], Callable[[], None]]:
+    """在本進程內啟動 whisper-server.py，經 HTTP 提交 file_path 請求"""
+    from http.server import ThreadingHTTPServer
+
+    os.environ['WHISPER_MODEL'] = spec['model']
+    server = _load_script('whisper-server.py')
+    registry = server.ModelRegistry()
+    registry.preload()
+    inference = server.InferenceQueue()
+    inference.start()
+    batchers = server.SchedulerPool(registry)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), server.WhisperHandler)
+    httpd.daemon_threads = True
+    httpd.registry = registry
+    httpd.inference = inference
+    httpd.batchers = batchers
+    httpd.cache = None
+    httpd.metrics = None
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/transcribe"
+
+    def transcribe(file_path: str) -> Dict[str, Any]:
+        request = urllib.request.Request(
+            url, data=json.dumps({"file_path": file_path}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    return transcribe, httpd.shutdown
+
+def _robust_case(spec: Dict[str, Any]):
+    """whisper-robust.py 的分塊流式加載 + 逐窗口 transformers 管道"""
+    from whispermind import get_transcriber
+
+    robust = _load_script('whisper-robust.py')
+    transcriber = get_transcriber('transformers', model=spec['model'])
+    transcriber.warmup()
+    return (lambda file_path: robust.transcribe_audio(file_path, transcriber)), None
+
+def _real_case(spec: Dict[str, Any]):
+    """whisper-real.py 的進程內 openai-whisper 路徑，由 whisper 庫調用 ffmpeg 解碼"""
+    from whispermind import get_transcriber
+
+    real = _load_script('whisper-real.py')
+    transcriber = get_transcriber('openai-whisper', model=spec['whisper_model'], vad=False)
+    transcriber.load()
+    return (lambda file_path: real.transcribe_cached(file_path, transcriber)), None
+
+def _cli_case(spec: Dict[str, Any]):
+    """whisper 命令行路徑，每次轉錄都啟動新進程並重新加載模型"""
+    from whispermind import get_transcriber
+
+    transcriber = get_transcriber('openai-whisper', model=spec['whisper_model'], use_cli=True, vad=False)
+    return transcriber.transcribe_file, None
+
+def _precision_case(spec: Dict[str, Any]):
+    """指定精度的 transformers 轉錄器，int8 首次運行時構建並緩存量化模型"""
+    from whispermind import get_transcriber
+
+    transcriber = get_transcriber('transformers', model=spec['model'], precision=spec['precision'])
+    transcriber.warmup()
+    return transcriber.transcribe_file, None
+
+def _speculative_case(spec: Dict[str, Any]):
+    """貪婪解碼的 transformers 轉錄器，指定 assistant 時使用投機解碼"""
+    from whispermind import get_transcriber
+
+    transcriber = get_transcriber('transformers', model=spec['model'], assistant_model=spec.get('assistant'),
+                                  num_beams=1)
+    transcriber.warmup()
+    return transcriber.transcribe_file, None
+
+CASE_RUNNERS = {
+    'server': _server_case,
+    'robust': _robust_case,
+    'real': _real_case,
+    'cli': _cli_case,
+    'precision': _precision_case,
+    'speculative': _speculative_case,
+}
+
+def run_case(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """在當前進程中測量一個路徑，由 run_suite 在子進程中調用"""
+    os.environ['WHISPER_CACHE'] = '0'  # 測量推理本身，不命中結果緩存
+
+    started = time.perf_counter()
+    transcribe, close = CASE_RUNNERS[spec['case']](spec)
+    load_seconds = time.perf_counter() - started
+
+    timer = StageTimer()
+    add_observer(timer)
+    files = spec['files']
+
+    # 預熱一次，不計入統計
+    transcribe(files[0]['path'])
+
+    durations = {}
+    for item in files:
+        timer.reset()
+        latencies = []
+        errors = []
+        text = None
+        duration = item.get('duration')
+        for _ in range(spec['repeats']):
+            began = time.perf_counter()
+            result = transcribe(item['path'])
+            latencies.append(time.perf_counter() - began)
+            if result.get('success'):
+                text = result.get('text', '')
+                duration = duration or result.get('duration')
+            else:
+                errors.append(result.get('error', 'unknown'))
+
+        stats = summarize(latencies, duration or 1.0)
+        stats["stages"] = {
+            name: value["seconds"] / spec['repeats'] for name, value in sorted(timer.snapshot().items())
+        }
+        if spec.get('keep_text'):
+            stats["text"] = text
+        if errors:
+            stats["failures"] = len(errors)
+            stats["error"] = str(errors[0])[:500]
+        durations[item['key']] = stats
+
+    if close:
+        close()
+    result = {
+        "load_seconds": load_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "durations": durations,
+    }
+    speculative = getattr(getattr(transcribe, '__self__', None), 'speculative', None)
+    if speculative is not None:
+        result["speculative"] = speculative.stats.snapshot()
+    return result
+
+def _host_info() -> Dict[str, Any]:
+    info = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+    for package in ('torch', 'transformers', 'openai-whisper', 'soxr'):
+        try:
+            info[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return info
+
+def run_suite(cases: Sequence[str] = CASES, durations: Sequence[float] = DEFAULT_DURATIONS,
+              repeats: int = DEFAULT_REPEATS, model: str = RANDOM_MODEL,
+              whisper_model: str = RANDOM_MODEL, directory: str = BENCH_DIR) -> Dict[str, Any]:
+    """依次在獨立子進程中測量各路徑，返回可寫入基線文件的結果"""
+    files = prepare_audio(durations, os.path.join(directory, 'audio'))
+    results: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "host": _host_info(),
+        "config": {"durations": list(durations), "repeats": repeats,
+                   "model": model, "whisper_model": whisper_model},
+        "cases": {},
+    }
+
+    for case in cases:
+        missing = missing_requirements(case)
+        if missing:
+            logger.warning(f"⚠️ 跳過 {case}: 缺少 {missing}")
+            results["cases"][case] = {"skipped": f"缺少 {missing}"}
+            continue
+
+        spec = {"case": case, "files": files, "repeats": repeats, "model": model, "whisper_model": whisper_model}
+        if case in ('server', 'robust') and model == RANDOM_MODEL:
+            spec["model"] = tiny_transformers_model(os.path.join(directory, 'tiny-transformers'))
+        if case in ('real', 'cli') and whisper_model == RANDOM_MODEL:
+            spec["whisper_model"] = tiny_openai_whisper_model(os.path.join(directory, 'tiny-openai-whisper.pt'))
+
+        logger.info(f"⏱️ 測量 {case} ({len(files)} 個時長 × {repeats} 次)")
+        results["cases"][case] = _run_isolated(spec, directory)
+    return results
+
+def _run_isolated(spec: Dict[str, Any], directory: str) -> Dict[str, Any]:
+    """在新的 Python 進程中運行 run_case，使各路徑的峰值內存互不影響"""
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        spec_path = os.path.join(workdir, 'spec.json')
+        output_path = os.path.join(workdir, 'result.json')
+        with open(spec_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(spec, output=output_path), f)
+
+        proc = subprocess.run(
+            [sys.executable, '-m', 'whispermind.bench', spec_path],
+            cwd=str(ROOT), capture_output=True, text=True
+        )
+        if proc.returncode != 0 or not os.path.exists(output_path):
+            tail = proc.stderr.strip().splitlines()[-5:]
+            logger.error(f"❌ {spec['case']} 失敗: {' | '.join(tail)}")
+            return {"error": "\n".join(tail) or f"退出碼 {proc.returncode}"}
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """逐項比較兩次結果，變慢或內存增長超過閾值的標記為回歸"""
+    rows = []
+
+    def add(case: str, duration: Optional[str], metric: str, before, after):
+        if before is None or after is None:
+            return
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            "case": case, "duration": duration, "metric": metric,
+            "baseline": before, "current": after, "change": change,
+            "regression": change > threshold and after - before > NOISE_FLOOR[metric],
+        })
+
+    for case, base in baseline.get("cases", {}).items():
+        cur = current.get("cases", {}).get(case, {})
+        for duration, base_stats in base.get("durations", {}).items():
+            cur_stats = cur.get("durations", {}).get(duration)
+            if cur_stats is None:
+                continue
+            for metric in LATENCY_METRICS:
+                add(case, duration, metric, base_stats.get(metric), cur_stats.get(metric))
+        add(case, None, 'peak_rss_mb', base.get('peak_rss_mb'), cur.get('peak_rss_mb'))
+    return rows
+
+def format_report(results: Dict[str, Any]) -> str:
+    """把結果格式化為表格文本"""
+    lines = [f"{'路徑':<8} {'時長':>6} {'RTF':>7} {'p50':>8} {'p95':>8} {'p99':>8}  階段耗時 (每次)"]
+    for case, data in results["cases"].items():
+        if "durations" not in data:
+            lines.append(f"{case:<8} {data.get('skipped') or data.get('error')}")
+            continue
+        for duration, stats in data["durations"].items():
+            stages = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in stats["stages"].items())
+            failed = f"  ❌ 失敗 {stats['failures']} 次" if stats.get("failures") else ""
+            lines.append(
+                f"{case:<8} {duration + 's':>6} {stats['rtf']:>7.3f} {stats['p50']:>7.3f}s "
+                f"{stats['p95']:>7.3f}s {stats['p99']:>7.3f}s  {stages}{failed}"
+            )
+        rss = data.get("peak_rss_mb")
+        lines.append(f"{case:<8} 加載 {data['load_seconds']:.1f}s"
+                     + (f"，峰值內存 {rss:.0f}MB" if rss is not None else ""))
+    return "\n".join(lines)
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = []
+    for row in rows:
+        mark = "🔺 回歸" if row["regression"] else "  "
+        where = f"{row['case']} {row['duration']}s" if row["duration"] else row["case"]
+        lines.append(f"{mark} {where:<16} {row['metric']:<12} {row['baseline']:>10.3f} -> "
+                     f"{row['current']:>10.3f} ({row['change']:+.1%})")
+    return "\n".join(lines)
+
+def _tokens(text: str) -> List[str]:
+    """詞錯誤率的計算單位: 中日韓文字逐字計，其他文字按空白分詞，忽略標點與大小寫"""
+    tokens = []
+    for word in re.findall(r'\w+', (text or '').lower()):
+        tokens.extend(re.findall(r'[\u3400-\u9fff\uf900-\ufaff]|[^\u3400-\u9fff\uf900-\ufaff]+', word))
+    return tokens
+
+def error_rate(reference: str, hypothesis: str) -> float:
+    """編輯距離 / 參考長度"""
+    ref, hyp = _tokens(reference), _tokens(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, token in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, other in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (token != other))
+        previous = current
+    return previous[-1] / len(ref)
+
+def load_manifest(file_path: str) -> List[Dict[str, Any]]:
+    """讀取參考集: 每行 {"audio": 路徑, "text": 參考文本}，相對路徑以清單所在目錄為準"""
+    base = os.path.dirname(os.path.abspath(file_path))
+    files = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = os.path.join(base, entry['audio'])
+            files.append({"key": os.path.basename(path), "path": path,
+                          "duration": entry.get('duration'), "reference": entry.get('text')})
+    return files
+
+def compare_precisions(files: List[Dict[str, Any]], model: str = RANDOM_MODEL,
+                       precisions: Sequence[str] = ('fp32', 'bf16', 'int8'),
+                       repeats: int = DEFAULT_REPEATS, directory: str = BENCH_DIR) -> Dict[str, Any]:
+    """在獨立子進程中依次測量各精度，報告相對 fp32 的加速比、內存節省與詞錯誤率漂移"""
+    resolved = tiny_transformers_model(os.path.join(directory, 'tiny-transformers')) if model == RANDOM_MODEL else model
+    results: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "host": _host_info(),
+        "config": {"model": model, "precisions": list(precisions), "repeats": repeats},
+        "precisions": {},
+        "summary": {},
+    }
+    for precision in precisions:
+        logger.info(f"⏱️ 測量精度 {precision} ({len(files)} 個文件 × {repeats} 次)")
+        spec = {"case": "precision", "files": files, "repeats": repeats, "model": resolved,
+                "precision": precision, "keep_text": True}
+        results["precisions"][precision] = _run_isolated(spec, directory)
+
+    base = results["precisions"].get('fp32', {})
+    for precision, data in results["precisions"].items():
+        stats = data.get("durations")
+        if not stats:
+            continue
+        latency = sum(item["mean"] for item in stats.values())
+        summary = {
+            "rtf": float(np.mean([item["rtf"] for item in stats.values()])),
+            "load_seconds": data["load_seconds"],
+            "peak_rss_mb": data["peak_rss_mb"],
+        }
+        if base.get("durations"):
+            base_latency = sum(item["mean"] for item in base["durations"].values())
+            summary["speedup"] = base_latency / latency if latency else None
+            if base.get("peak_rss_mb") is not None and data["peak_rss_mb"] is not None:
+                summary["memory_saved_mb"] = base["peak_rss_mb"] - data["peak_rss_mb"]
+            # 以 fp32 的轉錄為參照的詞錯誤率，衡量精度降低引起的漂移
+            summary["wer_drift"] = float(np.mean([
+                error_rate(base["durations"][key].get("text") or '', item.get("text") or '')
+                for key, item in stats.items() if key in base["durations"]
+            ]))
+        references = {item["key"]: item.get("reference") for item in files}
+        if all(references.values()):
+            summary["wer"] = float(np.mean([
+                error_rate(references[key], item.get("text") or '') for key, item in stats.items()
+            ]))
+        results["summary"][precision] = summary
+    return results
+
+def format_precision_report(results: Dict[str, Any]) -> str:
+    lines = [f"{'精度':<6} {'RTF':>7} {'加速比':>7} {'峰值內存':>9} {'節省內存':>9} {'WER漂移':>8} {'WER':>7}"]
+    for precision, data in results["precisions"].items():
+        summary = results["summary"].get(precision)
+        if summary is None:
+            lines.append(f"{precision:<6} {data.get('error', '無結果')}")
+            continue
+
+        def show(key: str, pattern: str) -> str:
+            value = summary.get(key)
+            return pattern.format(value) if value is not None else "-"
+
+        lines.append(
+            f"{precision:<6} {show('rtf', '{:.3f}'):>7} {show('speedup', '{:.2f}x'):>7} "
+            f"{show('peak_rss_mb', '{:.0f}MB'):>9} {show('memory_saved_mb', '{:+.0f}MB'):>9} "
+            f"{show('wer_drift', '{:.1%}'):>8} {show('wer', '{:.1%}'):>7}"
+        )
+    return "\n".join(lines)
+
+def compare_speculative(files: List[Dict[str, Any]], model: str = RANDOM_MODEL,
+                        assistant: str = RANDOM_MODEL, repeats: int = DEFAULT_REPEATS,
+                        directory: str = BENCH_DIR) -> Dict[str, Any]:
+    """分別以貪婪解碼與投機解碼轉錄，報告加速比、草稿接受率，並檢查兩者輸出是否一致
+
+    隨機模型時主模型為 4 層解碼器，助手模型截取其第一層。
+    """
+    if model == RANDOM_MODEL:
+        model = tiny_transformers_model(os.path.join(directory, 'tiny-transformers-4l'), decoder_layers=4)
+    if assistant == RANDOM_MODEL:
+        assistant = tiny_assistant_model(model, os.path.join(directory, 'tiny-assistant'))
+    results: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "host": _host_info(),
+        "config": {"model": model, "assistant": assistant, "repeats": repeats},
+        "modes": {},
+        "summary": {},
+    }
+    for mode, assistant_model in (('greedy', None), ('speculative', assistant)):
+        logger.info(f"⏱️ 測量 {mode} ({len(files)} 個文件 × {repeats} 次)")
+        spec = {"case": "speculative", "files": files, "repeats": repeats, "model": model,
+                "assistant": assistant_model, "keep_text": True}
+        results["modes"][mode] = _run_isolated(spec, directory)
+
+    greedy, speculative = results["modes"]["greedy"], results["modes"]["speculative"]
+    if greedy.get("durations") and speculative.get("durations"):
+        base = sum(item["mean"] for item in greedy["durations"].values())
+        latency = sum(item["mean"] for item in speculative["durations"].values())
+        mismatched = [key for key, item in speculative["durations"].items()
+                      if item.get("text") != greedy["durations"].get(key, {}).get("text")]
+        results["summary"] = dict(
+            speculative.get("speculative") or {},
+            speedup=base / latency if latency else None,
+            identical=not mismatched,
+            mismatched=mismatched,
+        )
+    return results
+
+def format_speculative_report(results: Dict[str, Any]) -> str:
+    lines = [f"{'模式':<12} {'RTF':>7} {'平均延遲':>9}"]
+    for mode, data in results["modes"].items():
+        stats = data.get("durations")
+        if not stats:
+            lines.append(f"{mode:<12} {data.get('error', '無結果')}")
+            continue
+        rtf = float(np.mean([item["rtf"] for item in stats.values()]))
+        latency = float(np.mean([item["mean"] for item in stats.values()]))
+        lines.append(f"{mode:<12} {rtf:>7.3f} {latency:>8.3f}s")
+
+    summary = results.get("summary")
+    if summary:
+        def show(key: str, pattern: str) -> str:
+            value = summary.get(key)
+            return pattern.format(value) if value is not None else "-"
+
+        lines.append(f"加速比 {show('speedup', '{:.2f}x')}，草稿接受率 {show('acceptance_rate', '{:.1%}')}，"
+                     f"每次驗證產出 {show('tokens_per_pass', '{:.2f}')} 個標記")
+        lines.append("✅ 輸出與貪婪解碼一致" if summary["identical"]
+                     else f"❌ 輸出與貪婪解碼不一致: {', '.join(summary['mismatched'])}")
+    return "\n".join(lines)
+
+def main(spec_path: str):
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    result = run_case(spec)
+    with open(spec['output'], 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main(sys.argv[1])
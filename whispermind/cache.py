@@ -0,0 +1,310 @@
+"""
+內容尋址的轉錄結果緩存
+以音頻內容哈希 + 模型名 + 解碼參數為鍵，內存 LRU 在前，磁盤 LRU 在後，
+同一鍵的並發請求只執行一次推理，其餘等待同一結果；
+只有所有等待方都離開後才取消這次推理，被取消的推理不作為共享結果，仍在等待的調用方重新計算
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from whispermind.deadline import Cancelled, CancelToken
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台只做進程內去重
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    'WHISPER_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'results')
+)
+CACHE_MAX_BYTES = int(float(os.environ.get('WHISPER_CACHE_MAX_MB', 512)) * 1024 * 1024)
+MEMORY_ENTRIES = int(os.environ.get('WHISPER_CACHE_MEMORY_ENTRIES', 64))
+HASH_BLOCK_SIZE = 1024 * 1024
+# 等待其他調用方的計算時檢查自身取消令牌的間隔
+POLL_SECONDS = 0.5
+
+def cache_enabled() -> bool:
+    """WHISPER_CACHE=0 時關閉緩存"""
+    return os.environ.get('WHISPER_CACHE', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def hash_file(file_path: str) -> str:
+    """計算文件內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hashing_blocks(blocks: Iterable[bytes], digest) -> Iterator[bytes]:
+    """轉發字節塊的同時更新哈希，用於流式上傳"""
+    for block in blocks:
+        digest.update(block)
+        yield block
+
+def cache_key(content_hash: str, model: str, **params: Any) -> str:
+    """由內容哈希、模型名和解碼參數生成緩存鍵"""
+    material = json.dumps({"content": content_hash, "model": model, "params": params}, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class Flight:
+    """一次進行中的計算: 結果 Future、計算方的取消令牌、等待方與已推送的分段
+
+    waiters 為仍在等待的 (取消令牌, 分段回調)，包括計算方自己；令牌為 None 的等待方不會離開。
+    """
+
+    def __init__(self, token: Optional[CancelToken] = None, on_segment: Optional[Callable] = None):
+        self.future: Future = Future()
+        self.token = token
+        self.waiters: List[Tuple[Optional[CancelToken], Optional[Callable]]] = [(token, on_segment)]
+        self.segments: List[Dict[str, Any]] = []
+
+class TranscriptionCache:
+    """兩級 LRU 緩存，帶單飛 (single-flight) 去重"""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 memory_entries: int = MEMORY_ENTRIES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找緩存，磁盤命中會提升到內存並刷新 LRU 時間"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """寫入緩存，只保存成功的結果"""
+        if not result.get('success'):
+            return
+        self._remember(key, result)
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def put_stream(self, key: str, write: Callable[[IO[str]], None]) -> Path:
+        """由 write 把結果 JSON 流式寫入磁盤緩存，不經過內存層，返回緩存文件路徑"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            raise
+        self._evict()
+        return path
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        """磁盤佔用超出預算時按最近使用時間淘汰"""
+        entries = []
+        total = 0
+        for path in self.directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                path.unlink()
+                total -= size
+                logger.info(f"🧹 淘汰緩存: {path.name}")
+
+    @contextlib.contextmanager
+    def _file_lock(self, key: str):
+        """跨進程鎖，讓並發的命令行腳本等待同一次推理"""
+        if fcntl is None:
+            yield
+            return
+        lock_path = self._path(key).with_suffix('.lock')
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def join(self, key: str, token: Optional[CancelToken] = None,
+             on_segment: Optional[Callable] = None) -> Optional[Future]:
+        """已有結果或正在計算時返回對應 Future，否則返回 None
+
+        加入進行中的計算時登記為等待方: 已推送的分段立即重放給 on_segment，之後的分段隨計算推送；
+        不再等待時調用 leave()。
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self._attach(flight, token, on_segment)
+                return flight.future
+        result = self.get(key)
+        if result is None:
+            return None
+        if on_segment:
+            for segment in result.get('segments', []):
+                on_segment(segment)
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def _attach(self, flight: Flight, token: Optional[CancelToken], on_segment: Optional[Callable]):
+        flight.waiters.append((token, on_segment))
+        if on_segment:
+            for segment in flight.segments:
+                on_segment(segment)
+
+    def leave(self, key: Optional[str], token: CancelToken, reason: str = "已取消"):
+        """調用方不再等待 (如客戶端已斷開) 並取消其令牌
+
+        計算方的令牌同時驅動共享的計算，還有其他等待方時不取消，計算繼續為他們進行；
+        最後一個等待方離開時才取消計算。
+        """
+        with self._lock:
+            flight = self._inflight.get(key) if key else None
+            if flight is None:
+                token.cancel(reason)
+                return
+            flight.waiters = [waiter for waiter in flight.waiters if waiter[0] is not token]
+            if token is not flight.token:
+                token.cancel(reason)
+            if not flight.waiters:
+                # 之後相同鍵的請求開始新的計算，不再加入這次即將停止的計算
+                del self._inflight[key]
+                if flight.token is not None:
+                    flight.token.cancel(reason)
+
+    def publish(self, key: str, segment: Dict[str, Any]):
+        """計算方每解碼出一個分段調用，推送給所有等待方"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is None:
+                return
+            flight.segments.append(segment)
+            for _, on_segment in flight.waiters:
+                if on_segment:
+                    on_segment(segment)
+
+    def _wait(self, key: str, flight: Flight, token: Optional[CancelToken]) -> Dict[str, Any]:
+        """等待其他調用方的計算，期間檢查自身令牌；自身被取消或超過期限時離開並拋出"""
+        while True:
+            try:
+                if token is not None:
+                    token.check()
+                return flight.future.result(timeout=POLL_SECONDS if token is not None else None)
+            except FutureTimeout:
+                continue
+            except Cancelled:
+                if token is not None and token.cancelled:
+                    self.leave(key, token)
+                raise
+
+    def single_flight(self, key: str, compute: Callable[[], Dict[str, Any]],
+                      token: Optional[CancelToken] = None, on_segment: Optional[Callable] = None) -> Dict[str, Any]:
+        """命中則直接返回；同一鍵已在計算時等待其結果；否則計算並寫入緩存
+
+        token 為調用方的取消令牌，作為計算方時 compute 應使用同一令牌；等待方的令牌被取消時只離開。
+        on_segment 接收計算推送 (見 publish) 或命中時重放的分段。
+        compute 拋出 Cancelled 時不作為共享結果: 異常傳給計算方，仍在等待的調用方重新計算。
+        """
+        while True:
+            result = self.get(key)
+            if result is not None:
+                logger.info("⚡ 轉錄緩存命中")
+                if on_segment:
+                    for segment in result.get('segments', []):
+                        on_segment(segment)
+                return result
+
+            with self._lock:
+                if token is not None:
+                    token.check()  # 在登記前已被取消，不開始計算
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = Flight(token, on_segment)
+                else:
+                    self._attach(flight, token, on_segment)
+
+            if leader:
+                return self._lead(key, flight, compute)
+
+            logger.info("⏳ 相同音頻正在轉錄，等待結果")
+            try:
+                return self._wait(key, flight, token)
+            except Cancelled:
+                if token is not None and token.cancelled:
+                    raise
+                logger.info("♻️ 共享的轉錄已被取消，重新計算")
+
+    def _lead(self, key: str, flight: Flight, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            with self._file_lock(key):
+                # 其他進程可能在等鎖期間完成了計算
+                result = self.get(key)
+                if result is None:
+                    result = compute()
+                    self.put(key, result)
+                else:
+                    for segment in result.get('segments', []):
+                        self.publish(key, segment)
+            flight.future.set_result(result)
+            return result
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
@@ -0,0 +1,150 @@
+"""
+按音頻時長計算的期限與協作式取消
+期限 = 固定開銷 + 音頻時長 × 本機實測實時率 × 安全倍數，長文件不再被固定超時誤殺，短文件卡住時也不會空耗數十秒；
+轉錄在塊之間與解碼步之間檢查取消令牌，超過期限或請求方已斷開時停止並釋放工作線程
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RTF_PATH = os.environ.get(
+    'WHISPER_RTF_FILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'rtf.json')
+)
+# 期限的固定部分: 模型加載、預熱與音頻解碼
+DEADLINE_BASE_SECONDS = float(os.environ.get('WHISPER_DEADLINE_BASE', 30))
+# 實測實時率的安全倍數，吸收負載波動與批處理排隊
+DEADLINE_FACTOR = float(os.environ.get('WHISPER_DEADLINE_FACTOR', 3))
+# 尚未測量時假定的實時率 (CPU 上的保守估計)
+DEFAULT_RTF = float(os.environ.get('WHISPER_DEFAULT_RTF', 1.0))
+# 實時率的指數滑動平均係數
+RTF_SMOOTHING = 0.3
+# 短於此時長的運行不更新實時率，固定開銷會使其偏高
+MIN_MEASURE_SECONDS = 5.0
+# 無法探測時長時按 128kbps 從文件大小估算
+FALLBACK_BYTES_PER_SECOND = 16000
+
+class Cancelled(Exception):
+    """轉錄被請求方取消 (如客戶端已斷開)"""
+
+class DeadlineExceeded(Cancelled):
+    """轉錄超過按音頻時長計算的期限"""
+
+class CancelToken:
+    """協作式取消令牌
+
+    請求方調用 cancel()，或期限到達後，轉錄在下一個塊或解碼步調用 check() 時停止。
+    期限可以在知道音頻時長後再用 start_deadline() 設置。
+    parent 為外層令牌 (如整個流式連接)，外層取消或過期時本令牌同樣視為取消。
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional['CancelToken'] = None):
+        self._event = threading.Event()
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.expires_at: Optional[float] = None
+        if seconds is not None:
+            self.start_deadline(seconds)
+
+    def start_deadline(self, seconds: float):
+        """從現在起 seconds 秒後過期"""
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @property
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        """已取消或已過期；解碼步中每步調用，只做一次時鐘讀取"""
+        return self._event.is_set() or self.expired or (self.parent is not None and self.parent.cancelled)
+
+    def cancel(self, reason: str = "已取消"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def check(self):
+        """已取消時拋出 Cancelled，已過期時拋出 DeadlineExceeded"""
+        if self.parent is not None:
+            self.parent.check()
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+        if self.expired:
+            raise DeadlineExceeded(f"轉錄超過期限 ({self.seconds:.0f}s)")
+
+def rtf_key(transcriber, *extra: Any) -> str:
+    """實時率按後端、模型與影響速度的參數 (精度、命令行模式等) 分別記錄"""
+    return ":".join(str(part) for part in (transcriber.name, transcriber.model) + extra)
+
+class RealTimeFactors:
+    """本機實測的實時率 (轉錄耗時 / 音頻時長)，每次成功轉錄後以指數滑動平均更新"""
+
+    def __init__(self, path: str = RTF_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[float]:
+        entry = self._load().get(key)
+        return entry.get("rtf") if isinstance(entry, dict) else None
+
+    def record(self, key: str, elapsed: float, duration: Optional[float]) -> Optional[float]:
+        """記錄一次轉錄的耗時，返回更新後的實時率；音頻過短時不更新"""
+        if not duration or duration < MIN_MEASURE_SECONDS:
+            return None
+        measured = elapsed / duration
+        with self._lock:
+            data = self._load()
+            entry = data.get(key) if isinstance(data.get(key), dict) else {}
+            previous = entry.get("rtf")
+            rtf = measured if previous is None else previous + RTF_SMOOTHING * (measured - previous)
+            data[key] = {"rtf": rtf, "samples": entry.get("samples", 0) + 1, "updated_at": time.time()}
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"⚠️ 無法保存實時率: {e}")
+        return rtf
+
+    def expected_seconds(self, duration: float, key: str) -> float:
+        """按實測實時率與安全倍數估算轉錄 duration 秒音頻的最長耗時 (不含固定開銷)"""
+        rtf = self.get(key)
+        return duration * (DEFAULT_RTF if rtf is None else rtf) * DEADLINE_FACTOR
+
+    def deadline(self, duration: float, key: str) -> float:
+        """轉錄 duration 秒音頻的期限 (秒)"""
+        return DEADLINE_BASE_SECONDS + self.expected_seconds(duration, key)
+
+def file_duration(file_path: str) -> float:
+    """音頻文件時長，無法探測時按文件大小估算"""
+    from whispermind.audio import probe_duration
+
+    duration = probe_duration(file_path)
+    if duration is None:
+        duration = os.path.getsize(file_path) / FALLBACK_BYTES_PER_SECOND
+    return duration
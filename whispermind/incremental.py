@@ -0,0 +1,160 @@
+"""
+增量轉錄
+錄音在會議進行中被分多次上傳 (每次都是到目前為止的完整文件)，按錄音 ID 記住上一輪已確認的位置
+與解碼上下文 (已確認文本的末尾，作為下一輪的提示詞)，每次只解碼新增的音頻加一小段重疊，
+新分段拼接到已保存的轉錄稿上，耗時隨新增音頻而不是總時長增長
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.longform import iter_merged
+from whispermind.transcriber import Segment, transcription_result
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = os.environ.get(
+    'WHISPER_RECORDINGS_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'recordings')
+)
+# 每輪從已確認位置往前重新解碼的秒數，讓邊界上的詞有完整的上下文
+OVERLAP_SECONDS = float(os.environ.get('WHISPER_INCREMENTAL_OVERLAP', 3.0))
+# 結束於音頻末尾這段時間內的分段可能被截斷，暫不確認，下一輪重新解碼
+TAIL_GUARD_SECONDS = float(os.environ.get('WHISPER_INCREMENTAL_GUARD', 2.0))
+# 作為解碼提示詞的已確認文本長度 (字符)，Whisper 提示詞上限約 224 個標記
+CONTEXT_CHARS = 200
+
+_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+# (音頻, 提示詞, 語言) -> 相對於傳入音頻的分段
+DecodeFn = Callable[[Any, str, Optional[str]], List[Segment]]
+# 錄音到目前為止的音頻 -> (語言代碼, 識別概率)
+IdentifyFn = Callable[[Any], Tuple[Optional[str], Optional[float]]]
+
+def stitch(committed: List[Segment], offset: float, segments: List[Segment]) -> List[Segment]:
+    """把從 offset 開始解碼出的分段接到已確認分段之後，去掉重疊區內的重複"""
+    anchor = committed[-1:]
+    merged = list(iter_merged([(0.0, anchor), (offset, segments)]))
+    return merged[len(anchor):]
+
+class RecordingStore:
+    """每個錄音一個 JSON 狀態文件，同一錄音的上傳依次處理"""
+
+    def __init__(self, directory: str = RECORDINGS_DIR, overlap: float = OVERLAP_SECONDS,
+                 guard: float = TAIL_GUARD_SECONDS):
+        self.directory = directory
+        self.overlap = overlap
+        self.guard = guard
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def check_id(recording_id: str) -> str:
+        """錄音 ID 用作文件名，只允許字母、數字與 ._-"""
+        if not _ID_PATTERN.match(recording_id):
+            raise ValueError(f"無效的錄音 ID: {recording_id}")
+        return recording_id
+
+    def _path(self, recording_id: str) -> str:
+        return os.path.join(self.directory, f"{self.check_id(recording_id)}.json")
+
+    def _recording_lock(self, recording_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(recording_id, threading.Lock())
+
+    def get(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(recording_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, state: Dict[str, Any]):
+        path = self._path(state["id"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete(self, recording_id: str) -> bool:
+        with self._recording_lock(recording_id):
+            try:
+                os.remove(self._path(recording_id))
+                return True
+            except OSError:
+                return False
+
+    def update(self, recording_id: str, audio, decode: DecodeFn, final: bool = False,
+               identify: Optional[IdentifyFn] = None) -> Dict[str, Any]:
+        """轉錄一次上傳中上一輪之後的部分，返回完整轉錄稿 (含未確認的末尾分段)
+
+        final=True 表示錄音已結束，末尾分段也一併確認。
+        identify 在錄音尚未確定語言時於第一個含語音的窗口上識別語言，本輪以該語言解碼；
+        有分段被確認後語言保存在狀態中，之後每輪不再識別，新增音頻都強制以該語言解碼
+        (只有開頭靜音時不固定語言，避免靜音決定整段錄音的語言)。
+        """
+        with self._recording_lock(recording_id):
+            state = self.get(recording_id) or {
+                "id": recording_id, "committed": 0.0, "context": "", "segments": [],
+                "duration": 0.0, "passes": 0, "decoded_seconds": 0.0,
+            }
+            duration = len(audio) / SAMPLE_RATE
+            if duration + 0.05 < state["duration"]:
+                raise ValueError(f"上傳的錄音 ({duration:.1f}s) 比上次 ({state['duration']:.1f}s) 短")
+
+            language, probability = state.get("language"), state.get("language_probability")
+            if language is None and identify is not None and len(audio):
+                language, probability = identify(audio)
+
+            start = max(0.0, state["committed"] - self.overlap)
+            tail = audio[int(start * SAMPLE_RATE):]
+            logger.info(f"🧩 錄音 {recording_id}: 總長 {duration:.1f}s，只解碼 {start:.1f}s 之後的 "
+                        f"{len(tail) / SAMPLE_RATE:.1f}s")
+            started = time.perf_counter()
+            decoded = decode(tail, state["context"], language) if len(tail) else []
+            fresh = stitch(state["segments"], start, decoded)
+            elapsed = time.perf_counter() - started
+
+            # 結束在音頻末尾保護區內的分段可能被截斷，留到下一輪
+            horizon = duration if final else duration - self.guard
+            split = 0
+            while split < len(fresh) and fresh[split]["end"] <= horizon:
+                split += 1
+            stable, pending = fresh[:split], fresh[split:]
+
+            # 已確認位置推進到第一個未確認分段的開頭；沒有分段的靜音區同樣無需重新解碼
+            committed = max(state["committed"], stable[-1]["end"] if stable else 0.0,
+                            min(pending[0]["start"] if pending else horizon, horizon))
+
+            if stable and state.get("language") is None:
+                state["language"], state["language_probability"] = language, probability
+            state["segments"].extend(stable)
+            state["committed"] = committed
+            state["context"] = (state["context"] + "".join(s["text"] for s in stable))[-CONTEXT_CHARS:]
+            state["duration"] = duration
+            state["passes"] += 1
+            state["decoded_seconds"] += len(tail) / SAMPLE_RATE
+            state["updated_at"] = time.time()
+            self._save(state)
+
+        for segment in pending:
+            segment["provisional"] = True
+        segments = state["segments"] + pending
+        result = transcription_result("".join(s["text"] for s in segments).strip(), segments, duration,
+                                      language=language, language_probability=probability)
+        result.update({
+            "recording_id": recording_id,
+            "committed_seconds": committed,
+            "new_segments": stable + pending,
+            "decoded_seconds": len(tail) / SAMPLE_RATE,
+            "elapsed": elapsed,
+            "passes": state["passes"],
+        })
+        return result
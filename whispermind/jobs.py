@@ -0,0 +1,272 @@
+"""
+異步轉錄任務
+任務保存在本地 SQLite 數據庫中，排隊與已完成的任務在服務器重啟後仍然存在；
+工作線程從數據庫領取任務，吞吐量不再受客戶端連接時長影響
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from whispermind.deadline import Cancelled
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.environ.get(
+    'WHISPER_JOBS_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'jobs')
+)
+JOB_WORKERS = int(os.environ.get('WHISPER_JOB_WORKERS', 2))
+# 沒有新任務通知時輪詢數據庫的間隔，可領取其他進程寫入的任務
+POLL_SECONDS = float(os.environ.get('WHISPER_JOBS_POLL_SECONDS', 2))
+# 已結束任務的保留時長，啟動時清理
+RETENTION_HOURS = float(os.environ.get('WHISPER_JOBS_RETENTION_HOURS', 168))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    upload INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    precision TEXT NOT NULL,
+    language TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+# 舊版任務庫缺少的列 -> 定義
+COLUMNS = {
+    'language': 'TEXT',
+}
+
+class JobCancelled(Cancelled):
+    """任務在轉錄途中被取消；共用同一次推理的其他調用方會重新計算"""
+
+class JobStore:
+    """SQLite 任務表，一個連接由鎖保護，跨進程的領取由 BEGIN IMMEDIATE 保證原子性"""
+
+    def __init__(self, directory: str = JOBS_DIR):
+        self.directory = directory
+        self.uploads = os.path.join(directory, 'uploads')
+        os.makedirs(self.uploads, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'jobs.sqlite3'),
+                                   isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        existing = {row['name'] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, definition in COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        # 有新任務時喚醒等待中的工作線程
+        self.submitted = threading.Condition()
+
+    def upload_path(self) -> str:
+        """為上傳的音頻分配存放路徑，任務結束後刪除"""
+        return os.path.join(self.uploads, f"{uuid.uuid4().hex}.npy")
+
+    def create(self, source: str, precision: str, content_hash: Optional[str] = None,
+               upload: bool = False, language: Optional[str] = None) -> Dict[str, Any]:
+        """新建排隊中的任務，language 為調用方指定的已知語言"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, source, upload, content_hash, precision, language, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, source, int(upload), content_hash, precision, language, time.time())
+            )
+        with self.submitted:
+            self.submitted.notify()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['upload'] = bool(job['upload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """領取最早排隊的任務並標記為運行中，沒有任務時返回 None"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row:
+                    self._db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                                     (RUNNING, time.time(), row['id']))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row['id']) if row else None
+
+    def set_progress(self, job_id: str, progress: float):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET progress = ? WHERE id = ? AND status = ?",
+                             (progress, job_id, RUNNING))
+
+    def status(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row['status'] if row else None
+
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        """保存轉錄結果；任務已被取消時丟棄"""
+        status = DONE if result.get('success') else FAILED
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, progress = MAX(progress, ?), result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status = ?",
+                (status, 1.0 if status == DONE else 0.0, json.dumps(result, ensure_ascii=False),
+                 result.get('error'), time.time(), job_id, RUNNING)
+            )
+        self._discard_upload(job_id)
+
+    def fail(self, job_id: str, error: str):
+        self.finish(job_id, {"success": False, "error": error})
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消排隊中或運行中的任務，返回取消後的任務；任務不存在時返回 None"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+            )
+        job = self.get(job_id)
+        if job and job['status'] == CANCELLED:
+            self._discard_upload(job_id)
+        return job
+
+    def _discard_upload(self, job_id: str):
+        job = self.get(job_id)
+        if job and job['upload'] and job['status'] in FINISHED:
+            try:
+                os.remove(job['source'])
+            except OSError:
+                pass
+
+    def requeue(self, job_id: str):
+        """把運行中的任務放回隊列"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE id = ? AND status = ?",
+                             (QUEUED, job_id, RUNNING))
+        with self.submitted:
+            self.submitted.notify()
+
+    def recover(self) -> int:
+        """把上次退出時仍在運行的任務放回隊列，返回數量"""
+        with self._lock:
+            cursor = self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                                      (QUEUED, RUNNING))
+        return cursor.rowcount
+
+    def prune(self, retention_hours: float = RETENTION_HOURS) -> int:
+        """刪除超過保留時長的已結束任務，返回數量"""
+        cutoff = time.time() - retention_hours * 3600
+        with self._lock:
+            cursor = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND finished_at < ?",
+                (*FINISHED, cutoff)
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """各狀態的任務數"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, *FINISHED)}
+        counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+class JobWorkers:
+    """從任務表領取任務的工作線程
+
+    run(job, on_progress) 執行轉錄並返回結果；on_progress(比例) 在每完成一塊後調用，
+    任務已被取消時拋出 JobCancelled 以便提前結束。
+    """
+
+    def __init__(self, store: JobStore, run: Callable[[Dict[str, Any], Callable[[float], None]], Dict[str, Any]],
+                 workers: int = JOB_WORKERS, poll_seconds: float = POLL_SECONDS):
+        self.store = store
+        self.run = run
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self._threads: List[threading.Thread] = []
+
+    def start(self, recover: bool = True):
+        """啟動工作線程；多個服務進程共用任務庫時只由監督進程在啟動前恢復中斷的任務 (recover=False)"""
+        if recover:
+            recovered = self.store.recover()
+            if recovered:
+                logger.info(f"♻️ {recovered} 個中斷的任務已重新排隊")
+        pruned = self.store.prune()
+        if pruned:
+            logger.info(f"🧹 已清理 {pruned} 個過期任務")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"🗂️ 異步任務工作線程: {self.workers}，任務庫: {self.store.directory}")
+
+    def _loop(self):
+        while True:
+            job = self.store.claim()
+            if job is None:
+                with self.store.submitted:
+                    self.store.submitted.wait(self.poll_seconds)
+                continue
+            self._execute(job)
+
+    def _execute(self, job: Dict[str, Any]):
+        job_id = job['id']
+
+        def on_progress(progress: float):
+            if self.store.status(job_id) == CANCELLED:
+                raise JobCancelled(job_id)
+            self.store.set_progress(job_id, progress)
+
+        logger.info(f"🗂️ 開始任務 {job_id}")
+        try:
+            result = self.run(job, on_progress)
+        except JobCancelled:
+            if self.store.status(job_id) == CANCELLED:
+                logger.info(f"🛑 任務 {job_id} 已取消")
+            else:
+                # 共用同一次推理 (相同音頻) 的另一個任務被取消，本任務重新排隊
+                logger.info(f"♻️ 任務 {job_id} 重新排隊")
+                self.store.requeue(job_id)
+            return
+        except Exception as e:
+            logger.error(f"❌ 任務 {job_id} 失敗: {e}")
+            self.store.fail(job_id, str(e))
+            return
+        self.store.finish(job_id, result)
+        logger.info(f"✅ 任務 {job_id} {'完成' if result.get('success') else '失敗'}")
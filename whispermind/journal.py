@@ -0,0 +1,254 @@
+"""
+塊級斷點日誌
+長音頻按塊轉錄，每塊完成後把結果追加到磁盤上的 JSONL 日誌並 fsync；
+崩潰或超時後重新運行會跳過已完成的塊，最終 JSON 從日誌逐段流式寫出，不在內存中拼裝分段列表
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import IO, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台不做跨進程互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.environ.get(
+    'WHISPER_JOURNAL_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'journals')
+)
+# 斷點粒度: 每塊的最大時長 (秒)，切點選在靜音處
+PIECE_SECONDS = float(os.environ.get('WHISPER_JOURNAL_PIECE_SECONDS', 30))
+JOURNAL_VERSION = 1
+
+def journal_path(key: str, directory: str = JOURNAL_DIR) -> str:
+    return os.path.join(directory, f"{key}.jsonl")
+
+def discard_journal(key: str, directory: str = JOURNAL_DIR):
+    """刪除日誌 (不存在時忽略)"""
+    try:
+        os.remove(journal_path(key, directory))
+    except OSError:
+        pass
+
+class ChunkJournal:
+    """一次轉錄的塊日誌
+
+    首行記錄切塊方式，之後每行一塊的結果。切塊方式與首行不符時 (音頻或參數已變) 日誌被重置；
+    崩潰時寫了一半的末行在重新打開時截掉。同一日誌被多個進程打開時後來者等待先來者關閉。
+    """
+
+    def __init__(self, path: str, layout: Dict[str, Any]):
+        self.path = path
+        self.layout = {"journal": JOURNAL_VERSION, **layout}
+        self._offsets: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._load()
+
+    def _load(self):
+        """讀取已完成塊的位置，截掉不完整的末行"""
+        self._file.seek(0)
+        header = None
+        position = valid_end = 0
+        for line in self._file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = record
+            elif 'index' in record:
+                self._offsets[record['index']] = position
+            position += len(line)
+            valid_end = position
+
+        if header != self.layout:
+            if header is not None:
+                logger.info(f"📒 日誌與當前音頻不符，重新開始: {self.path}")
+            self._offsets.clear()
+            valid_end = 0
+        self._file.truncate(valid_end)
+        self._file.seek(valid_end)
+        if valid_end == 0:
+            self._write(self.layout)
+        elif self._offsets:
+            logger.info(f"📒 從日誌恢復 {len(self._offsets)} 個已完成的塊: {self.path}")
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        position = self._file.seek(0, os.SEEK_END)
+        self._file.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return position
+
+    def finished(self) -> Set[int]:
+        with self._lock:
+            return set(self._offsets)
+
+    def append(self, index: int, record: Dict[str, Any]):
+        """追加一塊的結果，返回前已落盤"""
+        with self._lock:
+            self._offsets[index] = self._write({"index": index, **record})
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """按塊序號逐條讀出記錄"""
+        with self._lock:
+            offsets = sorted(self._offsets.items())
+        with open(self.path, 'rb') as f:
+            for _, offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()  # 同時釋放文件鎖
+
+    def remove(self):
+        """轉錄完成後刪除日誌"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class ResumableTranscription:
+    """以塊日誌為斷點的轉錄
+
+    run() 轉錄尚未完成的塊，中途失敗時已完成的塊保留在日誌中，下次以相同 key 運行時從斷點繼續；
+    write() 從日誌流式寫出與 transcription_result 相同結構的 JSON。
+    語言只識別一次 (或使用 language 指定的語言)，所有塊強制使用該語言，恢復時沿用日誌中的語言。
+    """
+
+    def __init__(self, transcriber, audio, key: str, directory: str = JOURNAL_DIR,
+                 piece_seconds: float = PIECE_SECONDS, language: Optional[str] = None):
+        from whispermind.audio import SAMPLE_RATE
+        from whispermind.longform import split_at_silence
+
+        self.transcriber = transcriber
+        self.duration = len(audio) / SAMPLE_RATE
+        self.speech, self.source = transcriber.prepare(audio)
+        self.pieces: List[Tuple[int, int]] = split_at_silence(self.source, piece_seconds=piece_seconds)
+        self.requested_language = language
+        self.journal = ChunkJournal(journal_path(key, directory), {
+            "key": key,
+            "pieces": [list(piece) for piece in self.pieces],
+            "language": language,
+        })
+
+    @property
+    def remaining(self) -> int:
+        return len(self.pieces) - len(self.journal.finished())
+
+    @property
+    def pending_seconds(self) -> float:
+        """尚未完成的塊的總時長 (秒)"""
+        from whispermind.audio import SAMPLE_RATE
+
+        finished = self.journal.finished()
+        return sum(end - start for index, (start, end) in enumerate(self.pieces)
+                   if index not in finished) / SAMPLE_RATE
+
+    def run(self, token=None) -> float:
+        """轉錄日誌中缺少的塊，每塊完成後立即落盤，返回本次轉錄的音頻秒數
+
+        token 為 CancelToken 時在每塊開始前檢查，取消或超過期限時拋出，已完成的塊保留在日誌中。
+        """
+        from whispermind.audio import SAMPLE_RATE
+
+        finished = self.journal.finished()
+        language = probability = None
+        transcribed = 0.0
+        for index, (start, end) in enumerate(self.pieces):
+            if index in finished:
+                continue
+            if token is not None:
+                token.check()
+            self.transcriber.load()
+            if language is None:
+                language, probability = self._identify_language()
+            output = self.transcriber.transcribe_array(self.source[start:end], language=language)
+            if language:
+                output.update(language=language, language_probability=probability)
+            self.journal.append(index, {"offset": start / SAMPLE_RATE, "output": output})
+            logger.info(f"📒 塊 {index + 1}/{len(self.pieces)} 已寫入日誌")
+            transcribed += (end - start) / SAMPLE_RATE
+        return transcribed
+
+    def segments(self) -> Iterator[Dict[str, Any]]:
+        """從日誌逐個讀出合併後的分段，時間戳映射回原始音頻"""
+        from whispermind.longform import iter_merged
+
+        pieces = ((record["offset"], record["output"].get("segments", [])) for record in self.journal.records())
+        for segment in iter_merged(pieces):
+            segment = dict(segment)  # iter_merged 以上一個分段去重，不能就地修改
+            if self.speech:
+                self.speech.map_segments([segment])
+            yield segment
+
+    def _identify_language(self) -> Tuple[Optional[str], Optional[float]]:
+        """已完成的塊沿用其語言，否則在第一個含語音的窗口上識別一次"""
+        from whispermind.language import normalize_language
+
+        for record in self.journal.records():
+            output = record["output"]
+            if normalize_language(output.get("language")):
+                return output["language"], output.get("language_probability")
+            break
+        return self.transcriber.identify_language(self.source, self.requested_language)
+
+    def language(self) -> str:
+        for record in self.journal.records():
+            return record["output"].get("language", 'auto-detected')
+        return 'auto-detected'
+
+    def language_probability(self) -> Optional[float]:
+        for record in self.journal.records():
+            return record["output"].get("language_probability")
+        return None
+
+    def write(self, fp: IO[str], partial: bool = False):
+        """把結果 JSON 流式寫入文本文件對象，分段只在日誌與輸出之間逐個經過內存"""
+        from whispermind.transcriber import DEFAULT_CONFIDENCE
+
+        fp.write('{"success": true, "text": "')
+        started = False
+        for segment in self.segments():
+            text = segment.get("text", "")
+            if not started:
+                text = text.lstrip()
+                started = bool(text)
+            fp.write(json.dumps(text, ensure_ascii=False)[1:-1])
+        fp.write(f'", "language": {json.dumps(self.language(), ensure_ascii=False)}, "segments": [')
+
+        total = 0.0
+        count = 0
+        for index, segment in enumerate(self.segments()):
+            fp.write((", " if index else "") + json.dumps(segment, ensure_ascii=False))
+            if 'confidence' in segment:
+                total += segment['confidence']
+                count += 1
+        confidence = total / count if count else DEFAULT_CONFIDENCE
+        fp.write(f'], "confidence": {json.dumps(confidence)}, "duration": {json.dumps(self.duration)}')
+        probability = self.language_probability()
+        if probability is not None:
+            fp.write(f', "language_probability": {json.dumps(probability)}')
+        if partial:
+            fp.write(f', "partial": true, "pieces_done": {len(self.journal.finished())}, '
+                     f'"pieces_total": {len(self.pieces)}')
+        fp.write('}\n')
+
+    def close(self):
+        self.journal.close()
+
+    def discard(self):
+        self.journal.remove()
@@ -0,0 +1,79 @@
+"""
+語言識別
+每個文件只識別一次: 在第一個含語音的窗口上運行語言識別，之後的窗口強制以該語言解碼，
+不再由 Whisper 在每個 30 秒窗口內各自判斷 (粵語錄音常被判為 zh 或在窗口之間來回切換)
+"""
+
+import os
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 語言識別窗口長度，與 Whisper 的輸入窗口一致
+DETECT_SECONDS = 30
+# 表示未指定語言的取值 (命令行與舊結果中使用過 auto / auto-detected)
+AUTO_VALUES = ('', 'auto', 'auto-detected', 'detect', 'none', 'unknown')
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """把 'auto'、'<|yue|>'、'Cantonese' 等寫法規範為 Whisper 語言代碼，未指定時返回 None"""
+    if language is None:
+        return None
+    language = language.strip().lower()
+    if language.startswith('<|') and language.endswith('|>'):
+        language = language[2:-2]
+    if language in AUTO_VALUES:
+        return None
+    if len(language) <= 3:  # 已是語言代碼，不必導入語言表
+        return language
+    return _language_codes().get(language, language)
+
+def _language_codes():
+    """語言名 (cantonese) -> 代碼 (yue)，取自已安裝的 Whisper 實現"""
+    try:
+        from transformers.models.whisper.tokenization_whisper import TO_LANGUAGE_CODE
+        return TO_LANGUAGE_CODE
+    except ImportError:
+        pass
+    try:
+        from whisper.tokenizer import TO_LANGUAGE_CODE
+        return TO_LANGUAGE_CODE
+    except ImportError:
+        return {}
+
+# 部署已知語言時 (如 yue) 跳過識別
+LANGUAGE = normalize_language(os.environ.get('WHISPER_LANGUAGE'))
+
+def first_speech_window(audio, seconds: float = DETECT_SECONDS, sample_rate: Optional[int] = None):
+    """從第一個語音區段開始的一個窗口，沒有檢測到語音時返回開頭的窗口"""
+    from whispermind.audio import SAMPLE_RATE
+    from whispermind.vad import detect_speech
+
+    sample_rate = sample_rate or SAMPLE_RATE
+    size = int(seconds * sample_rate)
+    regions = detect_speech(audio[:size * 4], sample_rate) if len(audio) else []
+    start = regions[0][0] if regions else 0
+    return audio[start:start + size]
+
+def identify_language(transcriber, audio, language: Optional[str] = None) -> Tuple[Optional[str], Optional[float]]:
+    """確定整個文件的語言，返回 (語言代碼, 識別概率)
+
+    調用方或配置已指定語言時直接使用 (概率為 None)；否則在第一個含語音的窗口上識別一次。
+    後端不支持語言識別時返回 (None, None)，由解碼器自行判斷。
+    """
+    from whispermind.stages import stage
+
+    language = normalize_language(language) or transcriber.language
+    if language:
+        return language, None
+    window = first_speech_window(audio)
+    if not len(window):
+        return None, None
+    transcriber.load()
+    with stage("language"):
+        detected = transcriber.detect_language(window)
+    if detected is None:
+        return None, None
+    language, probability = detected
+    logger.info(f"🌐 語言識別: {language} (概率 {probability:.2f})，後續窗口強制使用該語言")
+    return language, probability
@@ -0,0 +1,212 @@
+"""
+分塊流式音頻加載
+按固定大小的塊讀取音頻 (未壓縮 WAV 直接讀取數據區，其他格式經 soundfile 或 ffmpeg 管道)，
+逐塊以 float32 混音為單聲道並重採樣到 16kHz，再在靜音處切成不超過 30 秒的窗口，
+峰值內存只與塊和窗口大小有關，與錄音長度無關
+"""
+
+import os
+import struct
+import logging
+import importlib.util
+import subprocess
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE, ffmpeg_command
+from whispermind.longform import PIECE_SECONDS, split_at_silence
+from whispermind.stages import stage
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SECONDS = 10.0
+
+# (WAV 格式標記, 位深) -> numpy 類型與歸一化方式；24 位等其他格式交給 soundfile/ffmpeg
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+WAV_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): 'u1',
+    (WAVE_FORMAT_PCM, 16): '<i2',
+    (WAVE_FORMAT_PCM, 32): '<i4',
+    (WAVE_FORMAT_IEEE_FLOAT, 32): '<f4',
+    (WAVE_FORMAT_IEEE_FLOAT, 64): '<f8',
+}
+
+def wav_layout(file_path: str) -> Optional[Dict[str, Any]]:
+    """解析未壓縮 WAV 的數據區位置與樣本格式，無法直接讀取時返回 None"""
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+                if chunk_id == b'data':
+                    break
+                body = f.read(size + (size & 1))
+                if chunk_id == b'fmt ' and size >= 16:
+                    tag, channels, rate = struct.unpack('<HHI', body[:8])
+                    bits = struct.unpack('<H', body[14:16])[0]
+                    if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                        tag = struct.unpack('<H', body[24:26])[0]
+                    fmt = (tag, channels, rate, bits)
+            offset = f.tell()
+            available = os.fstat(f.fileno()).st_size - offset
+    except OSError:
+        return None
+
+    if fmt is None:
+        return None
+    tag, channels, rate, bits = fmt
+    dtype = WAV_DTYPES.get((tag, bits))
+    if dtype is None or channels == 0:
+        return None
+    # 邊錄邊寫的文件可能把數據長度留為 0 或 0xFFFFFFFF
+    if size == 0 or size > available:
+        size = available
+    return {
+        "offset": offset,
+        "frames": size // (channels * bits // 8),
+        "channels": channels,
+        "rate": rate,
+        "dtype": dtype,
+    }
+
+def _to_float32(block: np.ndarray) -> np.ndarray:
+    """把整數或浮點樣本塊轉為 [-1, 1] 的 float32"""
+    if block.dtype == np.uint8:
+        return (block.astype(np.float32) - 128.0) / 128.0
+    if block.dtype.kind == 'i':
+        return block.astype(np.float32) / float(2 ** (8 * block.dtype.itemsize - 1))
+    return block.astype(np.float32, copy=False)
+
+def _downmix(block: np.ndarray) -> np.ndarray:
+    """(幀, 聲道) -> 單聲道 float32"""
+    if block.shape[1] == 1:
+        return block[:, 0]
+    return block.mean(axis=1, dtype=np.float32)
+
+def _wav_blocks(file_path: str, layout: Dict[str, Any], block_frames: int) -> Iterator[np.ndarray]:
+    """從 WAV 數據區順序讀取固定大小的塊
+
+    不使用內存映射: 映射過的頁面會一直計入常駐內存，長錄音的 RSS 仍會隨文件增長。
+    """
+    dtype = np.dtype(layout["dtype"])
+    channels = layout["channels"]
+    remaining = layout["frames"]
+    with open(file_path, 'rb') as f:
+        f.seek(layout["offset"])
+        while remaining > 0:
+            count = min(block_frames, remaining)
+            block = np.fromfile(f, dtype=dtype, count=count * channels)
+            frames = len(block) // channels
+            if frames == 0:
+                return
+            remaining -= frames
+            yield _downmix(_to_float32(block[:frames * channels].reshape(frames, channels)))
+
+def _soundfile_blocks(file_path: str, block_frames: int) -> Iterator[np.ndarray]:
+    import soundfile as sf
+
+    for block in sf.blocks(file_path, blocksize=block_frames, dtype='float32', always_2d=True):
+        yield _downmix(block)
+
+def _ffmpeg_blocks(file_path: str, sample_rate: int, block_samples: int) -> Iterator[np.ndarray]:
+    """ffmpeg 負責解碼、混音與重採樣，從管道逐塊讀取 f32le"""
+    proc = subprocess.Popen(ffmpeg_command(file_path, sample_rate),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        block_bytes = block_samples * 4
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % 4
+            yield np.frombuffer(data, dtype=np.float32, count=usable // 4)
+        stderr = proc.stderr.read()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg 解碼失敗: {stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+def _resampled(blocks: Iterable[np.ndarray], rate: int, sample_rate: int) -> Iterator[np.ndarray]:
+    """逐塊流式重採樣，濾波器狀態跨塊保留，塊邊界不產生斷點"""
+    import soxr
+
+    resampler = soxr.ResampleStream(rate, sample_rate, 1, dtype='float32')
+    for block in blocks:
+        with stage("resample"):
+            output = resampler.resample_chunk(block)
+        if len(output):
+            yield output
+    tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+    if len(tail):
+        yield tail
+
+def _source_blocks(file_path: str, sample_rate: int, block_seconds: float) -> Tuple[Iterator[np.ndarray], int]:
+    """選擇讀取方式，返回 (原始採樣率的單聲道塊, 採樣率)"""
+    can_resample = importlib.util.find_spec('soxr') is not None
+
+    layout = wav_layout(file_path)
+    if layout and (layout["rate"] == sample_rate or can_resample):
+        return _wav_blocks(file_path, layout, int(layout["rate"] * block_seconds)), layout["rate"]
+
+    if importlib.util.find_spec('soundfile') is not None:
+        import soundfile as sf
+        try:
+            rate = sf.info(file_path).samplerate
+        except Exception:
+            rate = None
+        if rate and (rate == sample_rate or can_resample):
+            return _soundfile_blocks(file_path, int(rate * block_seconds)), rate
+
+    return _ffmpeg_blocks(file_path, sample_rate, int(sample_rate * block_seconds)), sample_rate
+
+def iter_audio(file_path: str, sample_rate: int = SAMPLE_RATE,
+               block_seconds: float = BLOCK_SECONDS) -> Iterator[np.ndarray]:
+    """逐塊產出 16kHz 單聲道 float32 音頻"""
+    blocks, rate = _source_blocks(file_path, sample_rate, block_seconds)
+
+    def timed(source: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        while True:
+            with stage("decode"):
+                block = next(source, None)
+            if block is None:
+                return
+            yield block
+
+    blocks = timed(blocks)
+    if rate != sample_rate:
+        blocks = _resampled(blocks, rate, sample_rate)
+    return blocks
+
+def iter_windows(blocks: Iterable[np.ndarray], sample_rate: int = SAMPLE_RATE,
+                 window_seconds: float = PIECE_SECONDS) -> Iterator[Tuple[int, np.ndarray]]:
+    """把音頻塊流切成不超過 window_seconds 的窗口，產出 (起始樣本偏移, 窗口)
+
+    切點與 longform.split_at_silence 相同，選在窗口末尾附近能量最低處；
+    緩衝區只保留當前窗口與下一塊。
+    """
+    window = int(window_seconds * sample_rate)
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block]) if len(buffer) else block
+        while len(buffer) > window:
+            pieces = split_at_silence(buffer, sample_rate, window_seconds)
+            (start, end), (next_start, _) = pieces[0], pieces[1]
+            yield offset + start, buffer[start:end]
+            buffer = buffer[next_start:].copy()
+            offset += next_start
+
+    for start, end in split_at_silence(buffer, sample_rate, window_seconds):
+        yield offset + start, buffer[start:end]
@@ -0,0 +1,140 @@
+"""
+長音頻並行轉錄
+在塊邊界附近的靜音處切分音頻，用進程池在多個核心上並行轉錄各段，
+再按偏移修正時間戳並去除邊界重疊產生的重複分段
+"""
+
+import os
+import re
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.vad import ENERGY_MARGIN_DB, FRAME_MS, frame_energy
+
+logger = logging.getLogger(__name__)
+
+PIECE_SECONDS = 30.0
+# 在邊界前多少秒內尋找靜音切點
+SEARCH_SECONDS = 5.0
+# 找不到靜音時相鄰兩段的重疊長度
+OVERLAP_SECONDS = 1.0
+LONG_FILE_SECONDS = float(os.environ.get('WHISPER_LONG_FILE_SECONDS', 600))
+PARALLEL_WORKERS = int(os.environ.get('WHISPER_PARALLEL_WORKERS', max(1, (os.cpu_count() or 1) // 4)))
+
+def split_at_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                     piece_seconds: float = PIECE_SECONDS,
+                     search_seconds: float = SEARCH_SECONDS) -> List[Tuple[int, int]]:
+    """把音頻切成不超過 piece_seconds 的片段，切點選在邊界前能量最低的幀"""
+    frame = int(sample_rate * FRAME_MS / 1000)
+    piece = int(piece_seconds * sample_rate)
+    search = int(search_seconds * sample_rate)
+    overlap = int(OVERLAP_SECONDS * sample_rate)
+
+    energy = frame_energy(audio, frame)
+    if not len(energy):
+        return [(0, len(audio))] if len(audio) else []
+    silence_level = np.percentile(energy, 10) + ENERGY_MARGIN_DB
+
+    pieces = []
+    start = 0
+    while len(audio) - start > piece:
+        # 切點後保留重疊的空間，保證片段不超過一個窗口
+        high = (start + piece - overlap) // frame
+        low = max(start // frame + 1, (start + piece - overlap - search) // frame)
+        index = low + int(np.argmin(energy[low:high]))
+        cut = index * frame
+        if energy[index] <= silence_level:
+            pieces.append((start, cut))
+        else:
+            # 沒有靜音可切，保留重疊，合併時去重
+            pieces.append((start, min(len(audio), cut + overlap)))
+        start = cut
+    pieces.append((start, len(audio)))
+    return pieces
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[\W_]+', '', text).lower()
+
+def iter_merged(pieces: Iterable[Tuple[float, List[Dict[str, Any]]]]) -> Iterator[Dict[str, Any]]:
+    """按片段偏移修正時間戳，並去掉邊界重疊產生的重複分段；逐個產出，只保留上一個分段"""
+    last: Optional[Dict[str, Any]] = None
+    for offset, segments in pieces:
+        for segment in segments:
+            segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+            if last is not None:
+                # 完全落在已轉錄的重疊區內
+                if segment["end"] <= last["end"] + 0.05:
+                    continue
+                # 跨越邊界的同一句話
+                if segment["start"] < last["end"] and _normalize(segment["text"]) == _normalize(last["text"]):
+                    continue
+                segment["start"] = max(segment["start"], last["end"])
+            last = segment
+            yield segment
+
+def merge_pieces(pieces: List[Tuple[float, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """按片段偏移修正時間戳，並去掉邊界重疊產生的重複分段"""
+    return list(iter_merged(pieces))
+
+_transcriber = None
+
+def _init_worker(model_name: str, threads: int, precision: Optional[str] = None):
+    """工作進程初始化：限制線程數並加載一次模型"""
+    global _transcriber
+    import torch
+    from whispermind.backends.hf import TransformersBackend
+
+    torch.set_num_threads(threads)
+    _transcriber = TransformersBackend(model_name, precision=precision, vad=False)
+    _transcriber.load()
+    logger.info(f"✅ 工作進程 {os.getpid()} 模型加載完成 ({threads} 線程)")
+
+def _detect_language(window: np.ndarray) -> Optional[Tuple[str, float]]:
+    """在工作進程中識別一個窗口的語言，主進程不必加載模型"""
+    return _transcriber.detect_language(window)
+
+def _transcribe_piece(piece: np.ndarray, language: Optional[str] = None) -> List[Dict[str, Any]]:
+    """轉錄一個不超過 30 秒的片段"""
+    return _transcriber.transcribe_array(piece, language=language)["segments"]
+
+def transcribe_parallel(audio: np.ndarray, model_name: str, workers: int = PARALLEL_WORKERS,
+                        sample_rate: int = SAMPLE_RATE, precision: Optional[str] = None,
+                        language: Optional[str] = None) -> Dict[str, Any]:
+    """在進程池上並行轉錄長音頻，返回 {"text", "segments", "language", "language_probability"}
+
+    語言由一個工作進程在第一個含語音的窗口上識別一次 (已指定時直接使用)，所有片段強制使用該語言；
+    只把該窗口而不是整段音頻傳給工作進程。
+    """
+    from whispermind.language import LANGUAGE, first_speech_window, normalize_language
+
+    pieces = split_at_silence(audio, sample_rate)
+    workers = max(1, min(workers, len(pieces)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"🧩 長音頻切分為 {len(pieces)} 段，{workers} 個進程 × {threads} 線程")
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_name, threads, precision)) as pool:
+        language, probability = normalize_language(language) or LANGUAGE, None
+        window = first_speech_window(audio, sample_rate=sample_rate) if not language else audio[:0]
+        detected = pool.submit(_detect_language, window).result() if len(window) else None
+        if detected is not None:
+            language, probability = detected
+            logger.info(f"🌐 語言識別: {language} (概率 {probability:.2f})，所有片段強制使用該語言")
+        results = list(pool.map(_transcribe_piece, [audio[start:end] for start, end in pieces],
+                                [language] * len(pieces)))
+
+    segments = merge_pieces([(start / sample_rate, segments) for (start, _), segments in zip(pieces, results)])
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+        "language_probability": probability,
+    }
+
+def use_parallel(audio: np.ndarray, workers: Optional[int] = None, sample_rate: int = SAMPLE_RATE) -> bool:
+    """音頻足夠長且有多個工作進程時使用並行模式"""
+    workers = PARALLEL_WORKERS if workers is None else workers
+    return workers > 1 and len(audio) / sample_rate >= LONG_FILE_SECONDS
@@ -0,0 +1,202 @@
+"""
+Prometheus 監控指標
+以文本暴露格式 (0.0.4) 輸出計數器、儀表與直方圖，不依賴 prometheus_client；
+各處理階段的耗時經 whispermind.stages 的觀察者寫入直方圖，未啟用時不計時
+"""
+
+import os
+import bisect
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from whispermind.stages import add_observer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+RTF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+
+def metrics_enabled() -> bool:
+    """WHISPER_METRICS=0 時關閉 /metrics 與階段計時"""
+    return os.environ.get('WHISPER_METRICS', '1').lower() not in ('0', 'false', 'no', 'off')
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Metric:
+    """指標基類，按標籤值分別保存樣本"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {} if self.labels else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Gauge(Metric):
+    """儀表；指定 function 時在抓取時才讀取當前值"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation)
+        self.function = function
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def samples(self) -> Iterator[str]:
+        value = self.function() if self.function else self._value
+        if value is not None:
+            yield f"{self.name} {_format_value(value)}"
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 標籤值 -> [各桶計數 (非累計, 最後一個為 +Inf), 總和]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+def resident_memory_bytes() -> Optional[float]:
+    """當前常駐內存，讀取 /proc/self/statm，不可用時返回 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return float(pages * os.sysconf('SC_PAGE_SIZE'))
+
+class ServerMetrics:
+    """轉錄服務器的指標集合"""
+
+    def __init__(self, queue_depth: Callable[[], float], in_flight: Callable[[], float],
+                 load_seconds: Callable[[], Optional[float]],
+                 speculative: Optional[Callable[[], Optional[Dict]]] = None,
+                 jobs: Optional[Callable[[], Dict[str, int]]] = None):
+        self.stage_seconds = Histogram(
+            'whisper_stage_seconds', "各處理階段耗時 (decode/resample/vad/features/encoder/decoder/postprocess)",
+            STAGE_BUCKETS, labels=('stage',)
+        )
+        self.request_seconds = Histogram(
+            'whisper_request_seconds', "轉錄請求從出隊到完成的耗時", REQUEST_BUCKETS
+        )
+        self.real_time_factor = Histogram(
+            'whisper_real_time_factor', "處理耗時 / 音頻時長", RTF_BUCKETS
+        )
+        self.audio_seconds = Counter('whisper_audio_seconds_total', "已轉錄的音頻總時長 (秒)")
+        self.requests = Counter('whisper_requests_total', "按結果分類的轉錄請求數", labels=('status',))
+        self.metrics: List[Metric] = [
+            self.stage_seconds, self.request_seconds, self.real_time_factor,
+            self.audio_seconds, self.requests,
+            Gauge('whisper_queue_depth', "等待推理的請求數", queue_depth),
+            Gauge('whisper_in_flight', "正在推理的請求數", in_flight),
+            Gauge('whisper_model_load_seconds', "模型加載耗時", load_seconds),
+            Gauge('process_resident_memory_bytes', "常駐內存 (字節)", resident_memory_bytes),
+        ]
+        if speculative:
+            def read(key: str) -> Callable[[], Optional[float]]:
+                return lambda: (speculative() or {}).get(key)
+
+            self.metrics += [
+                Gauge('whisper_speculative_acceptance_rate', "投機解碼的草稿接受率", read('acceptance_rate')),
+                Gauge('whisper_speculative_tokens_per_pass', "投機解碼每次主模型前向傳播產出的標記數",
+                      read('tokens_per_pass')),
+                Gauge('whisper_speculative_draft_tokens', "累計起草的標記數", read('drafted')),
+                Gauge('whisper_speculative_accepted_tokens', "累計被接受的草稿標記數", read('accepted')),
+            ]
+        if jobs:
+            self.metrics += [
+                Gauge('whisper_jobs_queued', "排隊中的異步任務數", lambda: jobs().get('queued')),
+                Gauge('whisper_jobs_running', "運行中的異步任務數", lambda: jobs().get('running')),
+            ]
+        add_observer(self.observe_stage)
+
+    def observe_stage(self, name: str, elapsed: float):
+        self.stage_seconds.observe(elapsed, stage=name)
+
+    def observe_request(self, elapsed: float, result: Dict) -> None:
+        """記錄一次完成的轉錄"""
+        if not result.get('success'):
+            self.requests.inc(status='error')
+            return
+        self.requests.inc(status='success')
+        self.request_seconds.observe(elapsed)
+        duration = result.get('duration') or 0.0
+        if duration > 0:
+            self.audio_seconds.inc(duration)
+            self.real_time_factor.observe(elapsed / duration)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
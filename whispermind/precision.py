@@ -0,0 +1,167 @@
+"""
+CPU 推理精度
+fp32: 原始權重；bf16: CPU 支持 bfloat16 指令時以 bfloat16 運行；
+int8: 對線性層做動態量化，量化後的模型緩存在磁盤上，啟動時不必重新量化
+"""
+
+import os
+import re
+import logging
+import functools
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('fp32', 'bf16', 'int8')
+DEFAULT_PRECISION = os.environ.get('WHISPER_PRECISION', 'fp32').lower()
+QUANTIZED_DIR = os.environ.get(
+    'WHISPER_QUANTIZED_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'quantized')
+)
+
+def normalize_precision(precision: Optional[str]) -> str:
+    """校驗精度名稱，未指定時使用 WHISPER_PRECISION"""
+    precision = (precision or DEFAULT_PRECISION).lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"未知精度: {precision}，可用: {', '.join(PRECISIONS)}")
+    return precision
+
+@functools.lru_cache(maxsize=None)
+def bf16_supported() -> bool:
+    """CPU 是否有原生 bfloat16 支持 (AVX512-BF16 / AMX)，結果只檢測一次"""
+    supported = _detect_bf16()
+    if not supported:
+        logger.warning("⚠️ CPU 不支持 bfloat16，bf16 請求將以 fp32 運行")
+    return supported
+
+def _detect_bf16() -> bool:
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        pass
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def resolve_precision(precision: Optional[str]) -> str:
+    """返回本機實際可用的精度，不支持 bf16 時回退到 fp32"""
+    precision = normalize_precision(precision)
+    if precision == 'bf16' and not bf16_supported():
+        return 'fp32'
+    return precision
+
+def quantized_path(model_name: str, directory: str = QUANTIZED_DIR) -> str:
+    """量化模型的緩存路徑，包含 torch 與 transformers 版本，升級後自動重建"""
+    import torch
+    import transformers
+
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', model_name.strip('/'))
+    return os.path.join(directory, f"{slug}-int8-torch{torch.__version__}-tf{transformers.__version__}.pt")
+
+def quantize_dynamic(model):
+    """把線性層動態量化為 int8，激活值在運行時量化"""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _quantized_linears(model):
+    import torch.ao.nn.quantized.dynamic as nnqd
+
+    return {name: module for name, module in model.named_modules() if isinstance(module, nnqd.Linear)}
+
+def _save_quantized(model, path: str):
+    """以普通張量保存量化權重 (int8 數值 + scale/zero_point)
+
+    不直接保存量化張量: 其 qscheme 在反序列化時需按名稱查找模塊，
+    會觸發 transformers 的延遲導入；普通張量還能用 weights_only=True 安全讀取。
+    """
+    import torch
+
+    linears = _quantized_linears(model)
+    prefixes = tuple(f"{name}." for name in linears)
+    tensors = {key: value for key, value in model.state_dict().items()
+               if isinstance(value, torch.Tensor) and not key.startswith(prefixes)}
+    layers = {}
+    for name, module in linears.items():
+        weight, bias = module._weight_bias()
+        layers[name] = {
+            "weight": weight.int_repr(),
+            "scale": float(weight.q_scale()),
+            "zero_point": int(weight.q_zero_point()),
+            "bias": bias,
+        }
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save({"tensors": tensors, "linears": layers}, tmp_path)
+    os.replace(tmp_path, path)
+
+def _swap_linear(module):
+    """把線性層換成空的動態量化線性層，權重隨後由緩存填入"""
+    import torch
+    import torch.ao.nn.quantized.dynamic as nnqd
+
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear):
+            setattr(module, name, nnqd.Linear(child.in_features, child.out_features,
+                                              bias_=child.bias is not None, dtype=torch.qint8))
+        else:
+            _swap_linear(child)
+
+def _load_quantized(model_name: str, path: str):
+    """在 meta 設備上構建模型骨架，換入量化線性層後直接載入緩存的 int8 權重，不讀取 fp32 權重"""
+    import torch
+    from transformers import GenerationConfig, WhisperConfig, WhisperForConditionalGeneration
+
+    state = torch.load(path, weights_only=True)
+    with torch.device('meta'):
+        model = WhisperForConditionalGeneration(WhisperConfig.from_pretrained(model_name))
+    _swap_linear(model)
+
+    linears = _quantized_linears(model)
+    if set(linears) != set(state["linears"]):
+        raise RuntimeError(f"量化緩存與模型結構不符: {path}")
+    for name, layer in state["linears"].items():
+        weight = torch._make_per_tensor_quantized_tensor(layer["weight"], layer["scale"], layer["zero_point"])
+        linears[name].set_weight_bias(weight, layer["bias"])
+    # 量化層的 _load_from_state_dict 只接受自身格式，其餘權重逐個替換 meta 張量
+    for key, value in state["tensors"].items():
+        path, _, attr = key.rpartition('.')
+        module = model.get_submodule(path)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(value, requires_grad=False)
+        else:
+            module._buffers[attr] = value
+    missing = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"量化緩存缺少權重: {', '.join(missing[:5])}")
+
+    model.generation_config = GenerationConfig.from_pretrained(model_name)
+    return model.eval()
+
+def load_whisper_model(model_name: str, precision: str, directory: str = QUANTIZED_DIR):
+    """按精度加載 WhisperForConditionalGeneration，int8 模型優先從磁盤緩存讀取"""
+    import torch
+    from transformers import WhisperForConditionalGeneration
+
+    if precision == 'int8':
+        path = quantized_path(model_name, directory)
+        if os.path.exists(path):
+            logger.info(f"📦 讀取已緩存的 int8 權重: {path}")
+            return _load_quantized(model_name, path)
+
+        logger.info("🔧 正在對線性層做 int8 動態量化...")
+        model = quantize_dynamic(WhisperForConditionalGeneration.from_pretrained(model_name).eval())
+        os.makedirs(directory, exist_ok=True)
+        _save_quantized(model, path)
+        logger.info(f"💾 int8 權重已緩存: {path}")
+        return model
+
+    model = WhisperForConditionalGeneration.from_pretrained(model_name).eval()
+    if precision == 'bf16':
+        model = model.to(torch.bfloat16)
+    return model
@@ -0,0 +1,211 @@
+"""
+投機解碼
+助手模型 (同詞表的小型 Whisper) 逐個起草若干標記，主模型一次前向傳播驗證全部草稿。
+
+驗證嵌在 generate 的貪婪解碼之下: 主模型的 forward 被替換，貪婪循環的每一步仍由原有的
+logits 處理器 (含時間戳規則) 選出下一個標記；草稿被接受時直接返回驗證時已算好的 logits，
+不再運行主模型，因此輸出與普通貪婪解碼逐標記一致。
+不使用 generate(assistant_model=...): Whisper 帶時間戳解碼時其輸出與貪婪解碼不一致。
+"""
+
+import os
+import logging
+import functools
+import threading
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 助手模型須與主模型同詞表 (large-v3 可用 distil-whisper/distil-large-v3)
+ASSISTANT_MODEL = os.environ.get('WHISPER_ASSISTANT_MODEL') or None
+DRAFT_TOKENS = int(os.environ.get('WHISPER_SPECULATIVE_TOKENS', 5))
+MAX_DRAFT_TOKENS = 16
+
+class SpeculativeStats:
+    """草稿接受率與每次主模型前向傳播產出的標記數，跨請求累計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.drafted = 0
+        self.accepted = 0
+        self.tokens = 0
+        self.verify_passes = 0
+
+    def add(self, drafted: int = 0, accepted: int = 0, tokens: int = 0, verify_passes: int = 0):
+        with self._lock:
+            self.drafted += drafted
+            self.accepted += accepted
+            self.tokens += tokens
+            self.verify_passes += verify_passes
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            drafted, accepted, tokens, passes = self.drafted, self.accepted, self.tokens, self.verify_passes
+        return {
+            "drafted": drafted,
+            "accepted": accepted,
+            "acceptance_rate": accepted / drafted if drafted else None,
+            "tokens": tokens,
+            "verify_passes": passes,
+            # 理想情況下相對貪婪解碼的主模型前向次數縮減倍數
+            "tokens_per_pass": tokens / passes if passes else None,
+        }
+
+class _Session:
+    """一次 generate 調用的解碼狀態"""
+
+    def __init__(self, history: List[int], draft_tokens: int):
+        self.history = history
+        self.draft_tokens = draft_tokens
+        # 位置 -> (草稿標記, 主模型在該位置輸入此標記後的 logits)
+        self.pending: Dict[int, Tuple[int, Any]] = {}
+        self.drafted = 0
+        self.accepted = 0
+        self.assistant_encoded = None
+        self.assistant_cache = None
+        self.assistant_tokens: List[int] = []
+
+def _common_prefix(a: List[int], b: List[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+def _crop(cache, length: int):
+    """把緩存截到 length 個標記 (負數參數在 transformers v4 與 v5 中都表示刪除的標記數)"""
+    extra = cache.get_seq_length() - length
+    if extra > 0:
+        cache.crop(-extra)
+
+class SpeculativeDecoder:
+    """為主模型安裝投機解碼
+
+    只作用於批大小為 1 的 generate 調用，其他調用 (批量解碼、語言檢測等) 原樣交給主模型。
+    草稿所需的助手編碼器輸出由主模型編碼器的前置鉤子取得同一批特徵後計算。
+    """
+
+    def __init__(self, model, assistant, draft_tokens: int = DRAFT_TOKENS):
+        if model.config.vocab_size != assistant.config.vocab_size:
+            raise ValueError(
+                f"助手模型詞表大小 ({assistant.config.vocab_size}) 與主模型 ({model.config.vocab_size}) 不同"
+            )
+        self.model = model
+        self.assistant = assistant
+        self.draft_tokens = max(1, draft_tokens)
+        self.max_positions = model.config.max_target_positions
+        self.stats = SpeculativeStats()
+        self._local = threading.local()
+        self._forward = model.forward
+
+        # generate 按 forward 的簽名校驗參數，替換後須保留原簽名
+        @functools.wraps(self._forward)
+        def forward(*args, **kwargs):
+            return self.forward(*args, **kwargs)
+
+        model.forward = forward
+        model.get_encoder().register_forward_pre_hook(self._capture_features, with_kwargs=True)
+
+    def _capture_features(self, module, args, kwargs):
+        self._local.features = args[0] if args else kwargs.get('input_features')
+
+    def _assistant_encoded(self, session: _Session):
+        if session.assistant_encoded is None:
+            features = self._local.features
+            session.assistant_encoded = self.assistant.get_encoder()(
+                features.to(self.assistant.device, dtype=self.assistant.dtype)
+            )
+        return session.assistant_encoded
+
+    def _draft(self, session: _Session, count: int) -> List[int]:
+        """助手模型按貪婪方式起草 count 個標記，只重新輸入與歷史不一致的部分"""
+        import torch
+
+        common = _common_prefix(session.assistant_tokens, session.history)
+        if common == len(session.history):
+            common -= 1  # 至少輸入最後一個標記以得到下一位置的 logits
+        if session.assistant_cache is not None:
+            _crop(session.assistant_cache, common)
+        del session.assistant_tokens[common:]
+
+        encoded = self._assistant_encoded(session)
+        feed = session.history[common:]
+        drafts = []
+        for _ in range(count):
+            output = self.assistant(
+                encoder_outputs=encoded,
+                decoder_input_ids=torch.tensor([feed], device=self.assistant.device),
+                past_key_values=session.assistant_cache,
+                use_cache=True,
+            )
+            session.assistant_cache = output.past_key_values
+            session.assistant_tokens.extend(feed)
+            token = int(output.logits[0, -1].argmax())
+            drafts.append(token)
+            feed = [token]
+        return drafts
+
+    def _adapt(self, session: _Session):
+        """與 transformers 的啟發式相同: 草稿全部被接受時加長，否則縮短"""
+        if session.drafted:
+            if session.accepted == session.drafted:
+                session.draft_tokens = min(MAX_DRAFT_TOKENS, session.draft_tokens + 2)
+            else:
+                session.draft_tokens = max(1, session.draft_tokens - 1)
+        session.drafted = session.accepted = 0
+
+    def forward(self, *args, **kwargs):
+        from transformers.modeling_outputs import Seq2SeqLMOutput
+
+        input_ids = kwargs.get('decoder_input_ids')
+        cache = kwargs.get('past_key_values')
+        if (args or input_ids is None or cache is None or kwargs.get('encoder_outputs') is None
+                or input_ids.shape[0] != 1 or kwargs.get('output_attentions')
+                or kwargs.get('output_hidden_states') or getattr(self._local, 'features', None) is None
+                or self._local.features.shape[0] != 1):
+            return self._forward(*args, **kwargs)
+
+        if cache.get_seq_length() == 0:
+            # 新的一次 generate: 提示部分照常運行
+            self._local.session = _Session(input_ids[0].tolist(), self.draft_tokens)
+            return self._forward(**kwargs)
+
+        session = getattr(self._local, 'session', None)
+        if session is None or input_ids.shape[1] != 1 or cache.get_seq_length() < len(session.history):
+            return self._forward(*args, **kwargs)
+
+        token = int(input_ids[0, 0])
+        position = len(session.history)
+        session.history.append(token)
+
+        draft = session.pending.pop(position, None)
+        if draft is not None and draft[0] == token:
+            session.accepted += 1
+            self.stats.add(accepted=1, tokens=1)
+            return Seq2SeqLMOutput(logits=draft[1], past_key_values=cache)
+
+        # 草稿被拒絕或已用完: 丟棄主模型緩存中其後的內容，重新起草並一次驗證
+        self._adapt(session)
+        session.pending.clear()
+        _crop(cache, position)
+        count = min(session.draft_tokens, self.max_positions - position - 1)
+        drafts = self._draft(session, count) if count > 0 else []
+
+        kwargs = {key: value for key, value in kwargs.items()
+                  if key not in ('decoder_position_ids', 'decoder_attention_mask', 'cache_position')}
+        kwargs['decoder_input_ids'] = input_ids.new_tensor([[token] + drafts])
+        output = self._forward(**kwargs)
+        logits = output.logits
+        for index, draft_token in enumerate(drafts, start=1):
+            session.pending[position + index] = (draft_token, logits[:, index:index + 1])
+        session.drafted += len(drafts)
+        self.stats.add(drafted=len(drafts), tokens=1, verify_passes=1)
+        return Seq2SeqLMOutput(logits=logits[:, :1], past_key_values=output.past_key_values)
+
+def load_assistant(model_name: str, precision: str):
+    """加載助手模型，精度與主模型相同"""
+    from whispermind.precision import load_whisper_model
+
+    logger.info(f"🔄 正在加載助手模型: {model_name} ({precision})")
+    return load_whisper_model(model_name, precision)
@@ -0,0 +1,64 @@
+"""
+分階段計時
+解碼、重採樣、VAD、特徵提取、編碼器、解碼器與後處理各自計時，
+只有註冊了觀察者 (基準測試、監控指標) 時才讀取時鐘，否則幾乎沒有開銷
+"""
+
+import time
+import threading
+import contextlib
+from typing import Callable, Dict, Iterator, List
+
+# 觀察者簽名: (階段名, 耗時秒數)
+Observer = Callable[[str, float], None]
+
+_observers: List[Observer] = []
+
+def add_observer(observer: Observer):
+    """註冊階段耗時觀察者"""
+    if observer not in _observers:
+        _observers.append(observer)
+
+def remove_observer(observer: Observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """計時一個處理階段，並把耗時通知所有觀察者"""
+    if not _observers:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        for observer in list(_observers):
+            observer(name, elapsed)
+
+class StageTimer:
+    """累計各階段的總耗時與次數，可跨線程使用"""
+
+    def __init__(self):
+        self._seconds: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, elapsed: float):
+        with self._lock:
+            self._seconds[name] = self._seconds.get(name, 0.0) + elapsed
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._seconds.clear()
+            self._counts.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """返回 {階段: {"seconds", "count"}}"""
+        with self._lock:
+            return {
+                name: {"seconds": seconds, "count": self._counts[name]}
+                for name, seconds in self._seconds.items()
+            }
@@ -0,0 +1,288 @@
+"""
+實時流式轉錄
+客戶端持續發送 16kHz 單聲道 PCM 幀，按固定節奏重新解碼自上次確認位置起的滑動窗口；
+相鄰兩次解碼結果開頭一致的分段才確認 (穩定前綴)，確認後窗口起點前移，
+未確認的末尾作為臨時結果推送，字幕延遲約為一個節奏加一次窗口解碼的耗時
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE
+from whispermind.deadline import CancelToken
+from whispermind.incremental import CONTEXT_CHARS
+from whispermind.transcriber import Segment, transcription_result
+
+logger = logging.getLogger(__name__)
+
+# 重新解碼的節奏: 每收到這麼多新音頻解碼一次
+STEP_SECONDS = float(os.environ.get('WHISPER_STREAM_STEP_MS', 1000)) / 1000
+# 窗口上限: 超過時不等待一致，除最後一個分段外全部確認
+WINDOW_SECONDS = float(os.environ.get('WHISPER_STREAM_WINDOW_SECONDS', 15))
+# CPU 預算: 解碼時間佔實時時間的最大比例，解碼較慢時自動拉長節奏
+CPU_BUDGET = float(os.environ.get('WHISPER_STREAM_CPU_BUDGET', 0.5))
+# 延遲預算: 單次解碼超過此時長時提前確認以縮短窗口
+LATENCY_BUDGET_SECONDS = float(os.environ.get('WHISPER_STREAM_LATENCY_MS', 1500)) / 1000
+# 相鄰兩次解碼中同一分段起點允許的偏差 (秒)
+AGREEMENT_TOLERANCE = 1.0
+# 窗口內沒有任何分段時只保留末尾這段音頻，靜音不反復解碼
+SILENCE_KEEP_SECONDS = 2.0
+# 短於此時長的窗口不解碼
+MIN_WINDOW_SECONDS = 0.3
+
+SAMPLE_FORMATS = {
+    's16le': np.int16,
+    'f32le': np.float32,
+}
+
+# (窗口音頻, 提示詞) -> 相對於窗口的分段；推理隊列已滿、超過期限或連接已關閉時返回 None，本輪跳過
+DecodeFn = Callable[[Any, str], Optional[List[Segment]]]
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[\W_]+', '', text).lower()
+
+def agreed_prefix(previous: List[Segment], current: List[Segment],
+                  tolerance: float = AGREEMENT_TOLERANCE) -> int:
+    """兩次假設開頭一致 (文本相同、起點相近) 的分段數"""
+    count = 0
+    for before, after in zip(previous, current):
+        if (_normalize(before["text"]) != _normalize(after["text"])
+                or abs(before["start"] - after["start"]) > tolerance):
+            break
+        count += 1
+    return count
+
+def stream_options(query: Dict[str, str]) -> Dict[str, Any]:
+    """從查詢參數讀取每個連接的預算，未指定的使用環境變量默認值；格式錯誤時拋出 ValueError"""
+    options: Dict[str, Any] = {}
+    sample_format = query.get('format', 's16le')
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError(f"不支持的 PCM 格式: {sample_format}，可選 {', '.join(SAMPLE_FORMATS)}")
+    options['sample_format'] = sample_format
+    if 'step_ms' in query:
+        options['step_seconds'] = max(0.2, float(query['step_ms']) / 1000)
+    if 'window' in query:
+        options['window_seconds'] = min(30.0, max(2.0, float(query['window'])))
+    if 'cpu_budget' in query:
+        options['cpu_budget'] = min(1.0, max(0.05, float(query['cpu_budget'])))
+    if 'latency_ms' in query:
+        options['latency_budget'] = max(0.1, float(query['latency_ms']) / 1000)
+    return options
+
+class StreamingSession:
+    """一個流式連接的轉錄狀態
+
+    feed() 由讀取線程調用追加音頻，step() 由解碼循環調用並返回要推送給客戶端的事件。
+    """
+
+    def __init__(self, decode: DecodeFn, sample_format: str = 's16le',
+                 step_seconds: float = STEP_SECONDS, window_seconds: float = WINDOW_SECONDS,
+                 cpu_budget: float = CPU_BUDGET, latency_budget: float = LATENCY_BUDGET_SECONDS):
+        self.decode = decode
+        self.dtype = np.dtype(SAMPLE_FORMATS[sample_format])
+        self.step_seconds = step_seconds
+        self.window_seconds = window_seconds
+        self.cpu_budget = cpu_budget
+        self.latency_budget = latency_budget
+
+        self._lock = threading.Condition()
+        self._chunks: List[np.ndarray] = []
+        self._leftover = b''
+        self._samples = 0          # 窗口內的樣本數
+        self._unseen = 0           # 上次解碼後新收到的樣本數
+        self._received_at = 0.0    # 最後一幀的到達時間
+        self.ended = False
+        self.disconnected = False
+        # 連接關閉時取消，作為每次窗口解碼令牌的外層令牌
+        self.token = CancelToken()
+
+        self.offset = 0.0          # 窗口起點在整個流中的位置 (秒)
+        self.context = ''
+        self.committed: List[Segment] = []
+        self.hypothesis: List[Segment] = []
+        self.decodes = 0
+        self.skipped = 0
+        self._next_decode = 0.0
+
+    @property
+    def duration(self) -> float:
+        with self._lock:
+            return self.offset + self._samples / SAMPLE_RATE
+
+    def feed(self, data: bytes):
+        """追加一幀 PCM，不完整的末尾樣本留到下一幀"""
+        data = self._leftover + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._leftover = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype)
+        if self.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        with self._lock:
+            self._chunks.append(samples.astype(np.float32, copy=False))
+            self._samples += len(samples)
+            self._unseen += len(samples)
+            self._received_at = time.monotonic()
+            self._lock.notify_all()
+
+    def finish(self, disconnected: bool = False):
+        """流結束；客戶端斷開時取消進行中的窗口解碼"""
+        if disconnected:
+            self.token.cancel("客戶端已斷開")
+        with self._lock:
+            self.ended = True
+            self.disconnected = disconnected
+            self._lock.notify_all()
+
+    def _window(self) -> np.ndarray:
+        with self._lock:
+            if len(self._chunks) > 1:
+                self._chunks = [np.concatenate(self._chunks)]
+            return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def _advance(self, position: float):
+        """把窗口起點移到 position (秒)，之前的音頻不再解碼"""
+        with self._lock:
+            drop = int(round((position - self.offset) * SAMPLE_RATE))
+            drop = min(max(drop, 0), self._samples)
+            if drop:
+                window = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+                self._chunks = [window[drop:]]
+                self._samples -= drop
+                self.offset += drop / SAMPLE_RATE
+
+    def wait(self) -> bool:
+        """等到下一次解碼的時機，流結束時返回 False"""
+        with self._lock:
+            while not self.ended:
+                now = time.monotonic()
+                if self._unseen >= self.step_seconds * SAMPLE_RATE and now >= self._next_decode:
+                    return True
+                timeout = max(self._next_decode - now, 0.0) or None
+                self._lock.wait(timeout)
+            return False
+
+    def step(self, final: bool = False) -> List[Dict[str, Any]]:
+        """解碼當前窗口，確認穩定前綴，返回要推送的事件；final=True 時全部確認"""
+        window = self._window()
+        with self._lock:
+            offset = self.offset
+            self._unseen = 0
+            received_at = self._received_at
+        if len(window) < MIN_WINDOW_SECONDS * SAMPLE_RATE:
+            return []
+
+        started = time.monotonic()
+        segments = self.decode(window, self.context)
+        elapsed = time.monotonic() - started
+        # 解碼耗時不得超過實時時間的 cpu_budget 比例
+        self._next_decode = started + max(self.step_seconds, elapsed / self.cpu_budget)
+        if segments is None:
+            self.skipped += 1
+            return []
+        self.decodes += 1
+
+        end = offset + len(window) / SAMPLE_RATE
+        hypothesis = [dict(segment, start=offset + segment["start"], end=min(offset + segment["end"], end))
+                      for segment in segments]
+        stable = agreed_prefix(self.hypothesis, hypothesis)
+        if final:
+            stable = len(hypothesis)
+        elif end - offset > self.window_seconds:
+            # 窗口過長: 不再等待一致，只留最後一個分段 (只有一個時也確認)
+            stable = max(stable, len(hypothesis) - 1) if len(hypothesis) > 1 else len(hypothesis)
+        elif elapsed > self.latency_budget:
+            # 解碼超出延遲預算: 提前確認除最後一個分段外的內容以縮短窗口
+            stable = max(stable, len(hypothesis) - 1)
+
+        events: List[Dict[str, Any]] = []
+        confirmed, self.hypothesis = hypothesis[:stable], hypothesis[stable:]
+        if confirmed:
+            self.committed.extend(confirmed)
+            self.context = (self.context + "".join(s["text"] for s in confirmed))[-CONTEXT_CHARS:]
+            self._advance(confirmed[-1]["end"])
+            events.append({
+                "type": "final",
+                "text": "".join(s["text"] for s in confirmed).strip(),
+                "segments": confirmed,
+            })
+        elif not hypothesis:
+            self._advance(end - SILENCE_KEEP_SECONDS)
+
+        now = time.monotonic()
+        events.append({
+            "type": "partial",
+            "text": "".join(s["text"] for s in self.hypothesis).strip(),
+            "start": self.hypothesis[0]["start"] if self.hypothesis else end,
+            "end": end,
+            # 窗口中最後一個樣本到達至結果推送的時間
+            "lag": now - received_at if received_at else elapsed,
+            "decode_seconds": elapsed,
+        })
+        return events
+
+    def result(self) -> Dict[str, Any]:
+        return transcription_result("".join(s["text"] for s in self.committed).strip(),
+                                    self.committed, self.duration)
+
+    def serve(self, ws):
+        """在已完成握手的 WebSocket 上運行: 二進制消息為 PCM 幀，文本消息 {"type": "stop"} 結束流"""
+        from whispermind.websocket import OP_BINARY, OP_TEXT, WebSocketClosed
+
+        def read():
+            try:
+                while True:
+                    opcode, payload = ws.receive()
+                    if opcode == OP_BINARY:
+                        self.feed(payload)
+                    elif opcode == OP_TEXT:
+                        try:
+                            message = json.loads(payload.decode('utf-8'))
+                        except ValueError:
+                            message = {}
+                        if isinstance(message, dict) and message.get("type") == "stop":
+                            self.finish()
+                            return
+            except WebSocketClosed:
+                self.finish(disconnected=True)
+
+        reader = threading.Thread(target=read, name="stream-reader", daemon=True)
+        reader.start()
+        ws.send_json({
+            "type": "ready",
+            "sample_rate": SAMPLE_RATE,
+            "format": self.dtype.name,
+            "step_seconds": self.step_seconds,
+            "window_seconds": self.window_seconds,
+            "cpu_budget": self.cpu_budget,
+            "latency_budget": self.latency_budget,
+        })
+        try:
+            while self.wait():
+                for event in self.step():
+                    ws.send_json(event)
+            if self.disconnected:
+                logger.info(f"🔌 流式客戶端已斷開 ({self.duration:.1f}s 音頻)")
+                return
+            for event in self.step(final=True):
+                if event["type"] == "final":
+                    ws.send_json(event)
+            ws.send_json(dict(self.result(), type="done", decodes=self.decodes, skipped=self.skipped))
+            ws.close()
+            logger.info(f"🎙️ 流式轉錄結束: {self.duration:.1f}s 音頻，解碼 {self.decodes} 次")
+        except WebSocketClosed:
+            self.token.cancel("客戶端已斷開")
+            logger.info("🔌 流式客戶端已斷開")
+        except Exception as e:
+            logger.error(f"❌ 流式轉錄錯誤: {e}")
+            try:
+                ws.send_json({"type": "error", "error": str(e)})
+            except WebSocketClosed:
+                pass
+            ws.close(1011)
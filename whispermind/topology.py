@@ -0,0 +1,349 @@
+"""
+CPU 推理拓撲與主機配置
+autotune 用校準音頻測量「工作進程數 × 每進程線程數」的各種組合 (可選按核心或 NUMA 節點綁定 CPU)，
+記錄吞吐與 p95 延遲，把最佳組合寫入主機配置；服務器啟動時讀取主機配置決定進程數、torch 線程數與 CPU 綁定
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+HOST_PROFILE_PATH = os.environ.get(
+    'WHISPER_HOST_PROFILE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'whispermind', 'host-profile.json')
+)
+PROFILE_VERSION = 1
+# none: 不綁定；cores: 每個進程綁定一段連續核心；numa: 每個進程的核心不跨 NUMA 節點
+PIN_MODES = ('none', 'cores', 'numa')
+CALIBRATION_SECONDS = 30
+DEFAULT_REQUESTS = 4
+# 估算的總內存超過可用內存的此比例時跳過該組合
+MEMORY_HEADROOM = 0.9
+
+def parse_cpulist(text: str) -> List[int]:
+    """解析 /sys 中的 CPU 列表，如 '0-3,8-11'"""
+    cpus: List[int] = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            low, high = part.split('-')
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def available_cpus() -> List[int]:
+    """本進程可用的 CPU 編號 (已考慮容器或 taskset 的限制)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def numa_nodes() -> List[List[int]]:
+    """各 NUMA 節點上的可用 CPU；無法讀取拓撲時視為單個節點"""
+    usable = set(available_cpus())
+    nodes = []
+    for path in sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'),
+                       key=lambda p: int(os.path.basename(os.path.dirname(p))[4:])):
+        try:
+            with open(path, 'r') as f:
+                cpus = [cpu for cpu in parse_cpulist(f.read()) if cpu in usable]
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [sorted(usable)]
+
+def candidate_topologies(cpus: int, max_processes: Optional[int] = None) -> List[Tuple[int, int]]:
+    """(進程數, 每進程線程數) 的候選組合: 進程數取 2 的冪，線程數取佔滿與佔一半核心兩檔"""
+    topologies = []
+    processes = 1
+    while processes <= min(cpus, max_processes or cpus):
+        full = cpus // processes
+        for threads in dict.fromkeys((full, full // 2)):
+            if threads >= 1:
+                topologies.append((processes, threads))
+        processes *= 2
+    return topologies
+
+def cpu_sets(processes: int, threads: int, pin: str = 'none',
+             nodes: Optional[List[List[int]]] = None) -> List[Optional[List[int]]]:
+    """每個進程綁定的 CPU；pin 為 none 或 CPU 不足時不綁定 (None)"""
+    if pin == 'none':
+        return [None] * processes
+    nodes = nodes or numa_nodes()
+    if pin == 'numa':
+        # 每個節點容納整數個進程，進程的核心不跨節點
+        slots = [node[i:i + threads] for node in nodes for i in range(0, len(node) - threads + 1, threads)]
+        if len(slots) >= processes:
+            return slots[:processes]
+    flat = [cpu for node in nodes for cpu in node]
+    if processes * threads > len(flat):
+        return [None] * processes
+    return [flat[i * threads:(i + 1) * threads] for i in range(processes)]
+
+def apply_topology(threads: Optional[int] = None, cpus: Optional[Sequence[int]] = None):
+    """在加載模型前調用: 綁定 CPU 並設置 torch 線程數
+
+    進程間已按核心劃分，算子間並行只會與其他進程爭搶核心，因此固定為 1。
+    """
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    if not threads:
+        return
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # 已有算子間並行任務運行過，只能在進程開始時設置
+        pass
+
+def load_host_profile(path: str = HOST_PROFILE_PATH) -> Optional[Dict[str, Any]]:
+    """讀取主機配置，不存在或格式不符時返回 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(profile, dict) or profile.get("version") != PROFILE_VERSION:
+        logger.warning(f"⚠️ 主機配置版本不符，已忽略: {path}")
+        return None
+    return profile
+
+def save_host_profile(profile: Dict[str, Any], path: str = HOST_PROFILE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def server_topology(profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """服務器使用的拓撲: 環境變量 WHISPER_PROCESSES / WHISPER_THREADS / WHISPER_PIN 優先，其次為主機配置
+
+    都未設置時為單進程、torch 默認線程數、不綁定 (source 為 'default')。
+    """
+    chosen = (profile or {}).get("chosen") or {}
+    processes = max(1, int(os.environ.get('WHISPER_PROCESSES') or chosen.get("processes") or 1))
+    threads = int(os.environ.get('WHISPER_THREADS') or chosen.get("threads") or 0) or None
+    if threads is None and processes > 1:
+        threads = max(1, len(available_cpus()) // processes)  # 多進程時平分核心，避免過度訂閱
+    pin = os.environ.get('WHISPER_PIN') or chosen.get("pin") or 'none'
+    if pin not in PIN_MODES:
+        raise ValueError(f"未知綁定方式: {pin}，可選 {', '.join(PIN_MODES)}")
+    overridden = any(os.environ.get(name) for name in ('WHISPER_PROCESSES', 'WHISPER_THREADS', 'WHISPER_PIN'))
+    return {
+        "processes": processes,
+        "threads": threads,
+        "pin": pin,
+        "cpu_sets": cpu_sets(processes, threads, pin) if threads else [None] * processes,
+        "model": (profile or {}).get("config", {}).get("model") if chosen else None,
+        "source": "env" if overridden else ("profile" if chosen else "default"),
+    }
+
+def available_memory_mb() -> Optional[float]:
+    """系統可用內存 (MB)，無法讀取時返回 None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _start_worker(spec: Dict[str, Any], directory: str, index: int) -> subprocess.Popen:
+    """啟動一個工作進程，標準輸出用於 ready / go 握手與報告，錯誤輸出寫入日誌文件"""
+    spec_path = os.path.join(directory, f'worker-{index}.json')
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(directory, f'worker-{index}.log'), 'w') as log:
+        return subprocess.Popen(
+            [sys.executable, '-m', 'whispermind.topology', spec_path],
+            cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log, text=True
+        )
+
+def _worker_error(directory: str, index: int, default: str) -> str:
+    """工作進程日誌的最後一行"""
+    try:
+        with open(os.path.join(directory, f'worker-{index}.log'), 'r', errors='replace') as f:
+            lines = f.read().strip().splitlines()
+    except OSError:
+        lines = []
+    return lines[-1] if lines else default
+
+def measure_topology(processes: int, threads: int, pin: str, clip: Dict[str, Any], model: str,
+                     precision: Optional[str] = None, requests: int = DEFAULT_REQUESTS,
+                     directory: Optional[str] = None) -> Dict[str, Any]:
+    """啟動 processes 個工作進程，全部加載模型後同時開始，各自連續轉錄校準音頻 requests 次
+
+    吞吐為所有進程處理的音頻秒數 / 牆鐘時間 (實時倍數)，延遲為每次轉錄的耗時。
+    """
+    import numpy as np
+
+    sets = cpu_sets(processes, threads, pin)
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        workers = [
+            _start_worker({"model": model, "precision": precision, "threads": threads, "cpus": cpus,
+                           "audio": clip["path"], "requests": requests}, workdir, index)
+            for index, cpus in enumerate(sets)
+        ]
+        try:
+            # 所有進程加載完模型後再同時開始，加載耗時不計入吞吐
+            for index, worker in enumerate(workers):
+                if worker.stdout.readline().strip() != 'ready':
+                    raise RuntimeError(_worker_error(workdir, index, "工作進程啟動失敗"))
+            for worker in workers:
+                worker.stdin.write('go\n')
+                worker.stdin.flush()
+            reports = []
+            for index, worker in enumerate(workers):
+                line = worker.stdout.readline()
+                if not line:
+                    raise RuntimeError(_worker_error(workdir, index, "工作進程異常退出"))
+                reports.append(json.loads(line))
+        finally:
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.kill()
+                worker.wait()
+
+    latencies = np.asarray([value for report in reports for value in report["latencies"]], dtype=np.float64)
+    wall = max(report["finished"] for report in reports) - min(report["started"] for report in reports)
+    return {
+        "processes": processes,
+        "threads": threads,
+        "pin": pin,
+        "cpu_sets": sets,
+        "requests": len(latencies),
+        "throughput": float(len(latencies) * clip["duration"] / wall),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "rss_mb": max(report["rss_mb"] or 0.0 for report in reports) or None,
+    }
+
+def choose_topology(rows: List[Dict[str, Any]], max_p95: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """p95 延遲在預算內吞吐最高的組合；都超出預算時取 p95 最低的組合"""
+    measured = [row for row in rows if "throughput" in row]
+    if not measured:
+        return None
+    within = [row for row in measured if max_p95 is None or row["p95"] <= max_p95]
+    if within:
+        return max(within, key=lambda row: (row["throughput"], -row["p95"]))
+    return min(measured, key=lambda row: row["p95"])
+
+def autotune(model: str, precision: Optional[str] = None, audio: Optional[str] = None,
+             pins: Sequence[str] = ('none',), max_processes: Optional[int] = None,
+             requests: int = DEFAULT_REQUESTS, max_p95: Optional[float] = None,
+             directory: Optional[str] = None) -> Dict[str, Any]:
+    """測量所有候選拓撲並返回主機配置 (含全部測量結果與選中的組合)"""
+    from whispermind.bench import BENCH_DIR, RANDOM_MODEL, _host_info, prepare_audio, tiny_transformers_model
+
+    directory = directory or BENCH_DIR
+    os.makedirs(directory, exist_ok=True)
+    if audio:
+        from whispermind.deadline import file_duration
+        clip = {"path": audio, "duration": file_duration(audio)}
+    else:
+        clip = prepare_audio([CALIBRATION_SECONDS], os.path.join(directory, 'audio'))[0]
+    measured_model = tiny_transformers_model(os.path.join(directory, 'tiny-transformers')) \
+        if model == RANDOM_MODEL else model
+
+    cpus = available_cpus()
+    nodes = numa_nodes()
+    memory = available_memory_mb()
+    logger.info(f"🧮 {len(cpus)} 個 CPU，{len(nodes)} 個 NUMA 節點，校準音頻 {clip['duration']:.0f}s")
+
+    rows: List[Dict[str, Any]] = []
+    rss_mb = None
+    for processes, threads in candidate_topologies(len(cpus), max_processes):
+        for pin in pins:
+            if pin != 'none' and processes == 1 and threads == len(cpus):
+                continue  # 單進程佔滿所有核心時綁定沒有意義
+            label = f"{processes} 進程 × {threads} 線程 ({pin})"
+            if memory and rss_mb and processes * rss_mb > memory * MEMORY_HEADROOM:
+                logger.warning(f"⚠️ 跳過 {label}: 預計需要 {processes * rss_mb:.0f}MB 內存")
+                rows.append({"processes": processes, "threads": threads, "pin": pin, "skipped": "內存不足"})
+                continue
+            logger.info(f"⏱️ 測量 {label}")
+            try:
+                row = measure_topology(processes, threads, pin, clip, measured_model, precision, requests,
+                                       directory)
+            except Exception as e:
+                logger.error(f"❌ {label} 失敗: {e}")
+                rows.append({"processes": processes, "threads": threads, "pin": pin, "error": str(e)})
+                continue
+            rss_mb = max(rss_mb or 0.0, row["rss_mb"] or 0.0) or None
+            logger.info(f"   吞吐 {row['throughput']:.2f}x 實時，p95 {row['p95']:.2f}s")
+            rows.append(row)
+
+    chosen = choose_topology(rows, max_p95)
+    if chosen:
+        chosen = {key: chosen[key] for key in ("processes", "threads", "pin", "throughput", "p95")}
+    return {
+        "version": PROFILE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "host": dict(_host_info(), available_cpus=len(cpus), numa_nodes=len(nodes)),
+        "config": {"model": model, "precision": precision, "audio_seconds": clip["duration"],
+                   "requests": requests, "max_p95": max_p95, "pins": list(pins)},
+        "results": rows,
+        "chosen": chosen,
+    }
+
+def format_autotune_report(profile: Dict[str, Any]) -> str:
+    lines = [f"{'進程':>4} {'線程':>4} {'綁定':<6} {'吞吐(x實時)':>12} {'p50(s)':>8} {'p95(s)':>8}"]
+    for row in profile["results"]:
+        if "throughput" not in row:
+            lines.append(f"{row['processes']:>4} {row['threads']:>4} {row['pin']:<6} "
+                         f"{row.get('skipped') or row.get('error', '')}")
+            continue
+        lines.append(f"{row['processes']:>4} {row['threads']:>4} {row['pin']:<6} {row['throughput']:>12.2f} "
+                     f"{row['p50']:>8.2f} {row['p95']:>8.2f}")
+    chosen = profile.get("chosen")
+    if chosen:
+        lines.append(f"✅ 選中 {chosen['processes']} 進程 × {chosen['threads']} 線程 ({chosen['pin']})，"
+                     f"吞吐 {chosen['throughput']:.2f}x 實時，p95 {chosen['p95']:.2f}s")
+    else:
+        lines.append("❌ 沒有成功測量的組合")
+    return "\n".join(lines)
+
+def worker_main(spec_path: str):
+    """autotune 的工作進程: 綁定 CPU 並加載模型後輸出 ready，收到 go 後連續轉錄並輸出一行 JSON 報告"""
+    from whispermind.audio import SAMPLE_RATE, load_audio
+    from whispermind.backends.hf import CHUNK_SECONDS, TransformersBackend
+    from whispermind.bench import peak_rss_mb
+
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    apply_topology(spec["threads"], spec["cpus"])
+    transcriber = TransformersBackend(spec["model"], precision=spec["precision"], vad=False)
+    audio = load_audio(spec["audio"])
+    # 與服務器相同的路徑: 30 秒一塊，整段音頻的塊合併為一個批次解碼
+    step = CHUNK_SECONDS * SAMPLE_RATE
+    chunks = [audio[i:i + step] for i in range(0, len(audio), step)]
+    transcriber.decode_chunks(chunks)  # 預熱，不計入統計
+    print('ready', flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    started = time.time()
+    for _ in range(spec["requests"]):
+        began = time.perf_counter()
+        transcriber.decode_chunks(chunks)
+        latencies.append(time.perf_counter() - began)
+    print(json.dumps({"started": started, "finished": time.time(), "latencies": latencies,
+                      "rss_mb": peak_rss_mb()}), flush=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    worker_main(sys.argv[1])
@@ -0,0 +1,205 @@
+"""
+轉錄器接口與共享結果格式
+所有後端返回與前端 types/index.ts 中 TranscriptionData 一致的結果，
+後端模組只在被選用時才導入，導入本模組不會導入 torch 或 numpy
+"""
+
+import os
+import importlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+
+logger = logging.getLogger(__name__)
+
+class Segment(TypedDict, total=False):
+    start: float
+    end: float
+    text: str
+    confidence: float
+    model: str  # 級聯模式下產生該分段的模型
+
+class TranscriptionData(TypedDict, total=False):
+    success: bool
+    text: str
+    language: str
+    language_probability: float
+    confidence: float
+    duration: float
+    segments: List[Segment]
+    cascade: Dict[str, Any]
+    error: str
+
+# 後端名稱 -> "模組:類"，選用時才導入
+BACKENDS = {
+    'transformers': 'whispermind.backends.hf:TransformersBackend',
+    'openai-whisper': 'whispermind.backends.openai_whisper:OpenAIWhisperBackend',
+    'cascade': 'whispermind.backends.cascade:CascadeTranscriber',
+    'mock': 'whispermind.backends.mock:MockBackend',
+}
+
+DEFAULT_CONFIDENCE = 0.9
+
+def transcription_result(text: str, segments: List[Segment], duration: float,
+                         language: str = 'auto-detected',
+                         confidence: Optional[float] = None,
+                         language_probability: Optional[float] = None) -> TranscriptionData:
+    """構建成功的轉錄結果；language_probability 只在語言由識別得出時出現"""
+    if confidence is None:
+        scores = [segment['confidence'] for segment in segments if 'confidence' in segment]
+        confidence = sum(scores) / len(scores) if scores else DEFAULT_CONFIDENCE
+    result: TranscriptionData = {
+        "success": True,
+        "text": text,
+        "language": language or 'auto-detected',
+        "confidence": confidence,
+        "duration": duration,
+        "segments": segments
+    }
+    if language_probability is not None:
+        result["language_probability"] = language_probability
+    return result
+
+def error_result(message: str) -> TranscriptionData:
+    """構建失敗的轉錄結果"""
+    return {
+        "success": False,
+        "error": message
+    }
+
+class Transcriber:
+    """轉錄器基類
+
+    子類實現 _load() 與 transcribe_array()；解碼、VAD、語言識別與時間戳映射由基類統一處理。
+    transcribe_array(audio, language) 返回 {"text", "segments", "language"}，時間戳相對於傳入的音頻，
+    指定 language 時強制以該語言解碼。
+    """
+
+    name = ''
+
+    def __init__(self, model: str, vad: Optional[bool] = None, language: Optional[str] = None,
+                 **options: Any):
+        from whispermind.language import LANGUAGE, normalize_language
+
+        self.model = model
+        if vad is None:
+            from whispermind.vad import vad_enabled
+            vad = vad_enabled()
+        self.vad = vad
+        # 已知的語言，指定後跳過語言識別
+        self.language = normalize_language(language) or LANGUAGE
+        self.options = options
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """加載模型，只執行一次"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        pass
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        """影響結果的參數，參與緩存鍵計算"""
+        params: Dict[str, Any] = {"backend": self.name, "vad": self.vad}
+        if self.language:
+            params["language"] = self.language
+        return params
+
+    def transcribe_array(self, audio, language: Optional[str] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def detect_language(self, audio) -> Optional[Tuple[str, float]]:
+        """識別一個不超過 30 秒窗口的語言，返回 (語言代碼, 概率)；後端不支持時返回 None"""
+        return None
+
+    def identify_language(self, audio, language: Optional[str] = None) -> Tuple[Optional[str], Optional[float]]:
+        """確定整段音頻的語言: 已指定時直接使用，否則在第一個含語音的窗口上識別一次"""
+        from whispermind.language import identify_language
+        return identify_language(self, audio, language)
+
+    def prepare(self, audio, sample_rate: Optional[int] = None):
+        """VAD 預處理，返回 (SpeechMap 或 None, 送入模型的音頻)"""
+        from whispermind.audio import SAMPLE_RATE
+        from whispermind.stages import stage
+        from whispermind.vad import SpeechMap
+
+        if not self.vad:
+            return None, audio
+        with stage("vad"):
+            speech = SpeechMap.from_audio(audio, sample_rate or SAMPLE_RATE)
+            return speech, speech.compact(audio)
+
+    def finish(self, output: Dict[str, Any], audio, speech, sample_rate: Optional[int] = None,
+               on_segment: Optional[Callable[[Segment], None]] = None) -> TranscriptionData:
+        """把後端輸出的時間戳映射回原始音頻並構建結果"""
+        from whispermind.audio import SAMPLE_RATE
+        from whispermind.stages import stage
+
+        segments = output.get("segments", [])
+        if speech:
+            with stage("postprocess"):
+                speech.map_segments(segments)
+        if on_segment:
+            for segment in segments:
+                on_segment(segment)
+
+        return transcription_result(
+            output.get("text", ""), segments, len(audio) / (sample_rate or SAMPLE_RATE),
+            language=output.get("language", 'auto-detected'),
+            language_probability=output.get("language_probability")
+        )
+
+    def transcribe_source(self, source, language: Optional[str] = None) -> Dict[str, Any]:
+        """識別一次語言後以該語言轉錄 (VAD 之後的) 音頻，輸出帶上語言與識別概率"""
+        self.load()
+        language, probability = self.identify_language(source, language)
+        output = self.transcribe_array(source, language=language)
+        if language:
+            output["language"] = language
+            output["language_probability"] = probability
+        return output
+
+    def transcribe(self, audio, sample_rate: Optional[int] = None,
+                   on_segment: Optional[Callable[[Segment], None]] = None,
+                   language: Optional[str] = None) -> TranscriptionData:
+        """轉錄 16kHz 單聲道 float32 音頻，language 為已知語言 (未指定時識別一次)"""
+        speech, source = self.prepare(audio, sample_rate)
+
+        output: Dict[str, Any] = {"text": "", "segments": []}
+        if len(source):
+            output = self.transcribe_source(source, language)
+
+        return self.finish(output, audio, speech, sample_rate, on_segment)
+
+    def transcribe_file(self, file_path: str,
+                        on_segment: Optional[Callable[[Segment], None]] = None,
+                        language: Optional[str] = None) -> TranscriptionData:
+        """解碼文件並轉錄，失敗時返回錯誤結果"""
+        if not os.path.exists(file_path):
+            return error_result(f"文件不存在: {file_path}")
+        try:
+            from whispermind.audio import load_audio
+            return self.transcribe(load_audio(file_path), on_segment=on_segment, language=language)
+        except Exception as e:
+            logger.error(f"❌ 轉錄失敗: {e}")
+            return error_result(str(e))
+
+def available_backends() -> List[str]:
+    return list(BACKENDS)
+
+def get_transcriber(backend: str, **options: Any) -> Transcriber:
+    """按名稱創建轉錄器，此時才導入對應後端模組"""
+    try:
+        target = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"未知後端: {backend}，可用: {', '.join(BACKENDS)}")
+    module_name, class_name = target.split(':')
+    cls = getattr(importlib.import_module(module_name), class_name)
+    return cls(**options)
@@ -0,0 +1,153 @@
+"""
+語音活動檢測 (VAD)
+基於幀能量與語音頻帶能量比的向量化檢測，在 CPU 上快速找出語音區段，
+只把語音送入模型，並把時間戳映射回原始時間軸
+"""
+
+import os
+import bisect
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+from whispermind.audio import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 30
+# 高於噪聲底多少 dB 視為語音
+ENERGY_MARGIN_DB = float(os.environ.get('WHISPER_VAD_MARGIN_DB', 10))
+# 300-3400Hz 頻帶能量佔比下限
+SPEECH_BAND_RATIO = float(os.environ.get('WHISPER_VAD_BAND_RATIO', 0.4))
+MIN_SPEECH_MS = 250
+MIN_SILENCE_MS = 600
+PAD_MS = 200
+# 拼接語音區段時插入的靜音間隔
+GAP_MS = 100
+# 每次做 FFT 的幀數，限制大文件的峰值內存
+FFT_BLOCK_FRAMES = 8192
+
+def vad_enabled() -> bool:
+    """WHISPER_VAD=0 時關閉語音檢測"""
+    return os.environ.get('WHISPER_VAD', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def frame_energy(audio: np.ndarray, frame: int) -> np.ndarray:
+    """計算每幀的能量 (dB)"""
+    count = len(audio) // frame
+    frames = audio[:count * frame].reshape(count, frame)
+    return 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+def _frame_features(audio: np.ndarray, frame: int, sample_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    """計算每幀的能量 (dB) 與語音頻帶能量佔比"""
+    count = len(audio) // frame
+    frames = audio[:count * frame].reshape(count, frame)
+
+    energy = frame_energy(audio, frame)
+
+    freqs = np.fft.rfftfreq(frame, 1.0 / sample_rate)
+    band = (freqs >= 300) & (freqs <= 3400)
+    window = np.hanning(frame).astype(np.float32)
+    ratio = np.empty(count, dtype=np.float32)
+    for i in range(0, count, FFT_BLOCK_FRAMES):
+        spectrum = np.abs(np.fft.rfft(frames[i:i + FFT_BLOCK_FRAMES] * window, axis=1)) ** 2
+        ratio[i:i + FFT_BLOCK_FRAMES] = spectrum[:, band].sum(axis=1) / (spectrum.sum(axis=1) + 1e-10)
+    return energy, ratio
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """布爾數組中連續 True 的 [start, end) 區間"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """返回語音區段的樣本範圍 [(start, end), ...]"""
+    frame = int(sample_rate * FRAME_MS / 1000)
+    if len(audio) < frame:
+        return []
+
+    energy, ratio = _frame_features(audio, frame, sample_rate)
+    # 以能量的低分位數估計噪聲底
+    noise_floor = np.percentile(energy, 10)
+    mask = (energy > noise_floor + ENERGY_MARGIN_DB) & (ratio > SPEECH_BAND_RATIO)
+
+    # 合併短靜音、丟棄短語音、兩側補邊
+    min_silence = MIN_SILENCE_MS // FRAME_MS
+    min_speech = MIN_SPEECH_MS // FRAME_MS
+    pad = PAD_MS // FRAME_MS
+
+    merged: List[List[int]] = []
+    for start, end in _runs(mask):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(0, start - pad) * frame
+        end = min(len(audio), (end + pad) * frame)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+class SpeechMap:
+    """語音區段拼接後的時間軸與原始時間軸之間的映射"""
+
+    def __init__(self, regions: List[Tuple[int, int]], total_samples: int, sample_rate: int = SAMPLE_RATE):
+        self.regions = regions
+        self.total_samples = total_samples
+        self.sample_rate = sample_rate
+        self.gap = int(sample_rate * GAP_MS / 1000)
+        # 每個區段在拼接音頻中的起點
+        self.offsets = []
+        position = 0
+        for start, end in regions:
+            self.offsets.append(position)
+            position += end - start + self.gap
+
+    @classmethod
+    def from_audio(cls, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> "SpeechMap":
+        regions = detect_speech(audio, sample_rate)
+        speech = sum(end - start for start, end in regions)
+        if len(audio):
+            logger.info(f"🗣️ VAD: 語音 {speech / sample_rate:.1f}s / 總長 {len(audio) / sample_rate:.1f}s "
+                        f"({len(regions)} 段)")
+        return cls(regions, len(audio), sample_rate)
+
+    @property
+    def speech_seconds(self) -> float:
+        return sum(end - start for start, end in self.regions) / self.sample_rate
+
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        """只保留語音區段，區段之間插入短靜音"""
+        if not self.regions:
+            return np.zeros(0, dtype=np.float32)
+        silence = np.zeros(self.gap, dtype=np.float32)
+        parts = []
+        for start, end in self.regions:
+            parts.append(audio[start:end])
+            parts.append(silence)
+        return np.concatenate(parts[:-1]).astype(np.float32, copy=False)
+
+    def to_original(self, seconds: float) -> float:
+        """把拼接音頻中的時間映射回原始音頻時間"""
+        if not self.regions:
+            return seconds
+        position = int(round(seconds * self.sample_rate))
+        index = max(0, bisect.bisect_right(self.offsets, position) - 1)
+        start, end = self.regions[index]
+        original = start + min(position - self.offsets[index], end - start)
+        return original / self.sample_rate
+
+    def map_segments(self, segments: List[dict]) -> List[dict]:
+        """就地修正分段時間戳並返回"""
+        for segment in segments:
+            segment["start"] = self.to_original(segment["start"])
+            if segment.get("end") is not None:
+                segment["end"] = self.to_original(segment["end"])
+        return segments
@@ -0,0 +1,145 @@
+"""
+最小的服務端 WebSocket 實現 (RFC 6455)
+在 http.server 的請求處理器上完成握手後接管連接，只依賴標準庫與 numpy
+"""
+
+import json
+import base64
+import hashlib
+import struct
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+class WebSocketClosed(Exception):
+    """連接已關閉"""
+
+def is_upgrade(headers) -> bool:
+    return ('websocket' in headers.get('Upgrade', '').lower()
+            and 'upgrade' in headers.get('Connection', '').lower()
+            and bool(headers.get('Sec-WebSocket-Key')))
+
+def accept_key(key: str) -> str:
+    digest = hashlib.sha1((key.strip() + GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+def handshake(handler) -> 'WebSocket':
+    """在 BaseHTTPRequestHandler 上回應升級請求，返回接管連接的 WebSocket"""
+    handler.protocol_version = 'HTTP/1.1'  # 瀏覽器要求 101 響應使用 HTTP/1.1 狀態行
+    handler.send_response(101, 'Switching Protocols')
+    handler.send_header('Upgrade', 'websocket')
+    handler.send_header('Connection', 'Upgrade')
+    handler.send_header('Sec-WebSocket-Accept', accept_key(handler.headers['Sec-WebSocket-Key']))
+    handler.end_headers()
+    handler.wfile.flush()
+    handler.close_connection = True
+    return WebSocket(handler.rfile, handler.wfile)
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    data = np.frombuffer(payload, dtype=np.uint8)
+    key = np.resize(np.frombuffer(mask, dtype=np.uint8), len(data))
+    return (data ^ key).tobytes()
+
+class WebSocket:
+    """阻塞式讀取、線程安全發送的 WebSocket 連接"""
+
+    def __init__(self, rfile, wfile, max_message: int = MAX_MESSAGE_BYTES):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.max_message = max_message
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    def _read(self, size: int) -> bytes:
+        try:
+            data = self.rfile.read(size)
+        except (OSError, ValueError):  # 連接已被另一線程關閉
+            data = b''
+        if len(data) < size:
+            self.closed = True
+            raise WebSocketClosed("連接已斷開")
+        return data
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._read(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._read(8))[0]
+        if length > self.max_message:
+            self.close(1009, "消息過大")
+            raise WebSocketClosed("消息過大")
+        mask = self._read(4) if second & 0x80 else None
+        payload = self._read(length) if length else b''
+        if mask:
+            payload = _unmask(payload, mask)
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def receive(self) -> Tuple[int, bytes]:
+        """讀取下一條完整消息，返回 (OP_TEXT 或 OP_BINARY, 內容)；對端關閉時拋出 WebSocketClosed"""
+        opcode = None
+        parts = []
+        size = 0
+        while True:
+            fin, op, payload = self._read_frame()
+            if op == OP_PING:
+                self._send(OP_PONG, payload)
+                continue
+            if op == OP_PONG:
+                continue
+            if op == OP_CLOSE:
+                code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else 1000
+                self.close(code)
+                raise WebSocketClosed(f"對端關閉 ({code})")
+            if op != OP_CONTINUATION:
+                opcode = op
+            size += len(payload)
+            if size > self.max_message:
+                self.close(1009, "消息過大")
+                raise WebSocketClosed("消息過大")
+            parts.append(payload)
+            if fin:
+                return opcode, b''.join(parts)
+
+    def _send(self, opcode: int, payload: bytes):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 1 << 16:
+            header += bytes([126]) + struct.pack('!H', length)
+        else:
+            header += bytes([127]) + struct.pack('!Q', length)
+        with self._send_lock:
+            if self.closed and opcode != OP_CLOSE:
+                raise WebSocketClosed("連接已關閉")
+            try:
+                self.wfile.write(header + payload)
+                self.wfile.flush()
+            except OSError as e:
+                self.closed = True
+                raise WebSocketClosed(str(e))
+
+    def send_json(self, payload: Dict[str, Any]):
+        self._send(OP_TEXT, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def close(self, code: int = 1000, reason: Optional[str] = None):
+        if self.closed:
+            return
+        try:
+            self._send(OP_CLOSE, struct.pack('!H', code) + (reason or '').encode('utf-8')[:120])
+        except WebSocketClosed:
+            pass
+        self.closed = True